@@ -46,7 +46,7 @@ class AttractState(GameState):
             self.game.num_players = self.game.start
             self.game.use_credits()
             self.game.set_text_range_visible(TEXT_GALAGA, TEXT_END_GAME_TEXT, False)
-            self.game.set_sprite_range_visible(0, len(self.game.sprites) - 1, False)
+            self.game.set_sprite_range_visible(0, len(self.game.sprite_store) - 1, False)
             self.game.change_state(self.game.instantiate_state('PlayingState'))
 
     def do_attract_sequence(self):
@@ -72,7 +72,7 @@ class AttractState(GameState):
                 self.__scratch1 = 1
 
             if self.__scratch1 == 1 and self.__state_timer < 0.0:
-                self.game.set_sprite_range_visible(0, len(self.game.sprites) - 1, False)
+                self.game.set_sprite_range_visible(0, len(self.game.sprite_store) - 1, False)
                 self.game.set_text_range_visible(TEXT_GALAGA, TEXT_COPYRIGHT, False)
                 self.substate = AttractState.Substate.SHOW_PLAY
         elif self.__substate == AttractState.Substate.SHOW_PLAY:
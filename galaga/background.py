@@ -1,49 +1,39 @@
+import numpy as np
+
 from constants import *
-from pyjam.sprite import Sprite
+from pyjam import utils
 from pyjam.application import *
 from pyjam.constants import *
 
 
-class Star(Sprite):
-    def __init__(self, service, frame):
-        super().__init__(frame)
-
-        self.__service = service
+class StarsService:
+    """
+    The scrolling stars in the background.
 
-        self.time_to_live = random.randint(200, 400) / 1000.0
-        self.counter = self.time_to_live
+    Stars are stored in NumPy arrays and the service itself sits in the game sprites list,
+    so the whole field is updated and drawn in one go with SpriteBatch.draw_many.
+    """
 
-        self.layer_depth = 1.0
-        self.size = pc2v(glm.vec2(STAR_WIDTH, STAR_HEIGHT))
-        self.color = pg.Color(random.randint(20, 255), random.randint(20, 255), random.randint(20, 255), 255)
-        self.position = pc2v(glm.vec2(random.randint(0, 100), 5 + random.randint(0, 89)))
-        self.visible = True if random.randint(0, 1) == 1 else False
+    def __init__(self, game):
+        self.__stars_speed = 0.0
+        self.__game = game
+        self.__frame = None
+        self.__size = glm.vec2(0, 0)
 
-    @property
-    def speed(self):
-        return self.__service.speed
+        # per star data
+        self.__positions = np.zeros((0, 2))
+        self.__colors = np.zeros(0, dtype='u4')
+        self.__time_to_live = np.zeros(0)
+        self.__counters = np.zeros(0)
+        self.__visible = np.zeros(0, dtype=bool)
 
-    def update(self, delta_time: float):
-        if self.active:
-            dygdt = pcy2vy(self.speed) * delta_time
-            self.counter -= delta_time
-            if self.counter < 0:
-                self.visible = not self.visible
-                self.counter = self.time_to_live
+        # whether the stars are updated and drawn
+        self.active = True
 
-            sy = self.y + dygdt
-            if sy > pcy2vy(94):
-                sy -= pcy2vy(89)
-            elif sy < pcy2vy(6):
-                sy += pcy2vy(89)
-            self.y = sy
+        self.layer_depth = 1.0
 
-
-class StarsService:
-    def __init__(self, game):
-        self.__stars_speed = 0.0
-        self.__game = game
-        self.__stars = []
+        # the stars change every frame, they are never part of a StaticLayer
+        self.static_layer = None
 
     @property
     def speed(self) -> float:
@@ -53,18 +43,72 @@ class StarsService:
     def speed(self, new_speed: float):
         self.__stars_speed = new_speed
 
+    @property
+    def visible(self) -> bool:
+        return bool(self.__visible.any())
+
+    @visible.setter
+    def visible(self, visible_flag: bool):
+        # stars keep blinking, so hidden stars will show up again on their own
+        self.__visible[:] = visible_flag
+
     def create_stars(self, count: int):
+        self.__frame = self.__game.services[ASSET_SERVICE].get('textures/star')
+        self.__size = pc2v(glm.vec2(STAR_WIDTH, STAR_HEIGHT))
+
+        time_to_live = []
+        colors = []
+        positions = []
+        visible = []
         while count:
-            a_star = Star(self, self.__game.services[ASSET_SERVICE].get('textures/star'))
-            a_star.layer_depth = 1.0
-            self.__game.sprites.append(a_star)
-            self.__stars.append(a_star)
+            time_to_live.append(random.randint(200, 400) / 1000.0)
+            colors.append(utils.pack_color(pg.Color(random.randint(20, 255), random.randint(20, 255),
+                                                    random.randint(20, 255), 255)))
+            positions.append(pc2v(glm.vec2(random.randint(0, 100), 5 + random.randint(0, 89))))
+            visible.append(random.randint(0, 1) == 1)
             count -= 1
 
+        self.__time_to_live = np.append(self.__time_to_live, time_to_live)
+        self.__counters = np.append(self.__counters, time_to_live)
+        self.__colors = np.append(self.__colors, np.array(colors, dtype='u4'))
+        self.__positions = np.append(self.__positions, np.array(positions, dtype='f8').reshape(-1, 2), axis=0)
+        self.__visible = np.append(self.__visible, visible)
+
+        if self not in self.__game.sprites:
+            self.__game.sprites.append(self)
+
     def enable(self):
-        for s in self.__stars:
-            s.active = True
+        self.active = True
 
     def disable(self):
-        for s in self.__stars:
-            s.active = False
+        self.active = False
+
+    def update(self, delta_time: float):
+        if self.active:
+            dygdt = pcy2vy(self.speed) * delta_time
+
+            # blink
+            self.__counters -= delta_time
+            expired = self.__counters < 0
+            self.__visible[expired] = ~self.__visible[expired]
+            self.__counters[expired] = self.__time_to_live[expired]
+
+            # scroll and wrap around
+            sy = self.__positions[:, 1] + dygdt
+            below = sy > pcy2vy(94)
+            above = sy < pcy2vy(6)
+            sy[below] -= pcy2vy(89)
+            sy[above] += pcy2vy(89)
+            self.__positions[:, 1] = sy
+
+    def render(self, sprite_batch):
+        if self.active:
+            visible = np.flatnonzero(self.__visible)
+            rect = self.__frame.rect
+            sprite_batch.draw_many(texture=self.__frame.texture,
+                                   positions=self.__positions[visible],
+                                   source_rects=(rect.x, rect.y, rect.w, rect.h),
+                                   sizes=(self.__size.x, self.__size.y),
+                                   origins=(self.__size.x / 2, self.__size.y / 2),
+                                   colors=self.__colors[visible],
+                                   layer_depths=self.layer_depth)
@@ -6,6 +6,8 @@ BUG_ATTACK_SPEED_BASE = 40.0
 BUG_ATTACK_SPEED_MAX = 70.0
 BUG_ATTACK_SPEED_WINDOW = 10
 BUG_TRAVEL_SPEED = 70.0
+# cell size of the fighter bullets spatial hash, in virtual pixels
+BULLET_HASH_CELL_SIZE = 16.0
 BULLET_SPEED = 130.0
 BULLET_SPEED_ENEMY = 65.0
 # degrees/sec
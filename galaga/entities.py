@@ -1,10 +1,11 @@
 import copy
 
-from Box2D import b2PolygonShape
+import numpy as np
 
 from random import randint
 from pyjam import utils
 from pyjam.application import Game, pc2v, pcy2vy, vx2pcx, vy2pcy, pcx2vx
+from pyjam.collision import may_collide
 from pyjam.constants import ASSET_SERVICE
 from pyjam.core import Bounds
 from pyjam.sprites.animation import Animation2D
@@ -130,6 +131,15 @@ class Grid:
 
         self.__grid_y_coords = [0.0, 6.25, 12.5, 16.67, 20.83, 25.0]
 
+        # columns, rows and row heights of the grid positions
+        self.__grid_cols = np.array(gGrid_cols)
+        self.__grid_rows = np.array(gGrid_rows)
+        self.__grid_heights = np.array([self.__grid_y_coords[row] for row in gGrid_rows])
+
+        # coordinates of the grid positions, as an array and as glm.vec2, None when they must be computed again
+        self.__coordinates = None
+        self.__vectors = []
+
     @property
     def timer(self):
         return self.__timer
@@ -141,6 +151,7 @@ class Grid:
     @breathing.setter
     def breathing(self, value: int):
         self.__breathing = value
+        self.__coordinates = None
         if value:
             # not this sound in challenge stage
             if self.game.player().stage_index < 3:
@@ -157,33 +168,54 @@ class Grid:
     @y_offset.setter
     def y_offset(self, value):
         self.__y_offset = value
+        self.__coordinates = None
 
     def reset(self):
         self.__timer = 0.0
         self.__dir = 1.0
         self.__breathing = 0
         self.__y_offset = 0.0
+        self.__coordinates = None
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        """
+        The coordinates of all the grid positions, as a (2, positions) float32 array.
+        They are computed once after each change of the grid (usually once per frame, after update).
+        """
+        if self.__coordinates is None:
+            self.__compute_coordinates()
+        return self.__coordinates
 
     def get_coordinates(self, position_idx) -> glm.vec2:
-        col = gGrid_cols[position_idx]
-        row = gGrid_rows[position_idx]
+        if self.__coordinates is None:
+            self.__compute_coordinates()
+        return glm.vec2(self.__vectors[position_idx])
 
-        player = self.game.player()
-        h = self.__grid_y_coords[row]
-        if player.grid.breathing:
+    def __compute_coordinates(self):
+        col = self.__grid_cols
+        row = self.__grid_rows
+        h = self.__grid_heights
+
+        coordinates = np.empty((2, len(col)), dtype='f4')
+        if self.__breathing:
             # how much the grid expands along x and y
-            breathe_x = 1.418 * player.grid.timer
-            breathe_y = 0.675 * player.grid.timer
+            breathe_x = 1.418 * self.__timer
+            breathe_y = 0.675 * self.__timer
 
-            n = glm.vec2(19.85 + (col * 6.7) + (col - 5) * breathe_x, 11.05 + h + (row + 1) * breathe_y)
+            coordinates[0] = 19.85 + (col * 6.7) + (col - 5) * breathe_x
+            coordinates[1] = 11.05 + h + (row + 1) * breathe_y
         else:
-            walk_x = 9.925 * player.grid.timer
-            n = glm.vec2((col * 6.7) + walk_x, 11.05 + h)
+            walk_x = 9.925 * self.__timer
+            coordinates[0] = (col * 6.7) + walk_x
+            coordinates[1] = 11.05 + h
         # grid_y_offset is 0 during the game play, it's changed during show-field and hide-field phases,
-        # when exchanging from player 1 & 2
-        n.y += player.grid.y_offset
+        # when exchanging from player 1 & 2 (added to the float32 coordinates, as a glm.vec2 would do)
+        if self.__y_offset:
+            coordinates[1] = coordinates[1].astype('f8') + self.__y_offset
 
-        return n
+        self.__coordinates = coordinates
+        self.__vectors = [glm.vec2(x, y) for x, y in zip(*coordinates.tolist())]
 
     def update(self, delta_time):
         old_timer = self.__timer
@@ -207,6 +239,8 @@ class Grid:
                     self.__timer = 0.0
                     self.__dir = 1.0
 
+        self.__coordinates = None
+
 
 # ===================================================================================================
 # Player
@@ -625,12 +659,12 @@ class Player:
         if not self.game.invulnerability:
             if not self.is_capturing() and not self.capture_state >= CaptureState.RESCUED:
                 if self.ships[0].plan == Plan.ALIVE and not self.is_capturing():
-                    if sprite.collide(self.ships[0].sprite):
+                    if may_collide(sprite, self.ships[0].sprite) and sprite.collide(self.ships[0].sprite):
                         self.kill(0)
                         return True
 
                 if self.ships[1].plan == Plan.ALIVE:
-                    if sprite.collide(self.ships[1].sprite):
+                    if may_collide(sprite, self.ships[1].sprite) and sprite.collide(self.ships[1].sprite):
                         self.kill(1)
                         return True
                     elif self.ships[0].plan == Plan.DEAD:
@@ -784,7 +818,8 @@ class Enemy(Entity):
         self.delta_dest.y = n.y - self.y
         self.setup_velocity_and_rotation()
 
-    def setup_velocity_and_rotation(self):
+    def setup_velocity_and_rotation(self, path_point=None):
+        """ path_point is a point of the PathTables, when the destination is a waypoint of a path """
         # waves come in at the same velocity but attacks speed up
         if not self.game.attack_svc.bugs_attack:
             if not self.game.fast_spawn:
@@ -807,8 +842,12 @@ class Enemy(Entity):
                     speed = speed * 1.625
 
         # How far to travel and at what angle
-        self.distance = glm.length(self.delta_dest)
-        r = vec2_angle_from_y_deg(self.delta_dest)
+        if path_point is None:
+            self.distance = glm.length(self.delta_dest)
+            r = vec2_angle_from_y_deg(self.delta_dest)
+            direction = vec2_from_angle_deg(r)
+        else:
+            _, self.distance, r, direction = path_point
 
         # set the enemy rotation only if it's not about to land in the grid and is not in the grid.
         # That's because the grid causes left/right motion that leads to extreme rotation which this ignores
@@ -818,7 +857,7 @@ class Enemy(Entity):
                 self.rotation = r
 
         # the velocity along the vectors
-        self.velocity = vec2_from_angle_deg(r) * speed
+        self.velocity = direction * speed
 
         # point the sprite at the desired direction
         self.sprite.angle = self.rotation
@@ -879,7 +918,7 @@ class Enemy(Entity):
         # end of a point in the path, maybe the end of the path
         elif self.plan == Plan.PATH:
             self.point_index += 1
-            if self.point_index < len(gPathData[self.path_index >> 1]):
+            if self.point_index < self.game.path_tables.get_count(self.path_index):
                 self.next_path_point()
             else:
                 self.point_index = 0
@@ -1067,12 +1106,11 @@ class Enemy(Entity):
         self.sprite.angle = self.rotation
 
     def next_path_point(self):
-        index = self.path_index >> 1
-        self.delta_dest = glm.vec2(gPathData[index][self.point_index])
-        if (self.path_index & 1) != 0:
-            self.delta_dest.x = -self.delta_dest.x
+        # the paths and their mirrors are baked, see PathTables
+        path_point = self.game.path_tables.get_point(self.path_index, self.point_index)
+        self.delta_dest = glm.vec2(path_point[0])
 
-        self.setup_velocity_and_rotation()
+        self.setup_velocity_and_rotation(path_point)
 
     def run_beam_action(self):
         sprite = self.game.get_first_sprite_by_ent_type(EntityType.BEAM)
@@ -1118,7 +1156,9 @@ class Enemy(Entity):
                 self.setup_velocity_and_rotation()
                 self.game.make_beam = BeamState.OFF
 
-        # Make the collision box the size of the beam at this stage
+        # Make the collision box the size of the beam at this stage (Box2D is imported with the first shape)
+        from Box2D import b2PolygonShape
+
         center_y = (self.__beam_height - sprite.bounds.h) / 2
         sprite.shape = b2PolygonShape(box=(sprite.size.x / 2.0, self.__beam_height / 2.0, (0, center_y), 0.0))
 
@@ -1142,9 +1182,8 @@ class Enemy(Entity):
 
         player = self.game.player()
 
-        # the 1st four are fighter(s) bullets
-        for j in range(4):
-            bullet = self.game.bullets[j]
+        # only the fighter bullets near this enemy, in bullet order
+        for bullet in self.game.fighter_bullets_hash.query_sprite(self.sprite):
             if bullet.plan == Plan.ALIVE:
                 if self.sprite.collide(bullet.sprite):
                     bullet.plan = Plan.DEAD
@@ -1425,7 +1464,7 @@ class Enemy(Entity):
         self.game.transform_svc.append(cloned_enemy.position_index)
         cloned_enemy.plan = Plan.WAIT
         cloned_enemy.path_index = self.path_index
-        cloned_enemy.point_index = len(gPathData[self.path_index >> 1])
+        cloned_enemy.point_index = self.game.path_tables.get_count(self.path_index)
         self.game.player().enemies_alive += 1
         return cloned_enemy
 
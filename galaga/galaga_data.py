@@ -4,7 +4,7 @@ import pygame as pg
 from enum import IntEnum
 from constants import *
 from pyjam.sprites.animation import Animation2D
-from pyjam.text import TextAlignment
+from pyjam.core import TextAlignment
 
 
 class EntityType(IntEnum):
@@ -110,11 +110,11 @@ class EntityData:
         # How many sprites are available for this entity type
         self.sprite_numbers = sprite_numbers
 
-        # where each entity type starts in game.sprites
+        # where each entity type starts in game.sprite_store
         self.sprite_offset = 0
 
-        # how many sprites of that entity-type are currenty used in self.sprites
-        # used to get the next free sprite from game.sprites
+        # how many sprites of that entity-type are currenty used in game.sprite_store
+        # used to get the next free sprite from game.sprite_store
         # 2 item, one for player1 and the other for player2
         self.sprites_used = [0, 0]
 
@@ -640,6 +640,50 @@ g_sfx = [
     SOUND_TRANSFORM
 ]
 
+# the sound fx play in groups of channels, so a burst of hits never cuts the jingles the game waits for
+SFX_GROUP_ENEMIES = 'enemies'
+SFX_GROUP_JINGLES = 'jingles'
+SFX_GROUP_LOOPS = 'loops'
+SFX_GROUP_PLAYER = 'player'
+
+g_sfx_groups = {
+    SFX_GROUP_JINGLES: 3,
+    SFX_GROUP_LOOPS: 4,
+    SFX_GROUP_PLAYER: 3,
+    SFX_GROUP_ENEMIES: 4,
+}
+
+# sound fx => (group, priority, min secs between two plays, resident)
+# when its group is busy a sound cuts the oldest one with the lowest priority not higher than its own,
+# the sounds that are not resident can be released when unused (see AudioService)
+g_sfx_settings = {
+    SOUND_BEAM: (SFX_GROUP_LOOPS, 5, 0.0, True),
+    SOUND_BEAM_CAPTURED: (SFX_GROUP_LOOPS, 6, 0.0, True),
+    SOUND_BREATHING_TIME: (SFX_GROUP_LOOPS, 2, 0.0, True),
+    SOUND_CAPTURED_FIGHTER_DESTROYED: (SFX_GROUP_PLAYER, 8, 0.0, True),
+    SOUND_CAPTURED_FIGHTER_RESCUED: (SFX_GROUP_LOOPS, 8, 0.0, True),
+    SOUND_CHALLENGE_STAGE: (SFX_GROUP_JINGLES, 10, 0.0, False),
+    SOUND_CHALLENGE_BONUS: (SFX_GROUP_JINGLES, 10, 0.0, False),
+    SOUND_CHALLENGE_PERFECT: (SFX_GROUP_JINGLES, 10, 0.0, False),
+    SOUND_COIN_DROPPED: (SFX_GROUP_JINGLES, 8, 0.0, True),
+    SOUND_DANGER: (SFX_GROUP_LOOPS, 3, 0.0, True),
+    SOUND_DIVE_ATTACK: (SFX_GROUP_ENEMIES, 1, 0.0, True),
+    SOUND_EXTRA_LIFE: (SFX_GROUP_JINGLES, 8, 0.0, True),
+    SOUND_HALL_OF_FAME: (SFX_GROUP_JINGLES, 10, 0.0, False),
+    SOUND_HIGHSCORE_END: (SFX_GROUP_JINGLES, 10, 0.0, False),
+    SOUND_HIGHSCORE_LOOP: (SFX_GROUP_JINGLES, 10, 0.0, False),
+    SOUND_HIT_BEE: (SFX_GROUP_ENEMIES, 3, 0.05, True),
+    SOUND_HIT_BUTTERFLY: (SFX_GROUP_ENEMIES, 3, 0.05, True),
+    SOUND_HIT_COMMANDER_BLUE: (SFX_GROUP_ENEMIES, 4, 0.05, True),
+    SOUND_HIT_COMMANDER_GREEN: (SFX_GROUP_ENEMIES, 4, 0.05, True),
+    SOUND_PLAYER_CAPTURED: (SFX_GROUP_LOOPS, 8, 0.0, True),
+    SOUND_PLAYER_DIE: (SFX_GROUP_PLAYER, 10, 0.0, True),
+    SOUND_PLAYER_SHOOT: (SFX_GROUP_PLAYER, 1, 0.0, True),
+    SOUND_STAGE_ICON: (SFX_GROUP_JINGLES, 5, 0.0, True),
+    SOUND_START: (SFX_GROUP_JINGLES, 10, 0.0, True),
+    SOUND_TRANSFORM: (SFX_GROUP_ENEMIES, 2, 0.0, True),
+}
+
 g_kill_sound = {
     EntityType.FIGHTER: SOUND_PLAYER_DIE,
     EntityType.CAPTURED_FIGHTER: SOUND_CAPTURED_FIGHTER_DESTROYED,
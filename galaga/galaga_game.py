@@ -1,13 +1,12 @@
 import os
 
-from Box2D import b2PolygonShape
-
 from transform import TransformService
 from galaga_data import *
 from background import StarsService
 from fxservice import RunningFxService
 from attack import AttackService
 from entities import Enemy, Bullet, Player
+from paths import PathTables
 from play import PlayingState
 from hwstartup import HwStartupState
 from attract import AttractState
@@ -15,10 +14,14 @@ from tests import TestPath
 from spawn import EnemySpawner
 
 from pyjam.application import *
-from pyjam.sprite import Sprite
+from pyjam.collision import SpatialHash
+from pyjam.layer import StaticLayer
+from pyjam.loader import AssetLoader, LoadingState
 from pyjam.sprites.animation import Animation2D
+from pyjam.sprites.atlas import TextureAtlas
 from pyjam.sprites.frame import SpriteFrame
 from pyjam.sprites.sheet import SpriteSheet
+from pyjam.sprites.store import SpriteStore
 from pyjam.text import Text, TextAlignment
 
 
@@ -36,6 +39,13 @@ class Galaga(Game):
         # if True skip the initial hardware setup sequence
         self.skip_hw_startup = False
 
+        # if True the assets are loaded by worker threads while a progress bar is shown,
+        # otherwise the first frame waits for them (the number of frames before the game starts is then fixed)
+        self.async_loading = True
+
+        # if True the shaders are compiled again when their files change
+        self.watch_shaders = False
+
         # if True spawn waves as fast as possibile - use it only to accelerate testing ;)
         self.fast_spawn = False
 
@@ -69,6 +79,9 @@ class Galaga(Game):
 
         self.transform_svc = TransformService()
 
+        # gPathData baked, built in initialize
+        self.path_tables = PathTables(self)
+
         # [player1,player2]
         self.players = [Player(), Player()]
 
@@ -86,6 +99,9 @@ class Galaga(Game):
         # the first 4 bullets are blue, the others are red
         self.bullets = [Bullet() for x in range(MAX_BULLETS)]
 
+        # broadphase for the collisions of the enemies with the fighter bullets, see hash_fighter_bullets
+        self.fighter_bullets_hash = SpatialHash(BULLET_HASH_CELL_SIZE)
+
         # next slot to use for enemy bullet
         self.bullet_index = 0
 
@@ -116,6 +132,12 @@ class Galaga(Game):
 
         self.enemies_killed_this_stage = 0
 
+        # the sprites of the entities, indexed by the entity sprite offsets
+        self.sprite_store = None
+
+        # the texts in g_texts_data
+        self.text_layer = None
+
         # press F1 to show/hide FPS
         self.fps_text = None
 
@@ -144,17 +166,17 @@ class Galaga(Game):
         self.enemies[self.current_player_idx][enemy_idx] = enemy
 
     def get_first_sprite_by_ent_type(self, ent_type: EntityType):
-        return self.sprites[self.ent_svc.get_sprite_offset(ent_type)]
+        return self.sprite_store[self.ent_svc.get_sprite_offset(ent_type)]
 
     def get_sprite_at_by_ent_type(self, ent_type: EntityType, idx: int):
-        return self.sprites[self.ent_svc.get_sprite_offset(ent_type) + idx]
+        return self.sprite_store[self.ent_svc.get_sprite_offset(ent_type) + idx]
 
     def get_first_free_sprite_by_ent_type(self, ent_type: EntityType):
         """
             returns the first free sprite for the given entity type and for the current player
             and mark the sprite as used
         """
-        return self.sprites[self.ent_svc.get_first_free_sprite_idx(ent_type, self.current_player_idx)]
+        return self.sprite_store[self.ent_svc.get_first_free_sprite_idx(ent_type, self.current_player_idx)]
 
     def instantiate_state(self, state_name):
         if state_name == 'AttractState':
@@ -196,23 +218,53 @@ class Galaga(Game):
         self.set_bg_color(pg.Color('black'))
 
     def initialize(self):
-        asset_service = self.services[ASSET_SERVICE]
+        if self.watch_shaders:
+            self.services[SHADER_SERVICE].watch()
 
-        font_sp_sheet = SpriteSheet(self)
-        font_sp_sheet.load_rects('fonts/font.png')
+        # the font and the sprites share the same texture, so texts and sprites are drawn in the same batch
+        atlas = TextureAtlas(self, 'galaga')
 
-        texture_service = self.services[TEXTURE_SERVICE]
+        font_sp_sheet = SpriteSheet(self)
+        font_sp_sheet.load_rects('fonts/font.png', atlas=atlas)
 
         assets_sp_sheet = SpriteSheet(self)
-        assets_sp_sheet.load_rects('textures/galaga-spritesheet.png')
+        assets_sp_sheet.load_rects('textures/galaga-spritesheet.png', atlas=atlas)
+
+        # the atlas pages, the path tables and the sounds are loaded by worker threads,
+        # the entities and the texts are set up once they are ready
+        loader = AssetLoader(self)
+        loader.add_task('atlas galaga', atlas.prepare, lambda _: atlas.upload())
+        loader.add_task('path tables', self.path_tables.build)
+        audio_service = self.services[AUDIO_SERVICE]
+        audio_service.set_groups(g_sfx_groups)
+        for sound_name in g_sfx:
+            file = os.path.join(self.get_assets_root(), f'sfx/{sound_name}.wav')
+            group, priority, min_interval, resident = g_sfx_settings[sound_name]
+            audio_service.register(sound_name, file, group, priority, min_interval, resident)
+            loader.add_sound(sound_name, file)
+
+        if self.async_loading:
+            self.change_state(LoadingState(self, loader, lambda: self.setup_entities(assets_sp_sheet)))
+        else:
+            loader.wait()
+            self.mark_startup('asset loading')
+            self.setup_entities(assets_sp_sheet)
+
+    def setup_entities(self, assets_sp_sheet):
+        # Box2D is imported with the first shape
+        from Box2D import b2PolygonShape
+
+        asset_service = self.services[ASSET_SERVICE]
+        texture_service = self.services[TEXTURE_SERVICE]
 
         white_frame = SpriteFrame(texture_service.create_color_texture(pg.Color('white')))
         asset_service.insert('textures/star', white_frame)
         self.stars_svc.create_stars(NUM_STARS)
         self.stars_svc.disable()
 
-        # create sprites
-        entity_offset = len(self.sprites)
+        # create sprites, their state is kept in the columns of the sprite store
+        self.sprite_store = SpriteStore(self)
+        entity_offset = 0
         for et in EntityType:
             sprites_needed = self.ent_svc.get_sprite_numbers(et)
 
@@ -230,7 +282,7 @@ class Galaga(Game):
                 ent_data.grid_animation = animation
 
             for j in range(sprites_needed):
-                sprite = Sprite(base_frame)
+                sprite = self.sprite_store.create(base_frame)
 
                 # frames are double in size compared to the original ones
                 sprite.size = glm.vec2(base_frame.width / 2, base_frame.height / 2)
@@ -242,29 +294,28 @@ class Galaga(Game):
                 if len(frames_list) > 1:
                     sprite.set_animation(animation)
 
-                self.sprites.append(sprite)
-
             self.ent_svc.set_sprite_offset(et, entity_offset)
             entity_offset += sprites_needed
 
+        self.sprites.append(self.sprite_store)
+
         self.get_first_sprite_by_ent_type(EntityType.NAMCO).position = pc2v(glm.vec2(50, 91))
 
-        # create text
+        # create text, the texts seldom change so their vertices are kept in a static layer
+        self.text_layer = StaticLayer(self)
         for t in g_texts_data:
-            self.texts.append(self.create_text(t[1], t[2], t[3], t[4]))
+            text = self.create_text(t[1], t[2], t[3], t[4])
+            self.texts.append(text)
+            self.text_layer.add(text)
+        self.static_layers.append(self.text_layer)
 
         # setup lives positions
         for i in range(2, self.ent_svc.get_sprite_numbers(EntityType.FIGHTER)):
             sprite = self.get_sprite_at_by_ent_type(EntityType.FIGHTER, i)
             hx = sprite.hotspot.x
             hy = sprite.hotspot.y
-            sprite.position.x = pcx2vx((2 * (i - 1) / ORIGINAL_X_CELLSF) * 100.0) - hx
-            sprite.position.y = pcy2vy(((ORIGINAL_Y_CELLSF - 3) / ORIGINAL_Y_CELLSF) * 100.0) - hy
-
-        # load sounds fx
-        for sound_name in g_sfx:
-            file = os.path.join(self.get_assets_root(), f'sfx/{sound_name}.wav')
-            self.add_sfx(sound_name, pg.mixer.Sound(file))
+            sprite.x = pcx2vx((2 * (i - 1) / ORIGINAL_X_CELLSF) * 100.0) - hx
+            sprite.y = pcy2vy(((ORIGINAL_Y_CELLSF - 3) / ORIGINAL_Y_CELLSF) * 100.0) - hy
 
         # set up the player bullets
         for i in range(self.ent_svc.get_sprite_numbers(EntityType.BLUE_BULLET)):
@@ -303,12 +354,13 @@ class Galaga(Game):
         self.num_credits = 0
 
         self.set_text_range_visible(TEXT_GALAGA, TEXT_END_GAME_TEXT, False)
-        self.set_sprite_range_visible(0, len(self.sprites) - 1, False)
+        self.set_sprite_range_visible(0, len(self.sprite_store) - 1, False)
 
         # create FPS text
         self.fps_text = self.create_text("00", (100, 0), COLOR_WHITE, TextAlignment.RIGHT)
         self.fps_text.visible = False
         self.texts.append(self.fps_text)
+        self.mark_startup('sprite creation')
 
         if self.skip_hw_startup:
             self.change_state(self.instantiate_state('AttractState'))
@@ -332,13 +384,18 @@ class Galaga(Game):
             self.texts[i].visible = vis_flag
 
     def set_sprite_range_visible(self, range_start, range_end, vis_flag):
-        """ When passing a len as range_end, you have to pass len()-1, otherwise pass the value as is """
-        for i in range(range_start, range_end + 1):
-            self.sprites[i].visible = vis_flag
+        """
+        The range is made of sprite_store indices.
+        When passing a len as range_end, you have to pass len()-1, otherwise pass the value as is
+        """
+        self.sprite_store.set_visible(range_start, range_end + 1, vis_flag)
 
     def update(self):
+        # nothing to drive until the assets are loaded
+        if isinstance(self.state, LoadingState):
+            pass
         # hw-startup state
-        if isinstance(self.state, HwStartupState) and self.state.substate == HwStartupState.Substate.END_HW_STARTUP:
+        elif isinstance(self.state, HwStartupState) and self.state.substate == HwStartupState.Substate.END_HW_STARTUP:
             self.change_state(self.instantiate_state('AttractState'))
         # attract or play state
         else:
@@ -397,6 +454,12 @@ class Galaga(Game):
         if self.key_pressed(pg.K_F1):
             self.fps_text.visible = not self.fps_text.visible
 
+        # show/hide the frame profiler graph, profiling starts with the first press
+        if self.key_pressed(pg.K_F2):
+            if self.profiler is None:
+                self.set_profiling(True)
+            self.profiler.overlay_visible = not self.profiler.overlay_visible
+
         if self.key_pressed(pg.K_ESCAPE):
             self.signal_quit()
 
@@ -460,6 +523,14 @@ class Galaga(Game):
     def is_gameplay_running(self):
         return isinstance(self.state, PlayingState) and self.state.substate >= PlayingState.Substate.Play
 
+    def hash_fighter_bullets(self):
+        """ Fills the fighter bullets hash with the alive fighter bullets, they are the first four bullets """
+        self.fighter_bullets_hash.clear()
+        for j in range(4):
+            bullet = self.bullets[j]
+            if bullet.plan == Plan.ALIVE:
+                self.fighter_bullets_hash.insert_sprite(bullet, bullet.sprite)
+
     def move_bullets(self):
         for bullet in self.bullets:
             if bullet.plan == Plan.ALIVE:
@@ -1,5 +1,50 @@
+import argparse
+import time
+
+# timed for --profile-startup
+start_time = time.perf_counter()
 import galaga_game
+import_time = time.perf_counter() - start_time
+
+parser = argparse.ArgumentParser(description='Galaga')
+parser.add_argument('--headless', type=int, metavar='FRAMES', default=0,
+                    help='run FRAMES frames without window and sound, as fast as possible')
+parser.add_argument('--render', action='store_true',
+                    help='with --headless, draw the frames in an offscreen framebuffer')
+parser.add_argument('--fixed-timestep', type=int, metavar='RATE', default=0,
+                    help='update the game RATE times per second, whatever the framerate')
+parser.add_argument('--profile', metavar='FILE',
+                    help='time every frame and save the last ones on exit, as JSON if FILE ends with .json, else CSV')
+parser.add_argument('--profile-startup', action='store_true',
+                    help='print the time taken by each step of the startup, '
+                         'the assets are loaded before the first frame')
+parser.add_argument('--watch-shaders', action='store_true',
+                    help='compile the shaders again when their files change')
+args = parser.parse_args()
 
 # run the game
+start_time = time.perf_counter()
 galaga_app = galaga_game.Galaga()
-galaga_app.run()
+if args.profile_startup:
+    galaga_app.set_startup_profiling(True)
+    galaga_app.startup_profiler.add('import', import_time)
+    galaga_app.startup_profiler.add('game creation', time.perf_counter() - start_time)
+    # the loading is timed as a whole, not spread over the frames of the loading bar
+    galaga_app.async_loading = False
+if args.headless:
+    galaga_app.set_headless(True, args.render)
+    # the same frames every run
+    galaga_app.async_loading = False
+if args.fixed_timestep:
+    galaga_app.set_fixed_timestep(args.fixed_timestep)
+if args.profile:
+    galaga_app.set_profiling(True)
+if args.watch_shaders:
+    galaga_app.watch_shaders = True
+galaga_app.run(args.headless)
+
+if args.profile:
+    if args.profile.endswith('.json'):
+        galaga_app.profiler.dump_json(args.profile)
+    else:
+        galaga_app.profiler.dump_csv(args.profile)
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import threading
+import zipfile
+
+import glm
+import numpy as np
+
+from galaga_data import *
+from pyjam import utils
+
+# bump it when the content of the tables changes, to discard the cached ones
+PATH_TABLES_VERSION = 1
+
+
+class PathTables:
+    """
+    gPathData baked for the enemies following a path.
+
+    Every path and its mirror (so indexed by path_index) is turned into a table of points holding the relative
+    waypoint, the segment length, the heading and the unit velocity, computed with the glm.vec2 math of
+    Enemy.setup_velocity_and_rotation: following a path is then a table lookup.
+    The tables are cached in the game cache folder, keyed by a hash of gPathData.
+    """
+
+    def __init__(self, game):
+        self.__game = game
+
+        # path_index => list of (waypoint, distance, heading, direction)
+        self.__points = []
+
+    def get_point(self, path_index: int, point_index: int):
+        """ Returns (waypoint, distance, heading, direction), the vectors are shared: copy them to change them """
+        return self.__points[path_index][point_index]
+
+    def get_count(self, path_index: int) -> int:
+        return len(self.__points[path_index])
+
+    def build(self):
+        cache_file = os.path.join(self.__game.get_cache_root(), 'paths.npz')
+        key = self.__get_cache_key()
+
+        tables = self.__load_cache(cache_file, key)
+        if tables is None:
+            tables = self.__bake()
+            self.__save_cache(cache_file, key, tables)
+
+        offsets, waypoints, distances, headings, directions = tables
+        self.__points = []
+        for path_index in range(len(offsets) - 1):
+            start, end = offsets[path_index], offsets[path_index + 1]
+            self.__points.append([(glm.vec2(waypoint), distance, heading, glm.vec2(direction))
+                                  for waypoint, distance, heading, direction in
+                                  zip(waypoints[start:end].tolist(), distances[start:end].tolist(),
+                                      headings[start:end].tolist(), directions[start:end].tolist())])
+
+    @staticmethod
+    def __bake():
+        offsets = [0]
+        waypoints = []
+        distances = []
+        headings = []
+        directions = []
+        for path_index in range(len(gPathData) * 2):
+            for point in gPathData[path_index >> 1]:
+                waypoint = glm.vec2(point)
+                # odd indices are the mirror paths
+                if (path_index & 1) != 0:
+                    waypoint.x = -waypoint.x
+                heading = utils.vec2_angle_from_y_deg(waypoint)
+
+                waypoints.append(waypoint.to_tuple())
+                distances.append(glm.length(waypoint))
+                headings.append(heading)
+                directions.append(utils.vec2_from_angle_deg(heading).to_tuple())
+            offsets.append(len(waypoints))
+
+        return (np.array(offsets, dtype='i4'), np.array(waypoints, dtype='f4').reshape(-1, 2),
+                np.array(distances, dtype='f8'), np.array(headings, dtype='f8'),
+                np.array(directions, dtype='f4').reshape(-1, 2))
+
+    @staticmethod
+    def __get_cache_key() -> str:
+        description = json.dumps([PATH_TABLES_VERSION, gPathData])
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def __load_cache(cache_file, key):
+        if not os.path.exists(cache_file):
+            return None
+
+        try:
+            with np.load(cache_file) as data:
+                if str(data['key']) != key:
+                    return None
+                print(f'Loading paths: {cache_file}')
+                return data['offsets'], data['waypoints'], data['distances'], data['headings'], data['directions']
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile) as e:
+            # a damaged cache file is replaced by baking the tables again
+            print(f'Cannot load paths {cache_file}: {e}')
+            return None
+
+    @staticmethod
+    def __save_cache(cache_file, key, tables):
+        offsets, waypoints, distances, headings, directions = tables
+        # written aside and renamed, so that a run killed while saving does not leave a partial file
+        temp_file = f'{cache_file}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(temp_file, 'wb') as f:
+                np.savez(f, key=np.array(key), offsets=offsets, waypoints=waypoints, distances=distances,
+                         headings=headings, directions=directions)
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            # the tables still work, they will be baked again next time
+            print(f'Cannot save paths {cache_file}: {e}')
@@ -447,14 +447,14 @@ class PlayingState(GameState):
         player.ships[0].x = 50
         player.ships[0].y = ((ORIGINAL_Y_CELLSF - 3.0) / ORIGINAL_Y_CELLSF) * 100
 
-        player.ships[1].x = 50 + pcx2vx(self.game.sprites[p_sprite_offset].width)
+        player.ships[1].x = 50 + pcx2vx(self.game.sprite_store[p_sprite_offset].width)
         player.ships[1].y = ((ORIGINAL_Y_CELLSF - 3.0) / ORIGINAL_Y_CELLSF) * 100
 
         player.ships[0].plan = Plan.INIT
         player.ships[1].plan = Plan.INIT
 
-        player.ships[0].sprite = self.game.sprites[p_sprite_offset]
-        player.ships[1].sprite = self.game.sprites[p_sprite_offset + 1]
+        player.ships[0].sprite = self.game.sprite_store[p_sprite_offset]
+        player.ships[1].sprite = self.game.sprite_store[p_sprite_offset + 1]
         player.ships[0].sprite.position = pc2v(glm.vec2(player.ships[0].x, player.ships[0].y))
         player.ships[1].sprite.position = pc2v(glm.vec2(player.ships[1].x, player.ships[1].y))
 
@@ -475,19 +475,19 @@ class PlayingState(GameState):
         p = 1.0
         ypos = ((ORIGINAL_Y_CELLSF - 2) / ORIGINAL_Y_CELLSF) * 100.0
         for i in range(2, self.game.ent_svc.get_sprite_numbers(EntityType.FIGHTER)):
-            sprite = self.game.sprites[p_sprite_offset + i]
+            sprite = self.game.sprite_store[p_sprite_offset + i]
             sprite.scale = glm.vec2(0.85, 0.85)
             hx = sprite.hotspot.x
             hy = sprite.hotspot.y
-            sprite.position.x = pcx2vx(p) + hx
-            sprite.position.y = pcy2vy(ypos) + hy
+            sprite.x = pcx2vx(p) + hx
+            sprite.y = pcy2vy(ypos) + hy
             p += vx2pcx(sprite.width * sprite.scale.x)
 
         # scale badge icons
         for i in range(self.game.ent_svc.get_sprite_offset(EntityType.BADGE1),
                        self.game.ent_svc.get_sprite_offset(EntityType.BADGE50) +
                        self.game.ent_svc.get_sprite_numbers(EntityType.BADGE50)):
-            self.game.sprites[i].scale = glm.vec2(0.85, 0.85)
+            self.game.sprite_store[i].scale = glm.vec2(0.85, 0.85)
 
         # Make sure all bullets are dead
         for bullet in self.game.bullets:
@@ -505,6 +505,9 @@ class PlayingState(GameState):
         # assumes the enemies are all standing in the grid
         self.game.quiescence = True
 
+        # the fighter bullets stay still while the enemies move
+        self.game.hash_fighter_bullets()
+
         for enemy in self.game.enemies[self.game.current_player_idx]:
             # if not dead, the enemy must be updated
             if enemy is not None and enemy.plan:
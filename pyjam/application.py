@@ -1,5 +1,7 @@
 import copy
+import os
 import random
+import time
 
 import glm
 import pygame as pg
@@ -7,11 +9,13 @@ import moderngl as mgl
 
 from pyjam.services.shader import ShaderService
 from pyjam.services.asset import AssetService
+from pyjam.services.audio import AudioService
 from pyjam.services.texture import TextureService
 from pyjam.services.vao import VaoService
 from pyjam.services.vbo import VboService
-from pyjam.sprites.batch import SpriteBatch, SpriteSortMode
+from pyjam.sprites.batch import SpriteBatch, SpriteSortMode, SpriteBatchBackend
 from pyjam.camera import Camera
+from pyjam.profiler import FrameProfiler, StartupProfiler
 from pyjam.constants import *
 
 
@@ -22,13 +26,15 @@ class Game:
     def __init__(self):
         self.services = {}
 
-        self.__sfx = {}
         self.__audio_disabled = False
 
         self.__sprites = []
 
         self.__texts = []
 
+        # StaticLayer objects, drawn after the sprites and the texts
+        self.__static_layers = []
+
         self.__bg_color = pg.Color('black')
 
         self.__state = None
@@ -40,6 +46,13 @@ class Game:
         # elapsed secs since last frame
         self.__delta_time = 0.0
 
+        # fixed update steps per second (0 for one update per frame) and the most steps run in a frame,
+        # see set_fixed_timestep
+        self.__fixed_rate: int = 0
+        self.__max_steps: int = 5
+        self.__accumulator = 0.0
+        self.__interpolation = 1.0
+
         # opengl context
         self.__ctx = None
 
@@ -55,12 +68,28 @@ class Game:
 
         self.__sp_batch = None
         self.__sp_batch_sort_mode = SpriteSortMode.BACK_TO_FRONT
+        self.__sp_batch_backend = SpriteBatchBackend.VERTICES
+        self.__sp_batch_use_texture_array = False
 
         self.__camera = None
 
         self.__origin_at_top_left = True
 
         self.__assets_root = "./media"
+        self.__cache_root = "./cache"
+
+        # headless mode, see set_headless
+        self.__headless = False
+        self.__headless_render = False
+        self.__offscreen_fbo = None
+        self.__frame_count = 0
+        self.__simulated_time = 0.0
+
+        # times the phases of run, see set_profiling
+        self.__profiler = None
+
+        # times the steps of setup, see set_startup_profiling
+        self.__startup_profiler = None
 
         self.__signal_quit = False
         self.__key_state_this_frame = None
@@ -71,13 +100,11 @@ class Game:
         Game.instance = self
 
     def add_sfx(self, key, sfx):
-        self.__sfx[key] = sfx
-
-    def __get_sfx(self, key):
-        return self.__sfx[key]
+        """ Adds a decoded sound fx, see AudioService.set_sound """
+        self.services[AUDIO_SERVICE].set_sound(key, sfx)
 
     def sfx_delete(self, key):
-        self.__sfx.pop(key)
+        self.services[AUDIO_SERVICE].delete(key)
 
     def sfx_play(self, key, loops=0, maxtime=0, fade_ms=0):
         """
@@ -87,23 +114,26 @@ class Game:
         If loops is set to -1 the Sound will loop indefinitely
         The maxtime argument can be used to stop playback after a given number of milliseconds.
         The fade_ms argument will make the sound start playing at 0 volume and fade up to full volume over the time given.
+        The sound plays in the channels of its group, see AudioService.play
         """
         if not self.__audio_disabled:
-            self.__get_sfx(key).play(loops, maxtime, fade_ms)
+            self.services[AUDIO_SERVICE].play(key, loops, maxtime, fade_ms)
 
     def sfx_stop(self, key):
         """
         stop sound playback
         """
         if not self.__audio_disabled:
-            self.__get_sfx(key).stop()
+            self.services[AUDIO_SERVICE].stop(key)
 
     def sfx_get_num_channels(self, key) -> int:
         """
         count how many times this sound fx is playing
         Return the number of active channels this sound is playing on
         """
-        return self.__get_sfx(key).get_num_channels()
+        if self.__audio_disabled:
+            return 0
+        return self.services[AUDIO_SERVICE].get_num_channels(key)
 
     @property
     def sprites(self):
@@ -113,12 +143,18 @@ class Game:
     def texts(self):
         return self.__texts
 
+    @property
+    def static_layers(self):
+        return self.__static_layers
+
     @property
     def time_ms(self) -> int:
         """
         Returns the total elapsed time in milliseconds since the start of application
+        (the simulated time when headless)
         """
-
+        if self.__headless:
+            return round(self.__simulated_time * 1000.0)
         return pg.time.get_ticks()
 
     @property
@@ -136,6 +172,21 @@ class Game:
         """
         return self.__delta_time
 
+    @property
+    def interpolation(self) -> float:
+        """
+        Returns where the frame being drawn is between the last two fixed update steps (from 0 to 1),
+        always 1 without fixed timestep
+        """
+        return self.__interpolation
+
+    @property
+    def frame_count(self) -> int:
+        """
+        Returns the number of frames run so far
+        """
+        return self.__frame_count
+
     @property
     def clock(self) -> pg.time.Clock:
         return self.__clock
@@ -155,12 +206,82 @@ class Game:
     def get_assets_root(self):
         return self.__assets_root
 
+    # path of the folder holding the data built at runtime and reused by the next runs (e.g. texture atlases),
+    # relative to py main
+    def set_cache_root(self, cache_root):
+        self.__cache_root = cache_root
+
+    def get_cache_root(self):
+        return self.__cache_root
+
+    def is_headless(self) -> bool:
+        return self.__headless
+
+    # when headless the game runs without window and sound: the OpenGL context is a standalone one drawing in an
+    # offscreen framebuffer, the sounds are muted and every frame lasts 1 / framerate secs of simulated time,
+    # frames are run as fast as possible. With render False nothing is drawn at all, only the game logic runs.
+    # It must be set before run
+    def set_headless(self, headless: bool, render: bool = False):
+        self.__headless = headless
+        self.__headless_render = render
+
+    @property
+    def profiler(self) -> FrameProfiler:
+        """ Returns the FrameProfiler, None when not profiling """
+        return self.__profiler
+
+    def set_profiling(self, enabled: bool, capacity: int = 600):
+        """ Starts timing every frame with a FrameProfiler keeping the last capacity frames, or stops it """
+        self.__profiler = FrameProfiler(self, capacity) if enabled else None
+
+    def __profile(self, phase: str):
+        if self.__profiler is not None:
+            self.__profiler.mark(phase)
+
+    @property
+    def startup_profiler(self) -> StartupProfiler:
+        """ Returns the StartupProfiler, None when not profiling the startup """
+        return self.__startup_profiler
+
+    # It must be set before run
+    def set_startup_profiling(self, enabled: bool):
+        """
+        Times the steps of the startup with a StartupProfiler, its report is printed after the first frame.
+        The time before the call (e.g. the imports) can be added with startup_profiler.add
+        """
+        self.__startup_profiler = StartupProfiler() if enabled else None
+
+    def mark_startup(self, step: str):
+        """ Ends a step of the startup profile, for the steps of initialize """
+        if self.__startup_profiler is not None:
+            self.__startup_profiler.mark(step)
+
     def get_sprite_batch_sort_mode(self):
         return self.__sp_batch_sort_mode
 
     def set_sprite_batch_sort_mode(self, sort_mode):
         self.__sp_batch_sort_mode = sort_mode
 
+    def get_sprite_batch_backend(self):
+        return self.__sp_batch_backend
+
+    def set_sprite_batch_backend(self, backend):
+        self.__sp_batch_backend = backend
+        if self.__sp_batch is not None and self.__sp_batch.backend != backend:
+            self.__sp_batch.dispose()
+            self.__sp_batch = SpriteBatch(self, backend=backend, use_texture_array=self.__sp_batch_use_texture_array)
+
+    def get_sprite_batch_use_texture_array(self):
+        return self.__sp_batch_use_texture_array
+
+    # when enabled all the textures are copied in the layers of a texture array, and the sprite batch is not split
+    # in several draw calls when the texture changes
+    def set_sprite_batch_use_texture_array(self, use_texture_array):
+        self.__sp_batch_use_texture_array = use_texture_array
+        if self.__sp_batch is not None and self.__sp_batch.use_texture_array != use_texture_array:
+            self.__sp_batch.dispose()
+            self.__sp_batch = SpriteBatch(self, backend=self.__sp_batch_backend, use_texture_array=use_texture_array)
+
     def get_sprite_batch(self):
         return self.__sp_batch
 
@@ -174,6 +295,19 @@ class Game:
     def get_virtual_matrix(self):
         return self.__scale_matrix
 
+    # with a fixed timestep the game is updated step_rate times per second, with a delta_time of 1 / step_rate,
+    # whatever the framerate: the frame time piles up and is used by steps, at most max_steps per frame
+    # (the time left after that is dropped, so that a slow update does not fall further behind).
+    # The sprites are drawn interpolated between their positions of the last two steps.
+    # The framerate then only caps the rendering, 0 to not cap it. step_rate 0 turns it off
+    def set_fixed_timestep(self, step_rate: int, max_steps: int = 5):
+        self.__fixed_rate = step_rate
+        self.__max_steps = max(max_steps, 1)
+        self.__accumulator = 0.0
+
+    def get_fixed_rate(self) -> int:
+        return self.__fixed_rate
+
     def set_framerate(self, framerate: int):
         self.__framerate = framerate
 
@@ -228,6 +362,9 @@ class Game:
         if height < 1:
             height = 1
 
+        if self.__headless:
+            # a window of the dummy video driver, the OpenGL context is a standalone one
+            flags &= ~(pg.OPENGL | pg.FULLSCREEN)
         pg.display.set_mode((width, height), flags, depth, display, vsync)
 
         self.__fullscreen = flags & pg.FULLSCREEN != 0
@@ -272,9 +409,16 @@ class Game:
     def setup(self):
         random.seed()
 
+        if self.__headless:
+            # no display and no sound card needed
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+            self.__audio_disabled = True
+
         pg.init()
         pg.font.init()
         pg.mixer.init()
+        self.mark_startup('pygame init')
 
         pg.display.gl_set_attribute(pg.GL_CONTEXT_MAJOR_VERSION, 3)
         pg.display.gl_set_attribute(pg.GL_CONTEXT_MINOR_VERSION, 3)
@@ -282,6 +426,7 @@ class Game:
 
         # virtual call
         self.setup_display()
+        self.mark_startup('display creation')
 
         # -------------------------------------------------------------------------------
         #
@@ -331,8 +476,14 @@ class Game:
         #
         # -------------------------------------------------------------------------------
 
-        # detect and use existing opengl context
-        self.__ctx = mgl.create_context()
+        if self.__headless:
+            self.__ctx = self.__create_standalone_context()
+            self.__offscreen_fbo = self.__ctx.simple_framebuffer((self.get_display_width(),
+                                                                   self.get_display_height()))
+            self.__offscreen_fbo.use()
+        else:
+            # detect and use existing opengl context
+            self.__ctx = mgl.create_context()
 
         self.setup_viewport()
 
@@ -344,13 +495,17 @@ class Game:
         else:
             self.__ctx.front_face = 'cw'
         self.__ctx.cull_face = 'back'
+        self.mark_startup('context creation')
 
         self.create_services()
+        self.mark_startup('service creation')
 
         # virtual call
         self.initialize()
+        self.mark_startup('initialize')
 
-        self.__sp_batch = SpriteBatch(self)
+        self.__sp_batch = SpriteBatch(self, backend=self.__sp_batch_backend,
+                                      use_texture_array=self.__sp_batch_use_texture_array)
 
         scale_x = self.get_display_width() / self.get_virtual_display_width()
         scale_y = self.get_display_height() / self.get_virtual_display_height()
@@ -379,6 +534,15 @@ class Game:
                                                   zfar=100.0)
 
         self.__key_state_this_frame = copy.copy(pg.key.get_pressed())
+        self.mark_startup('batch and camera')
+
+    @staticmethod
+    def __create_standalone_context():
+        # EGL works on Linux boxes with no display, elsewhere the default backend is used
+        try:
+            return mgl.create_standalone_context(require=330, backend='egl')
+        except Exception:
+            return mgl.create_standalone_context(require=330)
 
     def setup_viewport(self):
         # print(f'display_width, display_height: {self.get_display_width()}, {self.get_display_height()}' )
@@ -403,8 +567,14 @@ class Game:
     def shutdown(self):
         self.cleanup()
 
+        for layer in self.__static_layers:
+            layer.dispose()
+
         self.destroy_services()
 
+        if self.__offscreen_fbo is not None:
+            self.__offscreen_fbo.release()
+
         pg.mixer.quit()
         pg.font.quit()
         pg.quit()
@@ -437,20 +607,54 @@ class Game:
     def render_state(self):
         self.__state.render()
 
+    def __get_interpolated_sprites(self):
+        # Sprite and SpriteStore, the other members of sprites (texts...) are drawn as they are
+        return [s for s in self.__sprites if s.static_layer is None and hasattr(s, 'interpolate')]
+
+    def __save_sprite_positions(self):
+        for s in self.__get_interpolated_sprites():
+            s.save_position()
+
+    def __render_interpolated(self):
+        sprites = self.__get_interpolated_sprites()
+        for s in sprites:
+            s.interpolate(self.__interpolation)
+
+        self.__render_frame()
+
+        for s in sprites:
+            s.end_interpolation()
+
+    def __render_frame(self):
+        if self.__state is not None:
+            self.render_state()
+        self.__profile('render_state')
+
+        self.render()
+
+        if self.__profiler is not None and self.__profiler.overlay_visible:
+            self.__profiler.render_overlay(self.__sp_batch, 0, 0, self.get_virtual_display_width(),
+                                           self.get_virtual_display_height() / 4)
+        self.__profile('render')
+
     def render(self):
         self.__sp_batch.begin(sort_mode=self.__sp_batch_sort_mode, transform_matrix=self.get_virtual_matrix())
 
+        # members of a static layer are drawn by the layer
         for s in self.__sprites:
-            if s.visible:
+            if s.visible and s.static_layer is None:
                 s.render(self.__sp_batch)
 
         # draw texts
         for t in self.__texts:
-            if t.visible:
+            if t.visible and t.static_layer is None:
                 t.render(self.__sp_batch)
 
         self.__sp_batch.end()
 
+        for layer in self.__static_layers:
+            layer.render()
+
     def key_up(self, key_int):
         return not self.__key_state_this_frame[key_int]
 
@@ -483,44 +687,119 @@ class Game:
     # main loop
     #
     # ===================================================================================================
-    def run(self):
-        self.setup()
+    def __update_step(self):
+        # check if state is changed since last frame
+        if self.__new_state is not None:
+            self.__state = self.__new_state
+            self.__new_state = None
+            self.__state.enter()
 
-        while not self.__signal_quit:
-            self.clear_background()
-
-            # check if state is changed since last frame
-            if self.__new_state is not None:
-                self.__state = self.__new_state
-                self.__new_state = None
-                self.__state.enter()
+        self.__read_input()
+        self.__profile('input')
 
-            self.__read_input()
+        self.__camera.update()
+        self.__profile('camera')
 
-            self.__camera.update()
+        self.__state_update()
+        self.__profile('state_update')
 
-            self.__state_update()
+        self.update()
+        self.__profile('update')
 
-            self.update()
+        self.__state_late_update()
+        self.__profile('late_update')
 
-            self.__state_late_update()
+    def __run_fixed_steps(self):
+        step_time = 1.0 / self.__fixed_rate
+        self.__delta_time = step_time
 
-            if self.__state is not None:
-                self.render_state()
+        steps = 0
+        while self.__accumulator >= step_time and steps < self.__max_steps:
+            self.__save_sprite_positions()
 
-            self.render()
+            self.__update_step()
 
-            # check if state is changed since last frame
+            # the state changed in this step exits before the next one enters
             if self.__new_state is not None:
                 self.__state.exit()
 
-            pg.display.flip()
+            self.__accumulator -= step_time
+            steps += 1
+
+        # too far behind, the time left is dropped
+        if self.__accumulator >= step_time:
+            self.__accumulator %= step_time
 
-            # pause if necessary to achieve "FPS" frames per second
-            self.__delta_time = self.clock.tick(self.__framerate) / 1000.0
+        self.__interpolation = self.__accumulator / step_time
+
+    def run(self, max_frames: int = 0):
+        """ Runs the game until signal_quit, or for max_frames frames when it's not 0 """
+        self.setup()
+
+        render = not self.__headless or self.__headless_render
+        start_time = time.perf_counter()
+
+        while not self.__signal_quit:
+            if self.__profiler is not None:
+                self.__profiler.begin_frame()
+
+            if render:
+                self.clear_background()
+                self.__profile('render')
+
+            if self.__fixed_rate:
+                self.__run_fixed_steps()
+
+                if render:
+                    self.__render_interpolated()
+            else:
+                self.__update_step()
+
+                if render:
+                    self.__render_frame()
+
+                # check if state is changed since last frame
+                if self.__new_state is not None:
+                    self.__state.exit()
+
+            if self.__headless:
+                # simulated time, no wait
+                frame_time = 1.0 / (self.__fixed_rate or self.__framerate or 60)
+                self.__simulated_time += frame_time
+            else:
+                pg.display.flip()
+                self.__profile('flip')
+
+            if self.__profiler is not None:
+                self.__profiler.end_frame()
+
+            if not self.__headless:
+                # pause if necessary to achieve "FPS" frames per second
+                frame_time = self.clock.tick(self.__framerate) / 1000.0
+
+            if self.__fixed_rate:
+                # at most max_steps worth of time is kept, the rest would never be caught up
+                self.__accumulator += min(frame_time, self.__max_steps / self.__fixed_rate)
+            else:
+                self.__delta_time = frame_time
 
             self.process_events()
 
+            # shaders whose files changed are compiled again, when watched
+            self.services[SHADER_SERVICE].update()
+
+            self.__frame_count += 1
+            if self.__frame_count == 1 and self.__startup_profiler is not None:
+                self.__startup_profiler.mark('first frame')
+                print(self.__startup_profiler.get_report())
+
+            if self.__frame_count == max_frames:
+                self.signal_quit()
+
+        if self.__headless:
+            elapsed = time.perf_counter() - start_time
+            print(f'{self.__frame_count} frames in {elapsed:.2f} secs ({self.__frame_count / elapsed:.0f} FPS)')
+
         self.shutdown()
 
     def create_services(self):
@@ -529,6 +808,7 @@ class Game:
         self.services[SHADER_SERVICE] = ShaderService(self)
         self.services[VBO_SERVICE] = VboService(self)
         self.services[VAO_SERVICE] = VaoService(self)
+        self.services[AUDIO_SERVICE] = AudioService(self)
 
     def destroy_services(self):
         for service in self.services.values():
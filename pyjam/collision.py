@@ -0,0 +1,331 @@
+import math
+import weakref
+
+import glm
+import numpy as np
+
+
+def get_shape_radius(shape) -> float:
+    """
+    Returns the radius of the circle centered at the sprite position that contains the Box2D shape,
+    whatever the sprite angle. Box2D shapes have a skin (shape.radius) that counts for the overlap tests.
+    """
+    return get_shape_info(shape).bounding_radius
+
+
+def may_collide(sprite_1, sprite_2) -> bool:
+    """ Cheap rejection test, False when the shapes of the sprites cannot overlap """
+    distance = get_shape_radius(sprite_1.shape) + get_shape_radius(sprite_2.shape)
+    dx = sprite_1.x - sprite_2.x
+    dy = sprite_1.y - sprite_2.y
+    return dx * dx + dy * dy <= distance * distance
+
+
+# Narrow phase tests between Box2D shapes placed at sprite positions and angles (degrees), in plain Python:
+# this is much cheaper than building Box2D transforms for each b2TestOverlap.
+# Boxes are tested as oriented boxes (or as plain bounding boxes when both are axis aligned), other polygons
+# with the separating axis theorem and circles with distances.
+# Box2D shapes have a skin (shape.radius for polygons) that is kept as a margin, like b2TestOverlap does.
+# What is needed of a shape is read once and cached, so shapes must not be changed: assign a new one instead.
+# Like b2TestOverlap, shapes closer than TOUCH_DISTANCE (touching ones included) overlap.
+
+TOUCH_DISTANCE = 10 * 1.1920929e-07
+
+BOX = 0
+POLYGON = 1
+CIRCLE = 2
+
+
+class ShapeInfo:
+    """ What the narrow phase needs of a Box2D shape, in shape space """
+
+    def __init__(self, shape):
+        vertices = getattr(shape, 'vertices', None)
+        if vertices is None:
+            self.kind = CIRCLE
+            self.center = (shape.pos[0], shape.pos[1])
+            self.skin = 0.0
+            self.radius = shape.radius
+            self.bounding_radius = math.hypot(self.center[0], self.center[1]) + self.radius
+            return
+
+        self.kind = POLYGON
+        self.vertices = [(x, y) for x, y in vertices]
+        self.skin = shape.radius
+        self.bounding_radius = max(math.hypot(x, y) for x, y in self.vertices) + self.skin
+
+        if len(self.vertices) == 4:
+            (x0, y0), (x1, y1), (x2, y2), (x3, y3) = self.vertices
+            ux, uy = x1 - x0, y1 - y0
+            vx, vy = x3 - x0, y3 - y0
+            hu = math.hypot(ux, uy) / 2
+            hv = math.hypot(vx, vy) / 2
+            is_parallelogram = abs(x0 + x2 - x1 - x3) < 1e-6 and abs(y0 + y2 - y1 - y3) < 1e-6
+            if is_parallelogram and hu > 0 and hv > 0 and abs(ux * vx + uy * vy) < 1e-6 * hu * hv:
+                # rectangle: center, unit axis u (v is u rotated by 90 degrees) and half extents
+                self.kind = BOX
+                self.center = ((x0 + x2) / 2, (y0 + y2) / 2)
+                self.axis = (ux / (2 * hu), uy / (2 * hu))
+                if self.axis[0] * vy - self.axis[1] * vx < 0:
+                    hu, hv = hv, hu
+                    self.axis = (vx / (2 * hu), vy / (2 * hu))
+                self.extents = (hu, hv)
+                self.axis_aligned = self.axis[0] == 0 or self.axis[1] == 0
+
+
+__shape_infos = {}
+
+
+def get_shape_info(shape) -> ShapeInfo:
+    entry = __shape_infos.get(id(shape))
+    if entry is not None and entry[0]() is shape:
+        return entry[1]
+    key = id(shape)
+    info = ShapeInfo(shape)
+    __shape_infos[key] = (weakref.ref(shape, lambda _: __shape_infos.pop(key, None)), info)
+    return info
+
+
+def get_world_vertices(vertices, x: float, y: float, angle: float):
+    """ Returns the vertices (in shape space) moved to (x, y) and rotated by angle degrees """
+    if angle == 0:
+        return [(x + vx, y + vy) for vx, vy in vertices]
+    radians = glm.radians(angle)
+    c = math.cos(radians)
+    s = math.sin(radians)
+    return [(x + vx * c - vy * s, y + vx * s + vy * c) for vx, vy in vertices]
+
+
+def obb_overlap(center_1, axis_1, extents_1, center_2, axis_2, extents_2, margin: float = 0.0) -> bool:
+    """
+    Separating axis test of two oriented boxes, each given by its center, the unit vector of its first axis
+    (the second one is the first rotated by 90 degrees) and its half extents along the two axes.
+    """
+    dx = center_2[0] - center_1[0]
+    dy = center_2[1] - center_1[1]
+    u1x, u1y = axis_1
+    u2x, u2y = axis_2
+    # the four axes: u1, v1 = (-u1y, u1x), u2, v2
+    uu = abs(u1x * u2x + u1y * u2y)
+    uv = abs(u1y * u2x - u1x * u2y)
+    margin += TOUCH_DISTANCE
+    if abs(dx * u1x + dy * u1y) - extents_1[0] - extents_2[0] * uu - extents_2[1] * uv >= margin:
+        return False
+    if abs(dy * u1x - dx * u1y) - extents_1[1] - extents_2[0] * uv - extents_2[1] * uu >= margin:
+        return False
+    if abs(dx * u2x + dy * u2y) - extents_2[0] - extents_1[0] * uu - extents_1[1] * uv >= margin:
+        return False
+    if abs(dy * u2x - dx * u2y) - extents_2[1] - extents_1[0] * uv - extents_1[1] * uu >= margin:
+        return False
+    return True
+
+
+def _get_axes(vertices):
+    axes = []
+    previous = vertices[-1]
+    for vertex in vertices:
+        length = math.hypot(vertex[0] - previous[0], vertex[1] - previous[1])
+        if length > 0:
+            axes.append(((vertex[1] - previous[1]) / length, (previous[0] - vertex[0]) / length))
+        previous = vertex
+    return axes
+
+
+def polygons_overlap(vertices_1, vertices_2, margin: float = 0.0) -> bool:
+    """ Separating axis test of two convex polygons (world vertices) """
+    margin += TOUCH_DISTANCE
+    for axes in (_get_axes(vertices_1), _get_axes(vertices_2)):
+        for ax, ay in axes:
+            projections_1 = [x * ax + y * ay for x, y in vertices_1]
+            projections_2 = [x * ax + y * ay for x, y in vertices_2]
+            if min(projections_1) - max(projections_2) >= margin or \
+                    min(projections_2) - max(projections_1) >= margin:
+                return False
+    return True
+
+
+def circles_overlap(x1: float, y1: float, radius_1: float, x2: float, y2: float, radius_2: float) -> bool:
+    dx = x1 - x2
+    dy = y1 - y2
+    distance = radius_1 + radius_2 + TOUCH_DISTANCE
+    return dx * dx + dy * dy < distance * distance
+
+
+def polygon_circle_overlap(vertices, cx: float, cy: float, radius: float) -> bool:
+    """ Overlap test of a convex polygon (world vertices, counter clockwise as in Box2D) and a circle """
+    inside = True
+    closest = math.inf
+    previous = vertices[-1]
+    for vertex in vertices:
+        ex = vertex[0] - previous[0]
+        ey = vertex[1] - previous[1]
+        px = cx - previous[0]
+        py = cy - previous[1]
+        # the center is outside as soon as it is on the outer side of an edge
+        if ex * py - ey * px < 0:
+            inside = False
+        length2 = ex * ex + ey * ey
+        t = 0.0 if length2 == 0 else min(max((px * ex + py * ey) / length2, 0.0), 1.0)
+        dx = px - t * ex
+        dy = py - t * ey
+        closest = min(closest, dx * dx + dy * dy)
+        previous = vertex
+    radius += TOUCH_DISTANCE
+    return inside or closest < radius * radius
+
+
+def __get_box_vertices(info):
+    (cx, cy), (ux, uy), (hu, hv) = info.center, info.axis, info.extents
+    return [(cx - ux * hu + uy * hv, cy - uy * hu - ux * hv), (cx + ux * hu + uy * hv, cy + uy * hu - ux * hv),
+            (cx + ux * hu - uy * hv, cy + uy * hu + ux * hv), (cx - ux * hu - uy * hv, cy - uy * hu + ux * hv)]
+
+
+def shapes_overlap(shape_1, x1: float, y1: float, angle_1: float,
+                   shape_2, x2: float, y2: float, angle_2: float, precise: bool = False) -> bool:
+    """
+    Overlap test of two Box2D shapes (b2PolygonShape or b2CircleShape) placed at (x, y) and rotated by angle degrees.
+    With precise, b2TestOverlap is used instead.
+    """
+    if precise:
+        # Box2D is only imported by the games that need it
+        from Box2D import b2Transform, b2Vec2, b2Rot, b2TestOverlap
+
+        transform_1 = b2Transform(b2Vec2(x1, y1), b2Rot(glm.radians(angle_1)))
+        transform_2 = b2Transform(b2Vec2(x2, y2), b2Rot(glm.radians(angle_2)))
+        return b2TestOverlap(shape_1, 0, shape_2, 0, transform_1, transform_2)
+
+    info_1 = get_shape_info(shape_1)
+    info_2 = get_shape_info(shape_2)
+    if info_1.kind > info_2.kind:
+        info_1, x1, y1, angle_1, info_2, x2, y2, angle_2 = info_2, x2, y2, angle_2, info_1, x1, y1, angle_1
+    margin = info_1.skin + info_2.skin
+
+    if info_1.kind == BOX and info_2.kind == BOX:
+        (cx1, cy1), (cx2, cy2) = info_1.center, info_2.center
+        if angle_1 == 0 and angle_2 == 0 and info_1.axis_aligned and info_2.axis_aligned:
+            # axis aligned boxes, half widths and heights
+            w1, h1 = info_1.extents if info_1.axis[1] == 0 else info_1.extents[::-1]
+            w2, h2 = info_2.extents if info_2.axis[1] == 0 else info_2.extents[::-1]
+            return (abs(x2 + cx2 - x1 - cx1) - w1 - w2 < margin + TOUCH_DISTANCE and
+                    abs(y2 + cy2 - y1 - cy1) - h1 - h2 < margin + TOUCH_DISTANCE)
+
+        axis_1 = info_1.axis
+        if angle_1 != 0:
+            radians = glm.radians(angle_1)
+            c, s = math.cos(radians), math.sin(radians)
+            cx1, cy1 = cx1 * c - cy1 * s, cx1 * s + cy1 * c
+            axis_1 = (axis_1[0] * c - axis_1[1] * s, axis_1[0] * s + axis_1[1] * c)
+        axis_2 = info_2.axis
+        if angle_2 != 0:
+            radians = glm.radians(angle_2)
+            c, s = math.cos(radians), math.sin(radians)
+            cx2, cy2 = cx2 * c - cy2 * s, cx2 * s + cy2 * c
+            axis_2 = (axis_2[0] * c - axis_2[1] * s, axis_2[0] * s + axis_2[1] * c)
+        return obb_overlap((x1 + cx1, y1 + cy1), axis_1, info_1.extents,
+                           (x2 + cx2, y2 + cy2), axis_2, info_2.extents, margin)
+
+    if info_2.kind == CIRCLE:
+        cx, cy = get_world_vertices([info_2.center], x2, y2, angle_2)[0]
+        if info_1.kind == CIRCLE:
+            cx1, cy1 = get_world_vertices([info_1.center], x1, y1, angle_1)[0]
+            return circles_overlap(cx1, cy1, info_1.radius, cx, cy, info_2.radius)
+        vertices_1 = info_1.vertices if info_1.kind == POLYGON else __get_box_vertices(info_1)
+        return polygon_circle_overlap(get_world_vertices(vertices_1, x1, y1, angle_1), cx, cy,
+                                      info_2.radius + info_1.skin)
+
+    vertices_1 = info_1.vertices if info_1.kind == POLYGON else __get_box_vertices(info_1)
+    return polygons_overlap(get_world_vertices(vertices_1, x1, y1, angle_1),
+                            get_world_vertices(info_2.vertices, x2, y2, angle_2), margin)
+
+
+def sprites_overlap(sprite_1, sprite_2, precise: bool = False) -> bool:
+    """ Overlap test of the shapes of two sprites, see Sprite.collide """
+    return shapes_overlap(sprite_1.shape, sprite_1.x, sprite_1.y, sprite_1.angle,
+                          sprite_2.shape, sprite_2.x, sprite_2.y, sprite_2.angle, precise)
+
+
+def collide_many(sprite, sprites, precise: bool = False) -> np.ndarray:
+    """
+    Tests one sprite against many, returns an array of flags, one for each sprite of the list.
+    The bounding circles are compared in one NumPy pass, only the sprites within reach get the exact test.
+    """
+    count = len(sprites)
+    hits = np.zeros(count, dtype=bool)
+    if count == 0:
+        return hits
+
+    positions = np.array([(other.x, other.y) for other in sprites], dtype='f8').reshape(-1, 2)
+    radii = np.array([get_shape_radius(other.shape) for other in sprites], dtype='f8')
+    reach = radii + get_shape_radius(sprite.shape)
+    d2 = (positions[:, 0] - sprite.x) ** 2 + (positions[:, 1] - sprite.y) ** 2
+    for i in np.flatnonzero(d2 <= reach * reach):
+        hits[i] = sprites_overlap(sprite, sprites[i], precise)
+    return hits
+
+
+class SpatialHash:
+    """
+    Uniform grid broadphase: items are inserted in the cells covered by their bounds,
+    and a query returns the items sharing a cell with the queried bounds.
+    Only these candidates need the exact (narrow phase) test, e.g. Sprite.collide.
+
+    The grid is meant to be cleared and filled again every frame.
+    """
+
+    def __init__(self, cell_size: float):
+        self.__cell_size = cell_size
+        # (cell x, cell y) -> list of item numbers
+        self.__cells = {}
+        self.__items = []
+
+    @property
+    def cell_size(self) -> float:
+        return self.__cell_size
+
+    @property
+    def items(self):
+        return self.__items
+
+    def clear(self):
+        self.__cells.clear()
+        self.__items.clear()
+
+    def insert(self, item, left: float, top: float, right: float, bottom: float):
+        number = len(self.__items)
+        self.__items.append(item)
+        for cell in self.__get_cells(left, top, right, bottom):
+            bucket = self.__cells.get(cell)
+            if bucket is None:
+                self.__cells[cell] = [number]
+            else:
+                bucket.append(number)
+
+    def insert_sprite(self, item, sprite):
+        """ Inserts the item with the bounds of the sprite shape """
+        r = get_shape_radius(sprite.shape)
+        x = sprite.x
+        y = sprite.y
+        self.insert(item, x - r, y - r, x + r, y + r)
+
+    def query(self, left: float, top: float, right: float, bottom: float) -> list:
+        """ Returns the candidates in insertion order, each one once """
+        numbers = set()
+        for cell in self.__get_cells(left, top, right, bottom):
+            bucket = self.__cells.get(cell)
+            if bucket is not None:
+                numbers.update(bucket)
+        return [self.__items[number] for number in sorted(numbers)]
+
+    def query_sprite(self, sprite) -> list:
+        r = get_shape_radius(sprite.shape)
+        x = sprite.x
+        y = sprite.y
+        return self.query(x - r, y - r, x + r, y + r)
+
+    def __get_cells(self, left, top, right, bottom):
+        size = self.__cell_size
+        x0 = math.floor(left / size)
+        x1 = math.floor(right / size)
+        y0 = math.floor(top / size)
+        y1 = math.floor(bottom / size)
+        return [(cx, cy) for cy in range(y0, y1 + 1) for cx in range(x0, x1 + 1)]
@@ -3,6 +3,10 @@ TEXTURE_SERVICE = 'TextureService'
 SHADER_SERVICE = 'ShaderService'
 VBO_SERVICE = 'VboService'
 VAO_SERVICE = 'VaoService'
+AUDIO_SERVICE = 'AudioService'
 
 SHADER_DEFAULT_SPRITES = 'default_sprites'
 SHADER_UNTEXTURED = 'untextured'
+SHADER_INSTANCED_SPRITES = 'instanced_sprites'
+SHADER_ARRAY_SPRITES = 'array_sprites'
+SHADER_INSTANCED_ARRAY_SPRITES = 'instanced_array_sprites'
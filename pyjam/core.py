@@ -1,3 +1,6 @@
+from enum import Enum
+
+
 class Bounds:
     def __init__(self, left: float, top: float, width: float, height: float):
         self.left = left
@@ -22,3 +25,7 @@ class Bounds:
         self.height = value
 
 
+class TextAlignment(Enum):
+    LEFT = 0,
+    CENTER = 1,
+    RIGHT = 2
@@ -0,0 +1,23 @@
+#version 330 core
+
+layout (location = 0) in vec3 in_position;
+layout (location = 1) in vec4 in_color;
+layout (location = 2) in vec2 in_tex_coords_0 ;
+layout (location = 3) in float in_layer ;
+
+uniform mat4 model_matrix ;
+uniform mat4 view_matrix ;
+uniform mat4 proj_matrix ;
+
+// textures smaller than the layers only cover a part of their layer
+uniform vec2 layer_uv_scales[64] ;
+
+out vec4 ex_color;
+out vec3 ex_tex_coords_0 ;
+
+void main(void)
+{
+    gl_Position = proj_matrix * view_matrix * model_matrix * vec4( in_position, 1.0) ;
+	ex_color = in_color ;
+	ex_tex_coords_0 = vec3(in_tex_coords_0 * layer_uv_scales[int(in_layer)], in_layer) ;
+}
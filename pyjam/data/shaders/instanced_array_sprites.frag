@@ -0,0 +1,13 @@
+#version 330 core
+
+in  vec4 ex_color;
+in  vec3 ex_tex_coords_0 ;
+
+uniform sampler2DArray material_diffuse ;
+
+out vec4 out_color;
+
+void main(void)
+{
+	out_color = texture(material_diffuse, ex_tex_coords_0) * ex_color ;
+}
@@ -0,0 +1,33 @@
+#version 330 core
+
+// unit quad corner, (0,0) is the BL corner and (1,1) the TR one
+layout (location = 0) in vec2 in_corner;
+
+// per instance attributes
+layout (location = 1) in vec2 in_pivot;
+layout (location = 2) in vec4 in_rect;
+layout (location = 3) in vec2 in_rotation;
+layout (location = 4) in vec4 in_tex_rect;
+layout (location = 5) in vec4 in_color;
+layout (location = 6) in float in_depth;
+
+uniform mat4 model_matrix ;
+uniform mat4 view_matrix ;
+uniform mat4 proj_matrix ;
+
+out vec4 ex_color;
+out vec2 ex_tex_coords_0 ;
+
+void main(void)
+{
+	// corner relative to the pivot, then rotated around the pivot
+	// in_rotation holds (sin, cos) of the rotation angle
+	vec2 corner = mix(in_rect.xy, in_rect.zw, in_corner) ;
+	vec2 position = in_pivot + vec2(corner.x * in_rotation.y - corner.y * in_rotation.x,
+	                                corner.x * in_rotation.x + corner.y * in_rotation.y) ;
+
+	gl_Position = proj_matrix * view_matrix * model_matrix * vec4(position, in_depth, 1.0) ;
+	ex_color = in_color ;
+	// in_tex_rect holds the texture coordinates of the TL and BR corners, already swapped when flipped
+	ex_tex_coords_0 = mix(in_tex_rect.xy, in_tex_rect.zw, vec2(in_corner.x, 1.0 - in_corner.y)) ;
+}
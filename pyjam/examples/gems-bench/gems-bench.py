@@ -6,7 +6,7 @@ import pygame as pg
 from pyjam.constants import *
 from pyjam import application, utils
 from pyjam.sprites.animation import Animation2D
-from pyjam.sprites.batch import SpriteSortMode
+from pyjam.sprites.batch import SpriteSortMode, SpriteBatchBackend
 from pyjam.sprites.sheet import SpriteSheet
 from pyjam.sprites.font import SpriteFont
 from pyjam.text import Text
@@ -96,7 +96,9 @@ class JamSpritesState(application.GameState):
         self.text_draw_mode = self.create_text('draw-mode',
                                                glm.vec2(0, self.game.get_virtual_display_height() - 32),
                                                glm.vec2(24, 24))
-        self.text_help = self.create_text('H Hide/Show help\nS Change Sort mode\n+/- Add / remove sprites',
+        self.text_help = self.create_text('H Hide/Show help\nS Change Sort mode\nB Change batch backend\n'
+                                          'A Toggle texture array\n'
+                                          '+/- Add / remove sprites',
                                           glm.vec2(0, 64),
                                           glm.vec2(24, 24))
 
@@ -133,6 +135,11 @@ class JamSpritesState(application.GameState):
         elif self.game.key_pressed(pg.K_s):
             self.sort_mode_idx = utils.wrap(self.sort_mode_idx + 1, 0, len(SpriteSortMode) - 1)
             self.game.set_sprite_batch_sort_mode(SpriteSortMode(self.sort_mode_idx))
+        elif self.game.key_pressed(pg.K_b):
+            backend_idx = utils.wrap(self.game.get_sprite_batch_backend() + 1, 0, len(SpriteBatchBackend) - 1)
+            self.game.set_sprite_batch_backend(SpriteBatchBackend(backend_idx))
+        elif self.game.key_pressed(pg.K_a):
+            self.game.set_sprite_batch_use_texture_array(not self.game.get_sprite_batch_use_texture_array())
         elif self.game.key_pressed(pg.K_h):
             self.text_help.visible = not self.text_help.visible
         elif self.game.key_pressed(pg.K_ESCAPE):
@@ -150,7 +157,9 @@ class JamSpritesState(application.GameState):
             self.text_fps.color = pg.Color('red')
 
         self.text_sprites_count.text = f'Sprites: {len(self.game.sprites) - 4}'
-        self.text_draw_mode.text = f'Sort mode: {self.game.get_sprite_batch_sort_mode().name}'
+        self.text_draw_mode.text = f'Sort mode: {self.game.get_sprite_batch_sort_mode().name} ' \
+                                   f'Backend: {self.game.get_sprite_batch_backend().name}' \
+                                   f'{" + texture array" if self.game.get_sprite_batch_use_texture_array() else ""}'
 
 
 if __name__ == '__main__':
@@ -0,0 +1,67 @@
+import glm
+
+from pyjam.interfaces import IDisposable
+from pyjam.sprites.batch import SpriteBatch, SpriteSortMode
+
+
+class StaticLayer(IDisposable):
+    """
+    A retained group of sprites and texts (anything with a render(sprite_batch) method).
+    Their vertices are built once and kept in a vertex buffer of the layer: every frame the layer is drawn
+    with a draw call for each texture it uses, and the vertices are built again only when a member changes.
+
+    Sprite and Text notify their layer from their setters. Changes that bypass the setters
+    (e.g. sprite.position.x += 1) must be followed by a call to invalidate.
+    """
+
+    def __init__(self, game, sort_mode=SpriteSortMode.BACK_TO_FRONT):
+        self.__game = game
+        self.__sort_mode = sort_mode
+        self.__sp_batch = SpriteBatch(game)
+        self.__members = []
+        self.__dirty = True
+        self.__transform_matrix = None
+
+    @property
+    def members(self):
+        return self.__members
+
+    @property
+    def dirty(self) -> bool:
+        return self.__dirty
+
+    def add(self, member):
+        if member.static_layer is not None:
+            raise Exception('The member already belongs to a static layer')
+        member.static_layer = self
+        self.__members.append(member)
+        self.__dirty = True
+
+    def remove(self, member):
+        self.__members.remove(member)
+        member.static_layer = None
+        self.__dirty = True
+
+    def invalidate(self):
+        """ Marks the layer to be built again before it is drawn """
+        self.__dirty = True
+
+    def build(self, transform_matrix: glm.mat4):
+        self.__sp_batch.begin(sort_mode=self.__sort_mode, transform_matrix=transform_matrix)
+        for member in self.__members:
+            if member.visible:
+                member.render(self.__sp_batch)
+        self.__sp_batch.bake()
+        self.__transform_matrix = transform_matrix
+        self.__dirty = False
+
+    def render(self, transform_matrix: glm.mat4 = None):
+        if transform_matrix is None:
+            transform_matrix = self.__game.get_virtual_matrix()
+
+        if self.__dirty or transform_matrix != self.__transform_matrix:
+            self.build(transform_matrix)
+        self.__sp_batch.draw_baked()
+
+    def dispose(self):
+        self.__sp_batch.dispose()
@@ -0,0 +1,215 @@
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import glm
+import numpy as np
+import pygame as pg
+
+from pyjam.application import GameState
+from pyjam.constants import *
+from pyjam.sprites.frame import SpriteFrame
+
+
+class AssetLoader:
+    """
+    Loads a manifest of assets with a pool of worker threads.
+
+    Every entry has a work, run by a worker (reading and decoding files, no GL or mixer call there),
+    and a finish, run on the main thread by update with the result of the work (GL upload, registration
+    in the game services). The finishes run in manifest order, so an entry can rely on the ones added before it.
+    A failing optional entry is reported and skipped, the error of any other entry is raised by update.
+    """
+
+    def __init__(self, game, max_workers: int = 4):
+        self.__game = game
+        self.__max_workers = max_workers
+
+        # entries as [name, work, finish, optional, future]
+        self.__entries = []
+        self.__finished = 0
+        self.__executor = None
+
+        # names of the optional entries that failed
+        self.__failed = []
+
+    @property
+    def count(self) -> int:
+        return len(self.__entries)
+
+    @property
+    def progress(self) -> float:
+        """ Returns the part of the entries finished, from 0 to 1 """
+        return self.__finished / len(self.__entries) if self.__entries else 1.0
+
+    @property
+    def done(self) -> bool:
+        return self.__finished == len(self.__entries)
+
+    @property
+    def failed(self) -> list:
+        return self.__failed
+
+    def add_task(self, name: str, work, finish=None, optional: bool = False):
+        """ work() runs on a worker thread, finish(result) on the main thread """
+        if self.__executor is not None:
+            raise Exception('Cannot add assets to a loader already started.')
+        self.__entries.append([name, work, finish, optional, None])
+
+    def add_image(self, path: str):
+        """ The image is registered as the asset path, a SpriteFrame like TextureService.load_sprite_frame does """
+        texture_service = self.__game.services[TEXTURE_SERVICE]
+
+        def finish(pixels):
+            sprite_frame = SpriteFrame(texture_service.create_texture(pixels))
+            self.__game.services[ASSET_SERVICE].insert(path, sprite_frame)
+
+        self.add_task(path, lambda: texture_service.load_image(path), finish)
+
+    def add_sound(self, key, path: str):
+        """ The sound is added to the game sound fx as key, a sound that cannot be loaded is skipped """
+        # read here, the mixer is not to be queried from the workers
+        mixer_format = pg.mixer.get_init()
+
+        def finish(sound):
+            # printed here, the prints of the workers would be mixed up
+            print(f'Loading file: {path}')
+            if not isinstance(sound, pg.mixer.Sound):
+                sound = pg.mixer.Sound(buffer=sound)
+            self.__game.add_sfx(key, sound)
+
+        self.add_task(path, lambda: AssetLoader.decode_sound(path, mixer_format), finish, optional=True)
+
+    @staticmethod
+    def decode_sound(path: str, mixer_format):
+        """
+        Returns the samples of a 16 bit PCM wav file converted to the mixer format (frequency, size, channels),
+        ready for pg.mixer.Sound(buffer=...). pg.mixer.Sound holds the GIL while it converts the samples,
+        so the conversion is done here with NumPy. Other files are loaded by pg.mixer.Sound
+        """
+        try:
+            with wave.open(path, 'rb') as wav:
+                rate = wav.getframerate()
+                channels = wav.getnchannels()
+                sample_width = wav.getsampwidth()
+                frames = wav.readframes(wav.getnframes())
+        except wave.Error:
+            return pg.mixer.Sound(path)
+
+        frequency, size, mixer_channels = mixer_format
+        if sample_width != 2 or size != -16 or channels not in (1, 2) or mixer_channels not in (1, 2):
+            return pg.mixer.Sound(path)
+
+        if rate == frequency and channels == mixer_channels:
+            return frames
+
+        samples = np.frombuffer(frames, dtype='<i2').reshape(-1, channels).astype('f4')
+        if channels != mixer_channels:
+            samples = np.repeat(samples, 2, axis=1) if channels == 1 else samples.mean(axis=1, keepdims=True)
+
+        # linear resampling, the positions are evenly spaced so the neighbours are found by truncation
+        if rate != frequency and len(samples) > 1:
+            positions = np.arange(round(len(samples) * frequency / rate)) * (rate / frequency)
+            left = np.minimum(positions.astype('i8'), len(samples) - 2)
+            weights = np.minimum(positions - left, 1.0).astype('f4')[:, np.newaxis]
+            resampled = np.take(samples, left, axis=0)
+            resampled += (np.take(samples, left + 1, axis=0) - resampled) * weights
+            samples = resampled
+
+        # interpolated samples stay in the 16 bit range
+        return np.rint(samples).astype('<i2').tobytes()
+
+    def start(self):
+        """ Hands the entries to the workers """
+        if self.__executor is not None:
+            return
+        self.__executor = ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix='AssetLoader')
+        for entry in self.__entries:
+            entry[4] = self.__executor.submit(entry[1])
+        if not self.__entries:
+            self.__executor.shutdown()
+
+    def update(self, time_budget: float = 0.01) -> bool:
+        """
+        Runs the finishes of the entries whose work is done, in manifest order, for about time_budget secs
+        (at least one). Returns done
+        """
+        self.start()
+
+        start_time = time.perf_counter()
+        while not self.done:
+            future = self.__entries[self.__finished][4]
+            if not future.done() or time.perf_counter() - start_time > time_budget:
+                break
+            self.__finish_next()
+
+        return self.done
+
+    def wait(self):
+        """ Loads everything, blocking """
+        self.start()
+        while not self.done:
+            self.__finish_next()
+
+    def __finish_next(self):
+        name, _, finish, optional, future = self.__entries[self.__finished]
+        try:
+            result = future.result()
+        except Exception as e:
+            if not optional:
+                self.__executor.shutdown(cancel_futures=True)
+                raise
+            print(f'Cannot load {name}: {e}')
+            self.__failed.append(name)
+        else:
+            if finish is not None:
+                finish(result)
+        self.__finished += 1
+
+        if self.done:
+            self.__executor.shutdown()
+
+
+class LoadingState(GameState):
+    """
+    Runs an AssetLoader a bit every frame and shows its progress as a bar in the middle of the screen,
+    on_done() is called once everything is loaded (usually to change state)
+    """
+
+    def __init__(self, game, loader: AssetLoader, on_done, time_budget: float = 0.01):
+        super().__init__(game)
+        self.__loader = loader
+        self.__on_done = on_done
+        self.__time_budget = time_budget
+        self.__texture = None
+        self.__start_time = 0.0
+
+    def enter(self):
+        self.__texture = self.game.services[TEXTURE_SERVICE].create_color_texture(pg.Color('white'))
+        self.__start_time = time.perf_counter()
+        self.__loader.start()
+
+    def exit(self):
+        if self.__texture is not None:
+            self.__texture.dispose()
+            self.__texture = None
+
+    def update(self):
+        if self.__on_done is not None and self.__loader.update(self.__time_budget):
+            print(f'Loaded {self.__loader.count} assets in {time.perf_counter() - self.__start_time:.2f} secs')
+            on_done = self.__on_done
+            self.__on_done = None
+            on_done()
+
+    def render(self):
+        width = self.game.get_virtual_display_width()
+        height = self.game.get_virtual_display_height()
+        bar_size = glm.vec2(width * 0.6, max(height * 0.02, 2.0))
+        position = glm.vec2((width - bar_size.x) / 2, (height - bar_size.y) / 2)
+
+        sprite_batch = self.game.get_sprite_batch()
+        sprite_batch.begin(transform_matrix=self.game.get_virtual_matrix())
+        sprite_batch.draw(texture=self.__texture, position=position, size=bar_size, color=pg.Color(64, 64, 64))
+        sprite_batch.draw(texture=self.__texture, position=position,
+                          size=glm.vec2(bar_size.x * self.__loader.progress, bar_size.y), color=pg.Color('white'))
+        sprite_batch.end()
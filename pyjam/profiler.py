@@ -0,0 +1,188 @@
+import csv
+import json
+import sys
+import time
+
+import numpy as np
+import pygame as pg
+
+from pyjam import utils
+from pyjam.constants import *
+from pyjam.sprites.batch import BaseSpriteBatcher
+
+
+class FrameProfiler:
+    """
+    Times the phases of Game.run and counts what the sprite batches send to the GPU, frame by frame.
+
+    The last capacity frames are kept in a ring buffer, one row for each frame: the frame number, the secs spent
+    in each phase, the total and the sprite batch counters (see BatchStats).
+    The rows can be drawn as a graph with render_overlay and saved with dump_csv or dump_json.
+    """
+
+    PHASES = ('input', 'camera', 'state_update', 'update', 'late_update', 'render_state', 'render', 'flip')
+    COUNTERS = ('draw_calls', 'flushes', 'texture_binds', 'batch_items', 'vertices')
+    COLUMNS = ('frame',) + PHASES + ('total',) + COUNTERS
+
+    # graph colors of the phases
+    PHASE_COLORS = ('gray', 'brown', 'orange', 'yellow', 'gold', 'cyan', 'green', 'magenta')
+
+    def __init__(self, game, capacity: int = 600):
+        self.__game = game
+        self.__capacity = capacity
+
+        self.__rows = np.zeros((capacity, len(FrameProfiler.COLUMNS)), dtype='f8')
+        self.__frame_count = 0
+
+        # the frame being timed
+        self.__phase_indices = {phase: i for i, phase in enumerate(FrameProfiler.PHASES)}
+        self.__phase_times = np.zeros(len(FrameProfiler.PHASES), dtype='f8')
+        self.__frame_start = 0.0
+        self.__last_mark = 0.0
+
+        self.__phase_colors = utils.pack_colors([pg.Color(color) for color in FrameProfiler.PHASE_COLORS])
+        self.__texture = None
+
+        # whether the game draws the graph
+        self.overlay_visible = False
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def frame_count(self) -> int:
+        """ Returns the number of frames recorded, the buffer holds the last capacity ones """
+        return self.__frame_count
+
+    def begin_frame(self):
+        self.__phase_times[:] = 0.0
+        BaseSpriteBatcher.stats.reset()
+        self.__frame_start = self.__last_mark = time.perf_counter()
+
+    def mark(self, phase: str):
+        """ Ends a phase: the time since the previous mark (or the frame start) is added to it """
+        now = time.perf_counter()
+        self.__phase_times[self.__phase_indices[phase]] += now - self.__last_mark
+        self.__last_mark = now
+
+    def end_frame(self):
+        stats = BaseSpriteBatcher.stats
+        row = self.__rows[self.__frame_count % self.__capacity]
+        row[0] = self.__frame_count
+        row[1:len(FrameProfiler.PHASES) + 1] = self.__phase_times
+        row[len(FrameProfiler.PHASES) + 1] = time.perf_counter() - self.__frame_start
+        row[len(FrameProfiler.PHASES) + 2:] = (stats.draw_calls, stats.flushes, stats.texture_binds,
+                                               stats.batch_items, stats.vertices)
+        self.__frame_count += 1
+
+    def get_rows(self) -> np.ndarray:
+        """ Returns the recorded rows, oldest first, with the columns of COLUMNS """
+        if self.__frame_count <= self.__capacity:
+            return self.__rows[:self.__frame_count].copy()
+        start = self.__frame_count % self.__capacity
+        return np.concatenate((self.__rows[start:], self.__rows[:start]))
+
+    def get_averages(self) -> dict:
+        """ Returns the mean of each column (but frame) over the recorded rows """
+        rows = self.get_rows()
+        if len(rows) == 0:
+            return {}
+        return dict(zip(FrameProfiler.COLUMNS[1:], rows[:, 1:].mean(axis=0).tolist()))
+
+    def dump_csv(self, file_path: str):
+        with open(file_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(FrameProfiler.COLUMNS)
+            for row in self.get_rows().tolist():
+                writer.writerow(self.__format_row(row))
+
+    def dump_json(self, file_path: str):
+        with open(file_path, 'w') as f:
+            json.dump([dict(zip(FrameProfiler.COLUMNS, self.__format_row(row))) for row in self.get_rows().tolist()],
+                      f, indent=1)
+
+    @staticmethod
+    def __format_row(row):
+        # the frame and the counters are integers
+        phases_end = len(FrameProfiler.PHASES) + 2
+        return [int(row[0])] + row[1:phases_end] + [int(value) for value in row[phases_end:]]
+
+    def render_overlay(self, sprite_batch, x: float, y: float, width: float, height: float, max_time: float = 1 / 30):
+        """
+        Draws the last frames as stacked bars, one bar for each frame (the newest on the right) and one color
+        for each phase (PHASE_COLORS), in virtual coordinates: height is max_time secs.
+        sprite_batch must not be between begin and end
+        """
+        rows = self.get_rows()
+        if len(rows) == 0:
+            return
+
+        if self.__texture is None:
+            self.__texture = self.__game.services[TEXTURE_SERVICE].create_color_texture(pg.Color('white'))
+
+        phase_count = len(FrameProfiler.PHASES)
+        bar_width = width / self.__capacity
+        bar_x = x + width - bar_width * np.arange(len(rows), 0, -1)
+
+        # the top of each phase is the bottom of the next one
+        scale = height / max_time
+        tops = np.minimum(np.cumsum(rows[:, 1:phase_count + 1], axis=1) * scale, height)
+        bottoms = np.hstack((np.zeros((len(rows), 1)), tops[:, :-1]))
+        heights = (tops - bottoms).T.ravel()
+        if self.__game.is_origin_topleft():
+            bar_y = y + height - tops.T.ravel()
+        else:
+            bar_y = y + bottoms.T.ravel()
+
+        sprite_batch.begin(transform_matrix=self.__game.get_virtual_matrix())
+        sprite_batch.draw_many(texture=self.__texture,
+                               positions=np.stack((np.tile(bar_x, phase_count), bar_y), axis=1),
+                               sizes=np.stack((np.full(len(heights), bar_width), heights), axis=1),
+                               colors=np.repeat(self.__phase_colors, len(rows)))
+        sprite_batch.end()
+
+
+class StartupProfiler:
+    """
+    Times the steps of the game startup, up to the first frame.
+
+    Every mark ends a step, that took the time since the previous mark: the Game marks its own steps
+    (see Game.set_startup_profiling), the game can mark the ones of its initialize with Game.mark_startup.
+    """
+
+    # the packages whose import is reported, they are the slow ones
+    HEAVY_MODULES = ('pygame', 'numpy', 'moderngl', 'glm', 'PIL', 'Box2D')
+
+    def __init__(self):
+        # (step, secs) in order
+        self.__steps = []
+        self.__last_mark = time.perf_counter()
+
+    @property
+    def steps(self) -> list:
+        return self.__steps
+
+    @property
+    def total(self) -> float:
+        return sum(secs for _, secs in self.__steps)
+
+    def add(self, step: str, secs: float):
+        """ Adds a step timed elsewhere, e.g. the import of the game modules before the Game is created """
+        self.__steps.append((step, secs))
+
+    def mark(self, step: str):
+        now = time.perf_counter()
+        self.__steps.append((step, now - self.__last_mark))
+        self.__last_mark = now
+
+    def get_report(self) -> str:
+        lines = ['Startup profile:']
+        for step, secs in self.__steps:
+            lines.append(f'  {step:<20}{secs * 1000:9.1f} ms')
+        lines.append(f'  {"total":<20}{self.total * 1000:9.1f} ms')
+
+        loaded = [name for name in StartupProfiler.HEAVY_MODULES if name in sys.modules]
+        not_loaded = [name for name in StartupProfiler.HEAVY_MODULES if name not in sys.modules]
+        lines.append(f'  modules loaded: {", ".join(loaded) or "none"}, not loaded: {", ".join(not_loaded) or "none"}')
+        return '\n'.join(lines)
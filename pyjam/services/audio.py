@@ -0,0 +1,206 @@
+from collections import OrderedDict
+
+import pygame as pg
+
+from pyjam.interfaces import IDisposable
+
+DEFAULT_SFX_GROUP = 'default'
+
+
+class SfxEntry:
+    def __init__(self, path, group, priority, min_interval, resident):
+        # the file the sound is loaded from when needed, None for a sound given already decoded
+        self.path = path
+        self.sound = None
+        self.group = group
+        self.priority = priority
+        self.min_interval = min_interval
+        self.resident = resident
+
+        # bytes of decoded samples, time of the last play in secs
+        self.size = 0
+        self.last_play = None
+
+
+class AudioService(IDisposable):
+    """
+    Plays the sound fx of the game on channels of its own.
+
+    The channels are split in groups (set_groups), every sound plays in the channels of its group:
+    when they are all busy, the sound takes the channel of the oldest sound with the lowest priority,
+    if that priority is not higher than its own, otherwise it is dropped. So a burst of sounds in a group
+    never takes the channels of the other groups, and the important sounds of a group are never cut by the others.
+    A sound played again before min_interval secs is dropped too.
+
+    A sound registered with a path is decoded on first play (or by preload), the decoded sounds that are
+    not resident are kept in an LRU: the least recently played ones are released when they take more
+    than max_bytes, and decoded again when needed.
+    """
+
+    def __init__(self, game, max_bytes: int = 32 * 1024 * 1024):
+        self.__game = game
+        self.__max_bytes = max_bytes
+
+        self.__entries = {}
+
+        # decoded sounds that can be released, least recently played first, and their bytes
+        self.__lru = OrderedDict()
+        self.__lru_bytes = 0
+
+        # group name => channel indices, what plays on each channel as (key, priority, start time)
+        self.__groups = {}
+        self.__channels = []
+        self.__playing = []
+
+        # until the game sets up its groups every sound goes in the 8 channels pygame starts with
+        self.set_groups({DEFAULT_SFX_GROUP: 8})
+
+    @property
+    def lru_bytes(self) -> int:
+        return self.__lru_bytes
+
+    def set_groups(self, groups: dict):
+        """
+        Splits the channels in groups, as a dict of group name => number of channels.
+        The sounds given decoded without being registered (see set_sound) go in the DEFAULT_SFX_GROUP group
+        """
+        self.__groups = {}
+        self.__playing = []
+        for name, channel_count in groups.items():
+            first = len(self.__playing)
+            self.__groups[name] = list(range(first, first + channel_count))
+            self.__playing.extend([None] * channel_count)
+
+        if pg.mixer.get_init() is not None:
+            pg.mixer.stop()
+            pg.mixer.set_num_channels(len(self.__playing))
+            self.__channels = [pg.mixer.Channel(i) for i in range(len(self.__playing))]
+
+    def register(self, key, path: str = None, group: str = DEFAULT_SFX_GROUP, priority: int = 0,
+                 min_interval: float = 0.0, resident: bool = False):
+        """ Registers a sound fx, it's loaded from path when first played (see preload) """
+        if group not in self.__groups:
+            raise Exception(f'Unknown sound group {group}.')
+        self.__entries[key] = SfxEntry(path, group, priority, min_interval, resident)
+
+    def set_sound(self, key, sound: pg.mixer.Sound):
+        """ Gives an already decoded sound, the key is registered as a resident sound of the default group if needed """
+        entry = self.__entries.get(key)
+        if entry is None:
+            self.register(key, resident=True)
+            entry = self.__entries[key]
+        self.__release(key, entry)
+        self.__keep(key, entry, sound)
+
+    def delete(self, key):
+        entry = self.__entries.pop(key)
+        if entry.sound is not None:
+            entry.sound.stop()
+        self.__release(key, entry)
+
+    def preload(self, keys=None):
+        """ Decodes the given sounds (all the registered ones by default), so playing them does not load them """
+        for key in self.__entries if keys is None else keys:
+            self.__get_sound(key)
+
+    def is_loaded(self, key) -> bool:
+        return self.__entries[key].sound is not None
+
+    def play(self, key, loops=0, maxtime=0, fade_ms=0):
+        """ Plays the sound in its group (see pg.mixer.Sound.play), returns the channel or None if it's dropped """
+        entry = self.__entries[key]
+        now = self.__game.time
+        if entry.last_play is not None and now - entry.last_play < entry.min_interval:
+            return None
+
+        channel_index = self.__find_channel(entry)
+        if channel_index is None:
+            return None
+
+        sound = self.__get_sound(key)
+        if sound is None:
+            return None
+
+        entry.last_play = now
+        channel = self.__channels[channel_index]
+        channel.play(sound, loops, maxtime, fade_ms)
+        self.__playing[channel_index] = (key, entry.priority, now)
+        return channel
+
+    def stop(self, key):
+        sound = self.__entries[key].sound
+        if sound is not None:
+            sound.stop()
+
+    def get_num_channels(self, key) -> int:
+        sound = self.__entries[key].sound
+        return sound.get_num_channels() if sound is not None else 0
+
+    def __find_channel(self, entry):
+        candidate = None
+        for index in self.__groups[entry.group]:
+            if not self.__channels[index].get_busy():
+                return index
+
+            # not played by the service
+            if self.__playing[index] is None:
+                continue
+
+            # the oldest of the lowest priority sounds
+            _, priority, start_time = self.__playing[index]
+            if priority <= entry.priority and (candidate is None or
+                                               (priority, start_time) < self.__playing[candidate][1:]):
+                candidate = index
+        return candidate
+
+    def __get_sound(self, key):
+        entry = self.__entries[key]
+        if entry.sound is not None:
+            if not entry.resident:
+                self.__lru.move_to_end(key)
+            return entry.sound
+
+        if entry.path is None:
+            return None
+        try:
+            sound = pg.mixer.Sound(entry.path)
+        except (OSError, pg.error) as e:
+            # not tried again, the sound stays silent
+            print(f'Cannot load sound {entry.path}: {e}')
+            entry.path = None
+            return None
+        self.__keep(key, entry, sound)
+        return entry.sound
+
+    def __keep(self, key, entry, sound):
+        entry.sound = sound
+        frequency, size, channels = pg.mixer.get_init()
+        entry.size = int(sound.get_length() * frequency) * channels * (abs(size) // 8)
+        if entry.resident:
+            return
+
+        self.__lru[key] = entry
+        self.__lru_bytes += entry.size
+
+        # release the least recently played sounds, but not while they play
+        for old_key in list(self.__lru):
+            if self.__lru_bytes <= self.__max_bytes:
+                break
+            old_entry = self.__lru[old_key]
+            if old_key != key and old_entry.sound.get_num_channels() == 0:
+                self.__release(old_key, old_entry)
+
+    def __release(self, key, entry):
+        if key in self.__lru:
+            del self.__lru[key]
+            self.__lru_bytes -= entry.size
+        # a sound given decoded cannot be loaded again
+        if entry.path is not None:
+            entry.sound = None
+
+    def dispose(self):
+        if pg.mixer.get_init() is not None:
+            pg.mixer.stop()
+        self.__entries = {}
+        self.__lru.clear()
+        self.__lru_bytes = 0
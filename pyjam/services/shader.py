@@ -1,16 +1,117 @@
+import hashlib
+import os
+import time
+
 import moderngl as mgl
 import pyjam
 from pyjam.interfaces import IDisposable
 from pyjam.constants import *
 
 
+class ProgramCache(dict):
+    """ The programs of a ShaderService by name, a program is compiled the first time it's asked for """
+
+    def __init__(self, shader_service: 'ShaderService'):
+        super().__init__()
+        self.__shader_service = shader_service
+
+    def __missing__(self, name):
+        program = self.__shader_service.compile(name)
+        self[name] = program
+        return program
+
+
 class ShaderService(IDisposable):
+    """
+    Compiles the shader programs of a manifest, name => (vertex file, fragment file) in the shader folder.
+
+    The programs are compiled the first time they are asked for in programs, and the programs with
+    the same sources share one compiled program.
+    With watch, the programs whose files change are compiled again in place: programs[name] gives the new one
+    (the sprite batchers pick it up on their next draw), a program that does not compile keeps the old one.
+    """
+
+    # the programs of pyjam, the games can register their own
+    DEFAULT_MANIFEST = {name: (f'{name}.vert', f'{name}.frag')
+                        for name in (SHADER_DEFAULT_SPRITES, SHADER_UNTEXTURED, SHADER_INSTANCED_SPRITES,
+                                     SHADER_ARRAY_SPRITES, SHADER_INSTANCED_ARRAY_SPRITES)}
+
     def __init__(self, game: 'pyjam.application.Game', shader_folder: str = ''):
         self.__game = game
-        self.programs = {SHADER_DEFAULT_SPRITES: self.get_program(shader_folder, SHADER_DEFAULT_SPRITES),
-                         SHADER_UNTEXTURED: self.get_program(shader_folder, SHADER_UNTEXTURED)}
+        self.__shader_folder = shader_folder if shader_folder != '' else pyjam.get_data('shaders')
+        self.__manifest = dict(ShaderService.DEFAULT_MANIFEST)
+
+        # source hash => compiled program, and the source hash and file times of each compiled name
+        self.__compiled = {}
+        self.__hashes = {}
+        self.__file_times = {}
+
+        # secs between two checks of the shader files, 0 when not watching
+        self.__watch_interval = 0.0
+        self.__last_check = 0.0
+
+        self.programs = ProgramCache(self)
+
+    @property
+    def watching(self) -> bool:
+        return self.__watch_interval > 0.0
+
+    def register(self, name: str, vertex_file: str, fragment_file: str):
+        """ Adds a program to the manifest, the files are relative to the shader folder """
+        self.__manifest[name] = (vertex_file, fragment_file)
+        if name in self.programs:
+            self.reload(name)
+
+    def watch(self, enabled: bool = True, interval: float = 0.5):
+        """ Checks the files of the compiled programs every interval secs (see update) and reloads the changed ones """
+        self.__watch_interval = interval if enabled else 0.0
+
+    def update(self):
+        """ Called every frame by the game, returns the names of the programs reloaded """
+        if not self.watching or time.perf_counter() - self.__last_check < self.__watch_interval:
+            return []
+        self.__last_check = time.perf_counter()
+
+        reloaded = []
+        for name in list(self.programs):
+            if self.__get_file_times(name) != self.__file_times[name] and self.reload(name):
+                reloaded.append(name)
+        return reloaded
+
+    def reload(self, name: str) -> bool:
+        """ Compiles the program again from its files, returns False if it fails (the old program is kept) """
+        old_hash = self.__hashes[name]
+        try:
+            program = self.compile(name)
+        except (OSError, mgl.Error) as e:
+            print(f'Cannot compile shader {name}: {e}')
+            return False
+
+        print(f'Reloaded shader: {name}')
+        self.programs[name] = program
+        self.__release_unused(old_hash)
+        return True
+
+    def compile(self, name: str) -> mgl.Program:
+        """ Returns the program of the manifest entry, compiled unless a program has the same sources """
+        vertex_file, fragment_file = self.__manifest[name]
+        self.__file_times[name] = self.__get_file_times(name)
+
+        with open(os.path.join(self.__shader_folder, vertex_file)) as file:
+            vertex_shader = file.read()
+
+        with open(os.path.join(self.__shader_folder, fragment_file)) as file:
+            fragment_shader = file.read()
+
+        source_hash = hashlib.sha1(f'{vertex_shader}\0{fragment_shader}'.encode('utf-8')).hexdigest()
+        if source_hash not in self.__compiled:
+            self.__compiled[source_hash] = self.__game.ctx.program(vertex_shader=vertex_shader,
+                                                                   fragment_shader=fragment_shader)
+        self.__hashes[name] = source_hash
+        return self.__compiled[source_hash]
 
     def get_program(self, shader_folder: str, shader_name: str) -> mgl.program:
+        """ Compiles a program outside of the manifest, the caller releases it """
         if shader_folder == '':
             shader_folder = pyjam.get_data('shaders')
 
@@ -22,5 +123,20 @@ class ShaderService(IDisposable):
 
         return self.__game.ctx.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
 
+    def __get_file_times(self, name):
+        # a missing file (e.g. while an editor saves it) counts as a change, checked again next time
+        try:
+            return tuple(os.stat(os.path.join(self.__shader_folder, file)).st_mtime_ns
+                         for file in self.__manifest[name])
+        except OSError:
+            return None
+
+    def __release_unused(self, source_hash):
+        if source_hash not in self.__hashes.values():
+            self.__compiled.pop(source_hash).release()
+
     def dispose(self):
-        [program.release() for program in self.programs.values()]
+        [program.release() for program in self.__compiled.values()]
+        self.__compiled = {}
+        self.__hashes = {}
+        self.programs.clear()
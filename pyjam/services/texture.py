@@ -1,21 +1,28 @@
+import hashlib
+import io
 import os
+import struct
+import threading
 
 import moderngl as mgl
+import numpy as np
 import pygame as pg
-import PIL.Image
-import PIL.ImageOps
 
 from pyjam.interfaces import IDisposable
 from pyjam.sprites.frame import SpriteFrame
-from pyjam.texture import Texture2D
+from pyjam.texture import Texture2D, TextureArray
 from pyjam.constants import *
 
+# bump it when the decoding of the images changes, to discard the cached pixels
+TEXTURE_CACHE_VERSION = 1
+
 
 class TextureService(IDisposable):
     def __init__(self, game):
         super().__init__()
         self.__game = game
         self.__texture2d_list = []
+        self.__texture_array = None
 
     def load_sprite_frame(self, path: str) -> SpriteFrame:
         sprite_frame = SpriteFrame(self.load_texture(path))
@@ -23,11 +30,93 @@ class TextureService(IDisposable):
         return sprite_frame
 
     def load_texture(self, path: str) -> Texture2D:
-        asset_root = self.__game.get_assets_root()
+        texture2d = self._from_pixels(self.__load_pixels(path))
+        self.__texture2d_list.append(texture2d)
+        return texture2d
+
+    def load_image(self, path: str) -> np.ndarray:
+        """ Decodes an image file into an array of shape (height, width, 4) of RGBA bytes, top row first """
+        return self.__load_pixels(path)[::-1]
+
+    def create_texture(self, pixels: np.ndarray) -> Texture2D:
+        """ Creates a texture from an array of shape (height, width, 4) of RGBA bytes, top row first """
+        texture2d = self._from_pixels(np.ascontiguousarray(np.asarray(pixels, dtype='u1')[::-1]))
+        self.__texture2d_list.append(texture2d)
+        return texture2d
+
+    def create_color_texture(self, color: pg.Color) -> Texture2D:
+        surface = pg.Surface((1, 1), pg.SRCALPHA)
+        surface.fill(color)
+        texture2d = self._from_pg_surface(surface)
+        return texture2d
+
+    def get_texture_array(self) -> TextureArray:
+        """ The texture array shared by the sprite batches drawing with texture arrays """
+        if self.__texture_array is None:
+            self.__texture_array = TextureArray(self.__game.ctx)
+        return self.__texture_array
+
+    def __load_pixels(self, path: str) -> np.ndarray:
+        """
+        Returns the RGBA bytes of an image file as an array of shape (height, width, 4), bottom row first
+        as the textures are uploaded.
+        The pixels are cached in the game cache folder, keyed by a hash of the file content:
+        the next loads map the cache file instead of decoding, flipping and converting the image.
+        """
+        fname = os.path.join(self.__game.get_assets_root(), path)
+        with open(fname, 'rb') as f:
+            content = f.read()
+
+        key = hashlib.sha1(f'{TEXTURE_CACHE_VERSION}:'.encode('utf-8') + content).hexdigest()
+        cache_file = os.path.join(self.__game.get_cache_root(), 'textures', f'{key}.npy')
+        if os.path.exists(cache_file):
+            try:
+                pixels = np.load(cache_file, mmap_mode='r')
+                print(f'Loading texture: {cache_file}')
+                return pixels
+            except (OSError, ValueError) as e:
+                print(f'Cannot load texture {cache_file}: {e}')
 
-        fname = os.path.join(asset_root, path)
         print(f'Loading file: {fname}')
-        img = PIL.ImageOps.flip(PIL.Image.open(fname))
+        pixels = np.asarray(TextureService._open_rgba_image(io.BytesIO(content)), dtype='u1')
+        pixels = np.ascontiguousarray(pixels[::-1])
+        TextureService.__save_pixels(cache_file, pixels)
+        return pixels
+
+    @staticmethod
+    def __save_pixels(cache_file, pixels):
+        # written aside and renamed, images can be loaded by several threads (see AssetLoader)
+        temp_file = f'{cache_file}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(temp_file, 'wb') as f:
+                np.save(f, pixels)
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            # the texture still works, the image will be decoded again next time
+            print(f'Cannot save texture {cache_file}: {e}')
+
+    def get_image_size(self, path: str) -> tuple:
+        """ Returns the (width, height) of an image file, only its header is read """
+        fname = os.path.join(self.__game.get_assets_root(), path)
+        with open(fname, 'rb') as f:
+            header = f.read(24)
+
+        # the size of a PNG is in its IHDR chunk, no need for PIL
+        if header[:8] == b'\x89PNG\r\n\x1a\n' and header[12:16] == b'IHDR':
+            return struct.unpack('>II', header[16:24])
+
+        import PIL.Image
+
+        with PIL.Image.open(fname) as img:
+            return img.size
+
+    @staticmethod
+    def _open_rgba_image(file):
+        # PIL is imported with the first image decoded, the cached textures do not need it
+        import PIL.Image
+
+        img = PIL.Image.open(file)
         rgba_img = img.convert('RGBA')
 
         # handle BMFont luminance textures
@@ -36,20 +125,13 @@ class TextureService(IDisposable):
             channels[3].paste(img)
             rgba_img = PIL.Image.merge('RGBA', channels)
 
-        texture2d = self._from_pillow_image(rgba_img)
-        self.__texture2d_list.append(texture2d)
-
-        #surface = pg.image.load(path)
-        #rgba_surface = surface.convert_alpha()
-        #texture2d = self._from_pg_surface(rgba_surface, path)
-
-        return texture2d
+        return rgba_img
 
-    def create_color_texture(self, color: pg.Color) -> Texture2D:
-        surface = pg.Surface((1, 1), pg.SRCALPHA)
-        surface.fill(color)
-        texture2d = self._from_pg_surface(surface)
-        return texture2d
+    def _from_pixels(self, pixels: np.ndarray) -> Texture2D:
+        """ pixels is an array of shape (height, width, 4) of RGBA bytes, bottom row first """
+        height, width = pixels.shape[:2]
+        mgltex = self.__game.ctx.texture(size=(width, height), components=4, data=pixels)
+        return TextureService._setup_texture(mgltex)
 
     def _from_pillow_image(self, img) -> Texture2D:
         components = len(img.getbands())
@@ -77,4 +159,6 @@ class TextureService(IDisposable):
 
     def dispose(self):
         [texture2d.dispose() for texture2d in self.__texture2d_list]
+        if self.__texture_array is not None:
+            self.__texture_array.dispose()
 
@@ -2,8 +2,8 @@ import copy
 
 import glm
 import pygame as pg
-from Box2D import b2PolygonShape, b2Transform, b2Vec2, b2Rot, b2TestOverlap
 
+from pyjam import collision
 from pyjam.core import Bounds
 from pyjam.sprites.frame import SpriteFrame
 from pyjam.sprites.animation import Animation2D
@@ -12,6 +12,14 @@ import pyjam.utils as utils
 
 
 class Sprite:
+    """
+    position, hotspot, size and scale return the sprite's own glm.vec2. Changing them in place
+    (sprite.position.x += dx) is not noticed by a StaticLayer (see StaticLayer.invalidate), and does nothing
+    on a StoredSprite, whose getters return copies (see SpriteStore).
+    Code meant for both kinds of sprites assigns them: sprite.position = glm.vec2(x, y), sprite.x = x
+    or sprite.move(dx, dy).
+    """
+
     def __init__(self, frame: SpriteFrame):
         # sprite hotspot  - x, y
         self.__hotspot = glm.vec2(0, 0)
@@ -28,8 +36,9 @@ class Sprite:
         # sprite scaling factor
         self.__scale = glm.vec2(1, 1)
 
-        # sprite color
+        # sprite color and its packed copy sent to the sprite batch, assign color to change both
         self.__color = pg.Color('white')
+        self.__packed_color = utils.pack_color(self.__color)
 
         # sprite frame (texture + rect)
         self.__frame = frame
@@ -51,6 +60,13 @@ class Sprite:
 
         self.__scissor = None
 
+        # the StaticLayer drawing this sprite, if any
+        self.__static_layer = None
+
+        # position before the last fixed update step and the one drawn in between, see Game.set_fixed_timestep
+        self.__previous_position = None
+        self.__drawn_position = None
+
         if frame is not None:
             self.size = glm.vec2(frame.rect.w, frame.rect.h)
 
@@ -61,6 +77,7 @@ class Sprite:
     @hotspot.setter
     def hotspot(self, hs: glm.vec2):
         self.__hotspot = glm.vec2(hs)
+        self.__invalidate()
 
     @property
     def position(self) -> glm.vec2:
@@ -69,6 +86,7 @@ class Sprite:
     @position.setter
     def position(self, pos: glm.vec2):
         self.__position = glm.vec2(pos)
+        self.__invalidate()
 
     @property
     def x(self) -> float:
@@ -77,6 +95,7 @@ class Sprite:
     @x.setter
     def x(self, value: float):
         self.__position.x = value
+        self.__invalidate()
 
     @property
     def y(self) -> float:
@@ -85,10 +104,12 @@ class Sprite:
     @y.setter
     def y(self, value: float):
         self.__position.y = value
+        self.__invalidate()
 
     def move(self, dx: float = 0.0, dy: float = 0.0):
         self.__position.x += dx
         self.__position.y += dy
+        self.__invalidate()
 
     @property
     def width(self) -> float:
@@ -107,6 +128,7 @@ class Sprite:
         self.__size = glm.vec2(new_size)
         self.__hotspot = self.__size / 2
         self.build_shape()
+        self.__invalidate()
 
     @property
     def angle(self) -> float:
@@ -117,6 +139,7 @@ class Sprite:
         """ Sets the sprite's rotation angle in degrees """
 
         self.__angle = utils.wrap_angle_deg_180(value)
+        self.__invalidate()
 
     @property
     def scale(self) -> glm.vec2:
@@ -131,6 +154,7 @@ class Sprite:
         """
         self.__scale = glm.vec2(value)
         self.__hotspot *= self.__scale
+        self.__invalidate()
 
     @property
     def color(self) -> pg.Color:
@@ -139,6 +163,8 @@ class Sprite:
     @color.setter
     def color(self, value: pg.Color):
         self.__color = pg.Color(value)
+        self.__packed_color = utils.pack_color(self.__color)
+        self.__invalidate()
 
     @property
     def frame(self) -> SpriteFrame:
@@ -149,6 +175,7 @@ class Sprite:
         if self.is_playing():
             self.stop()
         self.__frame = value
+        self.__invalidate()
 
     @property
     def active(self) -> bool:
@@ -157,6 +184,7 @@ class Sprite:
     @active.setter
     def active(self, active_flag: bool):
         self.__active = active_flag
+        self.__invalidate()
 
     @property
     def visible(self) -> bool:
@@ -165,6 +193,7 @@ class Sprite:
     @visible.setter
     def visible(self, visible_flag: bool):
         self.__visible = visible_flag
+        self.__invalidate()
 
     @property
     def layer_depth(self):
@@ -173,6 +202,7 @@ class Sprite:
     @layer_depth.setter
     def layer_depth(self, ldepth):
         self.__layer_depth = ldepth
+        self.__invalidate()
 
     @property
     def shape(self):
@@ -195,6 +225,19 @@ class Sprite:
     @scissor.setter
     def scissor(self, value: Bounds):
         self.__scissor = copy.copy(value)
+        self.__invalidate()
+
+    @property
+    def static_layer(self):
+        return self.__static_layer
+
+    @static_layer.setter
+    def static_layer(self, layer):
+        self.__static_layer = layer
+
+    def __invalidate(self):
+        if self.__static_layer is not None:
+            self.__static_layer.invalidate()
 
     # set a new animation for the sprite
     def set_animation(self, anim: Animation2D):
@@ -215,25 +258,38 @@ class Sprite:
     def get_animation(self) -> Animation2D:
         return self.__animation
 
-    def collide(self, sprite) -> bool:
+    def collide(self, sprite, precise: bool = False) -> bool:
+        """ Overlap test of the shapes, with b2TestOverlap when precise (see collision.shapes_overlap) """
         # TODO should sprite collide if not visible?
-        transform_1 = b2Transform(b2Vec2(self.x, self.y), b2Rot(glm.radians(self.angle)))
-        transform_2 = b2Transform(b2Vec2(sprite.x, sprite.y), b2Rot(glm.radians(sprite.angle)))
-        return b2TestOverlap(self.shape, 0, sprite.shape, 0, transform_1, transform_2)
+        return collision.sprites_overlap(self, sprite, precise)
 
     def update(self, delta_time: float):
         if self.active:
             if self.is_playing():
                 self.__animation.update(delta_time)
-                self.__frame = self.__animation.current_frame
+                if self.__frame is not self.__animation.current_frame:
+                    self.__frame = self.__animation.current_frame
+                    self.__invalidate()
+
+    def save_position(self):
+        """ Keeps the position before a fixed update step, a sprite hidden at that time is not interpolated """
+        self.__previous_position = glm.vec2(self.__position) if self.visible else None
+
+    def interpolate(self, alpha: float):
+        """ Draws the sprite at alpha between its previous and current positions, until end_interpolation """
+        if self.__previous_position is not None:
+            self.__drawn_position = glm.mix(self.__previous_position, self.__position, alpha)
+
+    def end_interpolation(self):
+        self.__drawn_position = None
 
     def render(self, sprite_batch: SpriteBatch):
         if self.active and self.visible:
             sprite_batch.draw(texture=self.__frame.texture,
-                              position=self.__position,
+                              position=self.__position if self.__drawn_position is None else self.__drawn_position,
                               source_rect=self.__frame.rect,
                               rotation=self.__angle,
-                              color=self.__color,
+                              color=self.__packed_color,
                               origin=self.__hotspot,
                               scale=self.__scale,
                               size=self.__size,
@@ -242,6 +298,9 @@ class Sprite:
                               scissor=self.__scissor)
 
     def build_shape(self):
+        # Box2D is imported with the first shape
+        from Box2D import b2PolygonShape
+
         self.__shape = b2PolygonShape(
             box=(self.__size.x / 2, self.__size.y / 2, (0, 0), glm.radians(self.__angle)))
 
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import threading
+import zipfile
+
+import numpy as np
+import pygame as pg
+
+from pyjam.constants import *
+from pyjam.sprites.frame import SpriteFrame
+
+
+class SkylinePacker:
+    """
+    Packs rectangles in a bin of fixed size with the skyline bottom-left heuristic:
+    the skyline is the list of the top edges of the rectangles already placed, and every new rectangle
+    is put where its bottom (top-left origin, so the highest y of the rectangle) is the lowest.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.__width = width
+        self.__height = height
+        # segments of the skyline as [x, y, width], sorted by x
+        self.__skyline = [[0, 0, width]]
+
+    def insert(self, w: int, h: int):
+        """ Returns the (x, y) position of the rectangle, or None if it does not fit """
+        best_index = -1
+        best_bottom = self.__height + 1
+        best_width = self.__width + 1
+        best_y = 0
+        for i in range(len(self.__skyline)):
+            y = self.__fit(i, w, h)
+            if y is None:
+                continue
+            bottom = y + h
+            if bottom < best_bottom or (bottom == best_bottom and self.__skyline[i][2] < best_width):
+                best_index = i
+                best_bottom = bottom
+                best_width = self.__skyline[i][2]
+                best_y = y
+
+        if best_index == -1:
+            return None
+
+        x = self.__skyline[best_index][0]
+        self.__add_segment(best_index, x, best_y + h, w)
+        return x, best_y
+
+    def __fit(self, index, w, h):
+        # the rectangle starts at the segment and lies on the highest segment it spans
+        x = self.__skyline[index][0]
+        if x + w > self.__width:
+            return None
+
+        y = 0
+        width_left = w
+        while width_left > 0:
+            y = max(y, self.__skyline[index][1])
+            if y + h > self.__height:
+                return None
+            width_left -= self.__skyline[index][2]
+            index += 1
+        return y
+
+    def __add_segment(self, index, x, y, w):
+        self.__skyline.insert(index, [x, y, w])
+
+        # shrink or remove the segments covered by the new one
+        i = index + 1
+        while i < len(self.__skyline):
+            segment = self.__skyline[i]
+            previous = self.__skyline[i - 1]
+            overlap = previous[0] + previous[2] - segment[0]
+            if overlap <= 0:
+                break
+            segment[0] += overlap
+            segment[2] -= overlap
+            if segment[2] > 0:
+                break
+            del self.__skyline[i]
+
+        # merge the neighbours at the same height
+        i = 0
+        while i < len(self.__skyline) - 1:
+            if self.__skyline[i][1] == self.__skyline[i + 1][1]:
+                self.__skyline[i][2] += self.__skyline[i + 1][2]
+                del self.__skyline[i + 1]
+            else:
+                i += 1
+
+
+class TextureAtlas:
+    """
+    Packs loose images, sprite sheets and solid colors in a few large textures (pages),
+    so that sprites using them can be batched together.
+
+    Sources are added first, then build packs them and points the sprite frames and the sheets to the pages.
+    Every source is surrounded by a border of repeated edge pixels, so that filtering does not bleed
+    from the neighbours.
+    The pages (raw RGBA) and the placements are cached in the game cache folder:
+    when the sources did not change, the next runs load the pages and skip both packing and image decoding.
+    """
+
+    def __init__(self, game, name: str, page_size: int = 1024, padding: int = 1):
+        self.__game = game
+        self.__name = name
+        self.__page_size = page_size
+        self.__padding = padding
+
+        # sources as [key, image path or rgba tuple, width, height, callback(texture, x, y)]
+        self.__entries = []
+        self.__pages = []
+
+        # (pages as RGBA arrays, placements) between prepare and upload
+        self.__prepared = None
+
+    @property
+    def pages(self):
+        """ The Texture2D of each page, available after build """
+        return self.__pages
+
+    def add_image(self, path: str) -> SpriteFrame:
+        """ Adds a loose image, the returned frame is registered as the asset path like TextureService does """
+        w, h = self.__game.services[TEXTURE_SERVICE].get_image_size(path)
+        sprite_frame = SpriteFrame(None, pg.Rect(0, 0, w, h))
+
+        def place(texture, x, y):
+            sprite_frame.texture = texture
+            sprite_frame.rect = pg.Rect(x, y, w, h)
+
+        self.__entries.append([f'image:{path}', path, w, h, place])
+        self.__game.services[ASSET_SERVICE].insert(path, sprite_frame)
+        return sprite_frame
+
+    def add_sheet(self, path: str, sheet):
+        """ Adds the image of a sprite sheet, see SpriteSheet.load_rects and SpriteSheet.load_grid """
+        w, h = self.__game.services[TEXTURE_SERVICE].get_image_size(path)
+        self.__entries.append([f'sheet:{path}', path, w, h, sheet.relocate])
+
+    def add_color(self, color: pg.Color) -> SpriteFrame:
+        """ Adds a 1x1 solid color, like TextureService.create_color_texture """
+        rgba = (color.r, color.g, color.b, color.a)
+        sprite_frame = SpriteFrame(None, pg.Rect(0, 0, 1, 1))
+
+        def place(texture, x, y):
+            sprite_frame.texture = texture
+            sprite_frame.rect = pg.Rect(x, y, 1, 1)
+
+        self.__entries.append([f'color:{rgba}', rgba, 1, 1, place])
+        return sprite_frame
+
+    def build(self):
+        self.prepare()
+        self.upload()
+
+    def prepare(self):
+        """
+        Loads the cached pages, or packs them, without any GL call: it can run on a worker thread
+        (see AssetLoader), upload must follow on the main thread
+        """
+        if len(self.__entries) == 0:
+            return
+
+        cache_file = os.path.join(self.__game.get_cache_root(), 'atlas', f'{self.__name}.npz')
+        key = self.__get_cache_key()
+
+        cached = self.__load_cache(cache_file, key)
+        if cached is not None:
+            pages, placements = cached
+        else:
+            pages, placements = self.__pack()
+            self.__save_cache(cache_file, key, pages, placements)
+        self.__prepared = pages, placements
+
+    def upload(self):
+        """ Creates the textures of the pages made by prepare and gives the frames their texture """
+        if self.__prepared is None:
+            return
+
+        texture_service = self.__game.services[TEXTURE_SERVICE]
+        pages, placements = self.__prepared
+        self.__prepared = None
+
+        self.__pages = [texture_service.create_texture(page) for page in pages]
+        for entry, (page, x, y) in zip(self.__entries, placements):
+            entry[4](self.__pages[page], x, y)
+
+    def __get_cache_key(self) -> str:
+        sources = []
+        for entry in self.__entries:
+            if isinstance(entry[1], str):
+                stat = os.stat(os.path.join(self.__game.get_assets_root(), entry[1]))
+                sources.append([entry[0], stat.st_size, stat.st_mtime_ns])
+            else:
+                sources.append([entry[0]])
+        description = json.dumps([self.__page_size, self.__padding, sources])
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+    def __pack(self):
+        texture_service = self.__game.services[TEXTURE_SERVICE]
+        pad = self.__padding
+        size = self.__page_size
+
+        # biggest first, it packs tighter
+        order = sorted(range(len(self.__entries)),
+                       key=lambda i: (-self.__entries[i][3], -self.__entries[i][2], i))
+
+        packers = []
+        pages = []
+        placements = [None] * len(self.__entries)
+        for i in order:
+            _, source, w, h, _ = self.__entries[i]
+            if w + 2 * pad > size or h + 2 * pad > size:
+                raise Exception(f'{self.__entries[i][0]} does not fit in an atlas page of {size}x{size}')
+
+            if isinstance(source, str):
+                pixels = texture_service.load_image(source)
+            else:
+                pixels = np.full((1, 1, 4), source, dtype='u1')
+
+            position = None
+            page = 0
+            while position is None:
+                if page == len(packers):
+                    packers.append(SkylinePacker(size, size))
+                    pages.append(np.zeros((size, size, 4), dtype='u1'))
+                position = packers[page].insert(w + 2 * pad, h + 2 * pad)
+                if position is None:
+                    page += 1
+
+            x, y = position
+            pages[page][y:y + h + 2 * pad, x:x + w + 2 * pad] = np.pad(pixels, ((pad, pad), (pad, pad), (0, 0)),
+                                                                       mode='edge')
+            placements[i] = (page, x + pad, y + pad)
+
+        return pages, placements
+
+    def __load_cache(self, cache_file, key):
+        if not os.path.exists(cache_file):
+            return None
+
+        try:
+            with np.load(cache_file) as data:
+                meta = json.loads(str(data['meta']))
+                if meta['key'] != key:
+                    return None
+                print(f'Loading atlas: {cache_file}')
+                pages = [data[f'page_{i}'] for i in range(meta['pages'])]
+                placements = [tuple(placement) for placement in meta['placements']]
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile) as e:
+            # a damaged cache file is replaced by packing the atlas again
+            print(f'Cannot load atlas {cache_file}: {e}')
+            return None
+        return pages, placements
+
+    def __save_cache(self, cache_file, key, pages, placements):
+        meta = json.dumps({'key': key, 'pages': len(pages), 'placements': placements})
+        # written aside and renamed, so that a run killed while saving does not leave a partial file
+        temp_file = f'{cache_file}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(temp_file, 'wb') as f:
+                np.savez(f, meta=np.array(meta), **{f'page_{i}': page for i, page in enumerate(pages)})
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            # the atlas still works, it will be packed again next time
+            print(f'Cannot save atlas {cache_file}: {e}')
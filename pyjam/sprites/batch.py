@@ -11,7 +11,7 @@ from pyjam.constants import *
 from pyjam.core import Bounds
 from pyjam.interfaces import IDisposable
 from pyjam.sprites.sheet import SpriteSheet
-from pyjam.texture import Texture2D
+from pyjam.texture import Texture2D, TextureArray
 
 
 class SpriteEffects(IntEnum):
@@ -44,68 +44,183 @@ class SpriteSortMode(IntEnum):
     FRONT_TO_BACK = 4
 
 
+# vertex layout shared with the sprite shaders: '3f 4f1 2f' => position, packed rgba color, texture coordinates
+VERTEX_DTYPE = np.dtype([('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('color', 'u4'), ('u', 'f4'), ('v', 'f4')])
+
+# instance layout of the instanced sprites shader: '2f 4f 2f 4f 4f1 1f/i' => pivot, corners relative to the pivot,
+# rotation (sin, cos), texture coordinates of the corners, packed rgba color, depth
+INSTANCE_DTYPE = np.dtype([('x', 'f4'), ('y', 'f4'),
+                           ('x0', 'f4'), ('y0', 'f4'), ('x1', 'f4'), ('y1', 'f4'),
+                           ('sin', 'f4'), ('cos', 'f4'),
+                           ('u0', 'f4'), ('v0', 'f4'), ('u1', 'f4'), ('v1', 'f4'),
+                           ('color', 'u4'), ('z', 'f4')])
+
+
+class SpriteBatchBackend(IntEnum):
+    # four vertices for each sprite, computed on the CPU
+    VERTICES = 0,
+
+    # one instance record for each sprite, the quad corners are computed by the vertex shader
+    INSTANCED = 1
+
+
+class GlyphRun:
+    """
+    The glyph quads of a string laid out by SpriteBatch.build_glyph_run, relative to the string position:
+    the offsets of the top left corners, the texture coordinates and the packed colors of the glyphs.
+    """
+
+    def __init__(self, texture, w, h, kerning_width, offsets_x, offsets_y, u0, v0, u1, v1, colors):
+        self.texture = texture
+        self.w = w
+        self.h = h
+        self.kerning_width = kerning_width
+        self.offsets_x = offsets_x
+        self.offsets_y = offsets_y
+        self.u0 = u0
+        self.v0 = v0
+        self.u1 = u1
+        self.v1 = v1
+        self.colors = colors
+
+
 class SpriteBatchItem:
-    def __init__(self):
-        self.texture = None
-        self.sortkey = 0.0
-        self.vertexTL = ()
-        self.vertexTR = ()
-        self.vertexBL = ()
-        self.vertexBR = ()
-
-    def set(self, x, y, w, h, color: pg.Color, tex_coord_tl: glm.vec2, tex_coord_br: glm.vec2, depth):
-        rgba = utils.swap_endians(int(color))
-
-        self.vertexTL = (x, y + h, depth, rgba, tex_coord_tl.x, tex_coord_tl.y)
-        self.vertexTR = (x + w, y + h, depth, rgba, tex_coord_br.x, tex_coord_tl.y)
-        self.vertexBL = (x, y, depth, rgba, tex_coord_tl.x, tex_coord_br.y)
-        self.vertexBR = (x + w, y, depth, rgba, tex_coord_br.x, tex_coord_br.y)
-
-    def set_extended(self, x, y, dx, dy, w, h, sin, cos, color: pg.Color, tex_coord_tl: glm.vec2,
+    """ rgba is the color packed with utils.pack_color """
+
+    def __init__(self, batcher, index):
+        # row of the batcher array owned by this item
+        self.index = index
+        self._batcher = batcher
+
+    @property
+    def texture(self):
+        return self._batcher.textures[self.index]
+
+    @texture.setter
+    def texture(self, value):
+        self._batcher.set_texture(self.index, value)
+
+    @property
+    def sortkey(self):
+        return self._batcher.sortkeys[self.index]
+
+    @sortkey.setter
+    def sortkey(self, value):
+        self._batcher.sortkeys[self.index] = value
+
+    def set(self, x, y, w, h, rgba: int, tex_coord_tl: glm.vec2, tex_coord_br: glm.vec2, depth):
+        pass
+
+    def set_extended(self, x, y, dx, dy, w, h, sin, cos, rgba: int, tex_coord_tl: glm.vec2,
                      tex_coord_br: glm.vec2, depth):
-        rgba = utils.swap_endians(int(color))
+        pass
+
 
+class SpriteBatchVertexItem(SpriteBatchItem):
+    """ A batch item whose row holds the vertices TL, TR, BL, BR """
+
+    def set(self, x, y, w, h, rgba: int, tex_coord_tl: glm.vec2, tex_coord_br: glm.vec2, depth):
+        # the color slots are written as floats here and then overwritten with the packed color bits
+        self._batcher.vertex_data[self.index] = (
+            x, y + h, depth, 0.0, tex_coord_tl.x, tex_coord_tl.y,
+            x + w, y + h, depth, 0.0, tex_coord_br.x, tex_coord_tl.y,
+            x, y, depth, 0.0, tex_coord_tl.x, tex_coord_br.y,
+            x + w, y, depth, 0.0, tex_coord_br.x, tex_coord_br.y)
+        self._batcher.vertex_colors[self.index] = rgba
+
+    def set_extended(self, x, y, dx, dy, w, h, sin, cos, rgba: int, tex_coord_tl: glm.vec2,
+                     tex_coord_br: glm.vec2, depth):
         # rotation around origin (x0,y0)
         # x1 = x0cos(a) - y0sin(a)
         # y1 = x0sin(a) + y0cos(a)
 
-        self.vertexTL = (
-            x + dx * cos - (dy + h) * sin, y + dx * sin + (dy + h) * cos, depth, rgba, tex_coord_tl.x, tex_coord_tl.y)
-        self.vertexTR = (
-            x + (dx + w) * cos - (dy + h) * sin, y + (dx + w) * sin + (dy + h) * cos, depth, rgba, tex_coord_br.x,
-            tex_coord_tl.y)
-        self.vertexBL = (
-            x + dx * cos - dy * sin, y + dx * sin + dy * cos, depth, rgba, tex_coord_tl.x,
-            tex_coord_br.y)
-        self.vertexBR = (
-            x + (dx + w) * cos - dy * sin, y + (dx + w) * sin + dy * cos, depth, rgba, tex_coord_br.x,
-            tex_coord_br.y)
-
-
-class SpriteBatcher(IDisposable):
-    def __init__(self, game, capacity=0):
+        self._batcher.vertex_data[self.index] = (
+            x + dx * cos - (dy + h) * sin, y + dx * sin + (dy + h) * cos, depth, 0.0,
+            tex_coord_tl.x, tex_coord_tl.y,
+            x + (dx + w) * cos - (dy + h) * sin, y + (dx + w) * sin + (dy + h) * cos, depth, 0.0,
+            tex_coord_br.x, tex_coord_tl.y,
+            x + dx * cos - dy * sin, y + dx * sin + dy * cos, depth, 0.0,
+            tex_coord_tl.x, tex_coord_br.y,
+            x + (dx + w) * cos - dy * sin, y + (dx + w) * sin + dy * cos, depth, 0.0,
+            tex_coord_br.x, tex_coord_br.y)
+        self._batcher.vertex_colors[self.index] = rgba
+
+
+class SpriteBatchInstanceItem(SpriteBatchItem):
+    """ A batch item whose row is a single instance record, the rotation is left to the vertex shader """
+
+    def set(self, x, y, w, h, rgba: int, tex_coord_tl: glm.vec2, tex_coord_br: glm.vec2, depth):
+        self._batcher.instance_data[self.index] = (
+            x, y, 0.0, 0.0, w, h, 0.0, 1.0,
+            tex_coord_tl.x, tex_coord_tl.y, tex_coord_br.x, tex_coord_br.y, 0.0, depth)
+        self._batcher.instance_colors[self.index] = rgba
+
+    def set_extended(self, x, y, dx, dy, w, h, sin, cos, rgba: int, tex_coord_tl: glm.vec2,
+                     tex_coord_br: glm.vec2, depth):
+        self._batcher.instance_data[self.index] = (
+            x, y, dx, dy, dx + w, dy + h, sin, cos,
+            tex_coord_tl.x, tex_coord_tl.y, tex_coord_br.x, tex_coord_br.y, 0.0, depth)
+        self._batcher.instance_colors[self.index] = rgba
+
+
+class BatchStats:
+    """ What the sprite batchers sent to the GPU, summed over all of them until reset """
+
+    def __init__(self):
+        self.draw_calls = 0
+        self.flushes = 0
+        self.texture_binds = 0
+        self.batch_items = 0
+        self.vertices = 0
+
+    def reset(self):
+        self.draw_calls = 0
+        self.flushes = 0
+        self.texture_binds = 0
+        self.batch_items = 0
+        self.vertices = 0
+
+
+class BaseSpriteBatcher(IDisposable):
+    """
+    Batch items are rows of a preallocated NumPy array (growing geometrically), together with their texture
+    and sort key. draw_batch sorts the rows and calls flush_rows for each run of rows sharing the same texture
+    and scissor box.
+    With a texture array all the textures are layers of the same array, so there is a single run
+    and the layer of each row is passed to flush_rows.
+    Subclasses define the row layout and how rows are sent to the GPU.
+    """
+
+    # shared by all the batchers, read by FrameProfiler
+    stats = BatchStats()
+
+    def __init__(self, row_shape, dtype, max_batch_size, capacity=0, texture_array: TextureArray = None):
         self.__initial_batch_size = 256
+        self.__texture_array = texture_array
 
-        # limit enforced by indices size (16 bit)
-        # there are 6 indices per batch item
-        self.__max_batch_size = int(65536 / 6)
+        # max number of batch items drawn by a single flush_rows call
+        self.__max_batch_size = max_batch_size
 
         self.__batch_item_count = 0
         self.__batch_item_list = []
 
-        self.__index_list = []
-        self.__vertex_list = []
-
-        self.__program = game.services[SHADER_SERVICE].programs[SHADER_DEFAULT_SPRITES]
+        # one row for each batch item
+        self.__row_shape = row_shape
+        self.__rows = np.zeros((0,) + row_shape, dtype=dtype)
 
-        # self.__texture = None
+        # texture and sort key of each batch item, indexed by row
+        # the texture sorting keys are kept in an array too, to find the runs of rows sharing a texture
+        self.__textures = []
+        self.__texture_keys = np.zeros(0, dtype='i8')
+        self.__sortkeys = np.zeros(0, dtype='f8')
 
-        self.__ctx = game.ctx
-        self.__vbo = None
-        self.__ebo = None
-        self.__vao = None
+        # texture array layer of each batch item
+        self.__layers = np.zeros(0, dtype='f4')
 
-        self.__uploaded = False
+        # scissor boxes used by the current batch, the first one means no scissor
+        # and the index of the scissor box of each batch item
+        self.__scissors = [None]
+        self.__scissor_ids = np.zeros(0, dtype='i4')
 
         if capacity <= 0:
             capacity = self.__initial_batch_size
@@ -115,153 +230,596 @@ class SpriteBatcher(IDisposable):
 
         self.ensure_array_capacity(capacity)
 
-    def create_batch_item(self):
+    @property
+    def max_batch_size(self):
+        return self.__max_batch_size
+
+    @property
+    def textures(self):
+        return self.__textures
+
+    @property
+    def sortkeys(self):
+        return self.__sortkeys
+
+    @property
+    def texture_array(self):
+        return self.__texture_array
+
+    def set_texture(self, index, texture):
+        self.__textures[index] = texture
+        if texture is None:
+            self.__texture_keys[index] = 0
+        elif self.__texture_array is not None:
+            # a texture that does not fit in the array is drawn in a run of its own, with its overflow array
+            layer = self.__texture_array.get_layer(texture)
+            self.__texture_keys[index] = 0 if layer >= 0 else texture.sorting_key
+            self.__layers[index] = max(layer, 0)
+        else:
+            self.__texture_keys[index] = texture.sorting_key
+
+    def set_scissor(self, index, scissor):
+        """ Sets the GL scissor box (x, y, width, height in pixels) of a batch item, None disables it """
+        if scissor != self.__scissors[-1]:
+            self.__scissors.append(scissor)
+        self.__scissor_ids[index] = len(self.__scissors) - 1
+
+    def create_item(self, index) -> SpriteBatchItem:
+        pass
+
+    def apply_scissor(self, scissor):
+        """ Sets the GL scissor box used by the next flush_rows calls, None disables it """
+        pass
+
+    def rows_changed(self, rows, old_capacity):
+        """ Called when the array of rows is reallocated """
+        pass
+
+    def flush_rows(self, rows, texture, layers=None):
+        """
+        Draws the given rows, all of them sharing the same texture.
+        With a texture array, texture is the TextureArray and layers holds the layer of each row.
+        """
+        pass
+
+    def add_quads(self, texture, sort_key, x, y, x0, y0, x1, y1, sin, cos, rgba, u0, v0, u1, v1, depth):
+        """
+        Adds a batch item for each quad, all the arguments are NumPy arrays of the same length or scalars.
+        (x, y) is the pivot of the quad, the corners (x0, y0) - (x1, y1) are relative to it and rotated by
+        (sin, cos), (u0, v0) - (u1, v1) are the texture coordinates of the corners.
+        """
+        pass
+
+    def create_batch_item(self, texture=None, sortkey=0.0):
         if self.__batch_item_count >= len(self.__batch_item_list):
             old_size = len(self.__batch_item_list)
-            new_size = round(old_size + (old_size / 2))  # grow by x1.5
-            new_size = (new_size + 63) & (~63)  # grow in chunks of 64
-            self.ensure_array_capacity(min(new_size, self.__max_batch_size))
-            self.__batch_item_list.append(SpriteBatchItem())
+            self.grow_array_capacity(old_size + 1)
+            self.__batch_item_list.append(self.create_item(old_size))
 
         item = self.__batch_item_list[self.__batch_item_count]
+        self.set_texture(item.index, texture)
+        self.__sortkeys[item.index] = sortkey
+        self.__scissor_ids[item.index] = 0
         self.__batch_item_count += 1
         return item
 
-    def draw_batch(self, sort_mode):
-        if self.__batch_item_count == 0:
+    def create_batch_items(self, count, texture, sortkey=0.0) -> int:
+        """
+        Reserves count consecutive batch items sharing the same texture and sort key (or an array of sort keys).
+        Returns the index of the first row, the caller fills the rows from there on.
+        """
+        first = self.__batch_item_count
+        end = first + count
+        if end > len(self.__batch_item_list):
+            self.grow_array_capacity(end)
+            for index in range(len(self.__batch_item_list), end):
+                self.__batch_item_list.append(self.create_item(index))
+
+        self.__textures[first:end] = [texture] * count
+        if texture is None:
+            self.__texture_keys[first:end] = 0
+        elif self.__texture_array is not None:
+            layer = self.__texture_array.get_layer(texture)
+            self.__texture_keys[first:end] = 0 if layer >= 0 else texture.sorting_key
+            self.__layers[first:end] = max(layer, 0)
+        else:
+            self.__texture_keys[first:end] = texture.sorting_key
+        self.__sortkeys[first:end] = sortkey
+        self.__scissor_ids[first:end] = 0
+        self.__batch_item_count = end
+        return first
+
+    def grow_array_capacity(self, needed_batch_items):
+        size = len(self.__rows)
+        if needed_batch_items <= size:
             return
 
-        if sort_mode == SpriteSortMode.TEXTURE or\
-                sort_mode == SpriteSortMode.FRONT_TO_BACK or \
-                sort_mode == SpriteSortMode.BACK_TO_FRONT:
-            # sort the list
-            # warning: do not sort the entire list in place, only the relevant portion have to be sorted
-            self.__batch_item_list[0:self.__batch_item_count] = \
-                sorted(self.__batch_item_list[0:self.__batch_item_count], key=lambda it: it.sortkey)
+        while size < needed_batch_items:
+            size = round(size + (size / 2))  # grow by x1.5
+            size = (size + 63) & (~63)  # grow in chunks of 64
+        self.ensure_array_capacity(size)
 
-        batch_count = self.__batch_item_count
-        while batch_count > 0:
-            start_vertex = 0
-            end_vertex = 0
-            tex = None
-
-            num_batches_to_process = batch_count
-            if num_batches_to_process > self.__max_batch_size:
-                num_batches_to_process = self.__max_batch_size
-
-            vlist_idx = 0
+    def ensure_array_capacity(self, needed_batch_items):
+        old_capacity = len(self.__rows)
+        if needed_batch_items <= old_capacity:
+            # Short circuit out of here because we have enough capacity.
+            return
 
-            for i in range(num_batches_to_process):
-                item = self.__batch_item_list[i]
+        # keep the rows already staged, the array may grow while the batch is being filled
+        rows = np.zeros((needed_batch_items,) + self.__row_shape, dtype=self.__rows.dtype)
+        rows[0:old_capacity] = self.__rows
+        self.__rows = rows
+        self.__textures.extend([None] * (needed_batch_items - old_capacity))
+        self.__texture_keys = np.append(self.__texture_keys, np.zeros(needed_batch_items - old_capacity, dtype='i8'))
+        self.__sortkeys = np.append(self.__sortkeys, np.zeros(needed_batch_items - old_capacity, dtype='f8'))
+        self.__layers = np.append(self.__layers, np.zeros(needed_batch_items - old_capacity, dtype='f4'))
+        self.__scissor_ids = np.append(self.__scissor_ids, np.zeros(needed_batch_items - old_capacity, dtype='i4'))
+
+        self.rows_changed(rows, old_capacity)
+
+    def sort_batch(self, sort_mode):
+        """
+        Empties the batch and returns its rows in drawing order, their texture array layers (None without
+        a texture array) and the runs of rows sharing the same texture and scissor box, as tuples
+        (start, end, texture, scissor).
+        """
+        batch_count = self.__batch_item_count
+        if batch_count == 0:
+            return self.__rows[0:0], None, []
 
-                # if the texture changed (or the first time), we need to flush and bind the new texture
-                if tex is not item.texture:
-                    # the first time start_index == index, so flush() does nothing
-                    self.flush_vertex_array(start_vertex, end_vertex)
+        if sort_mode == SpriteSortMode.TEXTURE or\
+                sort_mode == SpriteSortMode.FRONT_TO_BACK or \
+                sort_mode == SpriteSortMode.BACK_TO_FRONT:
+            # sort the rows of the live portion only, the items keep their own rows
+            # and the rows are gathered in drawing order (a stable sort keeps the drawing order on equal keys)
+            order = np.argsort(self.__sortkeys[0:batch_count], kind='stable')
+            rows = self.__rows[order]
+            texture_keys = self.__texture_keys[order]
+        else:
+            order = np.arange(batch_count)
+            rows = self.__rows[0:batch_count]
+            texture_keys = self.__texture_keys[0:batch_count]
+
+        # a new run starts wherever the texture changes, we need to flush and bind the new texture there
+        changes = texture_keys[1:] != texture_keys[:-1]
+
+        # and wherever the scissor box changes
+        scissor_ids = None
+        if len(self.__scissors) > 1:
+            scissor_ids = self.__scissor_ids[order]
+            changes |= scissor_ids[1:] != scissor_ids[:-1]
+
+        starts = np.concatenate(([0], np.flatnonzero(changes) + 1, [batch_count]))
+        layers = self.__layers[order] if self.__texture_array is not None else None
+        runs = []
+        for start, end in zip(starts[:-1].tolist(), starts[1:].tolist()):
+            if layers is None:
+                texture = self.__textures[order[start]]
+            elif texture_keys[start] == 0:
+                texture = self.__texture_array
+            else:
+                texture = self.__texture_array.get_overflow_array(self.__textures[order[start]])
+            scissor = self.__scissors[scissor_ids[start]] if scissor_ids is not None else None
+            runs.append((start, end, texture, scissor))
 
-                    start_vertex = end_vertex = 0
-                    vlist_idx = 0
+        self.__scissors = [None]
+        self.__batch_item_count = 0
+        return rows, layers, runs
 
-                    tex = item.texture
-                    self.__program['material_diffuse'] = 0
-                    tex.mgl_texture.use(location=0)
+    def draw_batch(self, sort_mode):
+        rows, layers, runs = self.sort_batch(sort_mode)
+
+        stats = BaseSpriteBatcher.stats
+        stats.batch_items += len(rows)
+        stats.vertices += len(rows) * 4
+
+        scissor = None
+        for start, end, texture, run_scissor in runs:
+            if run_scissor != scissor:
+                scissor = run_scissor
+                self.apply_scissor(scissor)
+            for first in range(start, end, self.__max_batch_size):
+                last = min(first + self.__max_batch_size, end)
+                self.flush_rows(rows[first:last], texture, layers[first:last] if layers is not None else None)
+                # every flush binds its texture and draws once
+                stats.flushes += 1
+                stats.texture_binds += 1
+                stats.draw_calls += 1
+
+        if scissor is not None:
+            self.apply_scissor(None)
+
+
+class SpriteBatcher(BaseSpriteBatcher):
+    # The vertex buffer is a ring split in segments, each one big enough for a full batch.
+    # Consecutive flushes (in the same frame or in the following ones) write after the previous ones,
+    # so they never touch a region the GPU may still be reading: when the ring is full the buffer is orphaned,
+    # the driver hands out new storage and the writing starts again from the beginning.
+    RING_SEGMENTS = 3
+
+    # limit enforced by indices size (16 bit), there are 4 vertices per batch item
+    MAX_RING_SIZE = int(65536 / 4)
+
+    def __init__(self, game, capacity=0, texture_array: TextureArray = None):
+        self.__vertex_data = None
+        self.__vertex_colors = None
+
+        self.__shader_service = game.services[SHADER_SERVICE]
+        self.__program_name = SHADER_ARRAY_SPRITES if texture_array is not None else SHADER_DEFAULT_SPRITES
+        self.__program = self.__shader_service.programs[self.__program_name]
 
-                self.__vertex_list[vlist_idx + 0] = item.vertexTL
-                self.__vertex_list[vlist_idx + 1] = item.vertexTR
-                self.__vertex_list[vlist_idx + 2] = item.vertexBL
-                self.__vertex_list[vlist_idx + 3] = item.vertexBR
+        self.__ctx = game.ctx
+        self.__vbo = None
+        self.__layer_vbo = None
+        self.__ebo = None
+        self.__vao = None
 
-                end_vertex += 4
-                vlist_idx += 4
+        # batch items the vertex buffer can hold, and the first free one
+        self.__ring_size = 0
+        self.__ring_cursor = 0
 
-            self.flush_vertex_array(start_vertex, end_vertex)
-            batch_count -= num_batches_to_process
+        self.__uploaded = False
 
-        self.__batch_item_count = 0
+        # vertices kept by bake and drawn by draw_baked, with their runs (start, end, texture, scissor)
+        self.__baked_vbo = None
+        self.__baked_layer_vbo = None
+        self.__baked_vao = None
+        self.__baked_runs = []
+
+        # staging area for the vertices: one row of 4 vertices (TL, TR, BL, BR) for each batch item
+        super().__init__((4,), VERTEX_DTYPE, int(SpriteBatcher.MAX_RING_SIZE / SpriteBatcher.RING_SEGMENTS), capacity,
+                         texture_array)
+
+    @property
+    def program(self):
+        # the program changes when its shader files are reloaded (see ShaderService.watch),
+        # the vertex arrays are made again for the new one
+        program = self.__shader_service.programs[self.__program_name]
+        if program is not self.__program:
+            self.__program = program
+            if self.__vao is not None:
+                self.__vao.release()
+                self.__vao = self.__create_vertex_array(self.__vbo, self.__layer_vbo)
+            if self.__baked_vao is not None:
+                self.__baked_vao.release()
+                self.__baked_vao = self.__create_vertex_array(self.__baked_vbo, self.__baked_layer_vbo)
+        return self.__program
+
+    @property
+    def vertex_data(self):
+        """ The vertex array seen as rows of 24 floats (4 vertices of 6 components each) """
+        return self.__vertex_data
+
+    @property
+    def vertex_colors(self):
+        """ The packed colors of the vertex array seen as rows of 4 unsigned ints """
+        return self.__vertex_colors
+
+    def create_item(self, index) -> SpriteBatchItem:
+        return SpriteBatchVertexItem(self, index)
+
+    def apply_scissor(self, scissor):
+        self.__ctx.scissor = scissor
+
+    def add_quads(self, texture, sort_key, x, y, x0, y0, x1, y1, sin, cos, rgba, u0, v0, u1, v1, depth):
+        count = np.broadcast(x, y, x0, y0, x1, y1, rgba, u0, v0, u1, v1, depth).size
+        first = self.create_batch_items(count, texture, sort_key)
+        rows = self.__vertex_data[first:first + count].reshape(count, 4, 6)
+
+        # TL, TR, BL, BR
+        corners = ((x0, y1), (x1, y1), (x0, y0), (x1, y0))
+        for i, (cx, cy) in enumerate(corners):
+            rows[:, i, 0] = x + cx * cos - cy * sin
+            rows[:, i, 1] = y + cx * sin + cy * cos
+
+        rows[:, :, 2] = np.reshape(depth, (-1, 1))
+        rows[:, 0, 4] = u0
+        rows[:, 0, 5] = v0
+        rows[:, 1, 4] = u1
+        rows[:, 1, 5] = v0
+        rows[:, 2, 4] = u0
+        rows[:, 2, 5] = v1
+        rows[:, 3, 4] = u1
+        rows[:, 3, 5] = v1
+
+        self.__vertex_colors[first:first + count] = np.reshape(rgba, (-1, 1))
+
+    def get_ring_size(self) -> int:
+        """ Returns the number of batch items the vertex buffer has to hold for the current capacity """
+        return min(len(self.__vertex_data), self.max_batch_size) * SpriteBatcher.RING_SEGMENTS
 
     def upload_vertex_buffer(self):
         if self.__uploaded:
             return
 
-        ndarr = np.array(self.__vertex_list, dtype='f4, f4, f4, u4, f4, f4')
-        self.__vbo = self.__ctx.buffer(ndarr, dynamic=True)
-        self.__ebo = self.__ctx.buffer(np.array(self.__index_list, dtype='i2'))
-
-        fmt = '3f 4f1 2f'
-        attribs = ['in_position', 'in_color', 'in_tex_coords_0']
-        self.__vao = self.__ctx.vertex_array(self.__program, [(self.__vbo, fmt, *attribs)],
-                                             index_buffer=self.__ebo, index_element_size=2, skip_errors=True)
+        #
+        #  TL    TR
+        #   0----1 0,1,2,3 = index offsets for vertex indices
+        #   |   /| TL,TR,BL,BR are vertex references in SpriteBatchVertexItem.
+        #   |  / | front-face is 'ccw'
+        #   | /  | y is positive down the screen
+        #   |/   |
+        #   2----3
+        #  BL    BR
+        #
+        # the indices only depend on the position in the ring, so they are built once for the largest ring
+        # and the index buffer is kept when the vertex buffer grows
+        num_batches = SpriteBatcher.MAX_RING_SIZE
+        offsets = np.arange(num_batches, dtype='u4').reshape(num_batches, 1) * 4
+        indices = (offsets + np.array([0, 1, 2, 1, 3, 2], dtype='u4')).astype('u2')
+
+        self.__ring_size = self.get_ring_size()
+        self.__ring_cursor = 0
+        self.__vbo = self.__ctx.buffer(reserve=self.__ring_size * VERTEX_DTYPE.itemsize * 4, dynamic=True)
+        self.__ebo = self.__ctx.buffer(indices)
+
+        if self.texture_array is not None:
+            # the texture array layer of each vertex, a ring of the same size as the vertex one
+            self.__layer_vbo = self.__ctx.buffer(reserve=self.__ring_size * 4 * 4, dynamic=True)
+
+        self.__vao = self.__create_vertex_array(self.__vbo, self.__layer_vbo)
         self.__uploaded = True
 
-    def update_vertex_buffer(self, start, end):
-        sizeof_vertex_in_bytes = 24  # (3 * 4) + 4 + (2 * 4)
-        vertex_l = self.__vertex_list[start:end]
-        ndarr = np.array(vertex_l, dtype='f4, f4, f4, u4, f4, f4')
-        self.__vbo.write(ndarr, offset=start * sizeof_vertex_in_bytes)
+    def __create_vertex_array(self, vbo, layer_vbo):
+        content = [(vbo, '3f 4f1 2f', 'in_position', 'in_color', 'in_tex_coords_0')]
+        if layer_vbo is not None:
+            content.append((layer_vbo, '1f', 'in_layer'))
+        return self.__ctx.vertex_array(self.__program, content,
+                                       index_buffer=self.__ebo, index_element_size=2, skip_errors=True)
 
-    def flush_vertex_array(self, start, end):
-        if start == end:
+    def flush_rows(self, rows, texture, layers=None):
+        if len(rows) == 0:
             return
 
         if not self.__uploaded:
             self.upload_vertex_buffer()
-        else:
-            self.update_vertex_buffer(start, end)
 
-        vertex_count = int((end - start) * 1.5)
-        self.__vao.render(vertices=vertex_count, first=start)
+        count = len(rows)
+        if self.__ring_cursor + count > self.__ring_size:
+            # the ring is full: get new storage instead of waiting for the GPU to be done with the old one
+            self.__vbo.orphan()
+            if self.__layer_vbo is not None:
+                self.__layer_vbo.orphan()
+            self.__ring_cursor = 0
+
+        texture.mgl_texture.use(location=0)
+        self.__vbo.write(rows, offset=self.__ring_cursor * VERTEX_DTYPE.itemsize * 4)
+        if layers is not None:
+            self.__program['layer_uv_scales'].write(texture.uv_scales)
+            self.__layer_vbo.write(np.repeat(layers, 4), offset=self.__ring_cursor * 4 * 4)
+        self.__vao.render(vertices=count * 6, first=self.__ring_cursor * 6)
+        self.__ring_cursor += count
+
+    def rows_changed(self, rows, old_capacity):
+        capacity = len(rows)
+        self.__vertex_data = rows.view('f4').reshape(capacity, 24)
+        self.__vertex_colors = rows['color']
+
+        # grow the vertex buffer in place: the vertex array and the index buffer stay the same
+        if self.__uploaded and self.get_ring_size() > self.__ring_size:
+            self.__ring_size = self.get_ring_size()
+            self.__ring_cursor = 0
+            self.__vbo.orphan(self.__ring_size * VERTEX_DTYPE.itemsize * 4)
+            if self.__layer_vbo is not None:
+                self.__layer_vbo.orphan(self.__ring_size * 4 * 4)
+
+    def bake(self, sort_mode):
+        """ Empties the batch into a vertex buffer of its own, drawn by draw_baked until the next bake """
+        rows, layers, runs = self.sort_batch(sort_mode)
+        if len(rows) > SpriteBatcher.MAX_RING_SIZE:
+            raise Exception(f'Cannot bake more than {SpriteBatcher.MAX_RING_SIZE} sprites')
+
+        # the index buffer is shared with the ring
+        if not self.__uploaded:
+            self.upload_vertex_buffer()
 
-    def ensure_array_capacity(self, needed_batch_items):
-        needed_capacity = 6 * needed_batch_items
-        if len(self.__index_list) > 0 and needed_capacity <= len(self.__index_list):
-            # Short circuit out of here because we have enough capacity.
+        self.__baked_runs = runs
+        if len(rows) == 0:
             return
 
-        num_batches = 0
-        if len(self.__index_list) > 0:
-            num_batches = len(self.__index_list) / 6
-
-        while num_batches < needed_batch_items:
-            #
-            #  TL    TR
-            #   0----1 0,1,2,3 = index offsets for vertex indices
-            #   |   /| TL,TR,BL,BR are vertex references in SpriteBatchItem.
-            #   |  / | front-face is 'ccw'
-            #   | /  | y is positive down the screen
-            #   |/   |
-            #   2----3
-            #  BL    BR
-            #
-            self.__index_list.append(num_batches * 4 + 0)
-            self.__index_list.append(num_batches * 4 + 1)
-            self.__index_list.append(num_batches * 4 + 2)
-
-            self.__index_list.append(num_batches * 4 + 1)
-            self.__index_list.append(num_batches * 4 + 3)
-            self.__index_list.append(num_batches * 4 + 2)
-
-            for x in range(4):
-                self.__vertex_list.append(tuple((0.0, 0.0, 0.0, 0, 0.0, 0.0)))
-
-            num_batches += 1
-
-        if self.__uploaded:
-            self.dispose()
+        # keep the buffers while they are big enough
+        size = len(rows) * VERTEX_DTYPE.itemsize * 4
+        if self.__baked_vbo is None or self.__baked_vbo.size < size:
+            self.release_baked_buffers()
+            self.__baked_vbo = self.__ctx.buffer(reserve=size)
+            if layers is not None:
+                self.__baked_layer_vbo = self.__ctx.buffer(reserve=len(rows) * 4 * 4)
+            self.__baked_vao = self.__create_vertex_array(self.__baked_vbo, self.__baked_layer_vbo)
+        else:
+            self.__baked_vbo.orphan()
+            if self.__baked_layer_vbo is not None:
+                self.__baked_layer_vbo.orphan()
+
+        self.__baked_vbo.write(np.ascontiguousarray(rows))
+        if layers is not None:
+            self.__baked_layer_vbo.write(np.repeat(layers, 4))
+
+    def draw_baked(self):
+        stats = BaseSpriteBatcher.stats
+        scissor = None
+        for start, end, texture, run_scissor in self.__baked_runs:
+            if run_scissor != scissor:
+                scissor = run_scissor
+                self.apply_scissor(scissor)
+            texture.mgl_texture.use(location=0)
+            if self.texture_array is not None:
+                self.__program['layer_uv_scales'].write(texture.uv_scales)
+            self.__baked_vao.render(vertices=(end - start) * 6, first=start * 6)
+            stats.texture_binds += 1
+            stats.draw_calls += 1
+            stats.batch_items += end - start
+            stats.vertices += (end - start) * 4
+
+        if scissor is not None:
+            self.apply_scissor(None)
+
+    def release_baked_buffers(self):
+        if self.__baked_vao is not None:
+            self.__baked_vao.release()
+            self.__baked_vao = None
+        if self.__baked_vbo is not None:
+            self.__baked_vbo.release()
+            self.__baked_vbo = None
+        if self.__baked_layer_vbo is not None:
+            self.__baked_layer_vbo.release()
+            self.__baked_layer_vbo = None
 
     def dispose(self):
+        self.release_baked_buffers()
         if self.__vao is not None:
             self.__vao.release()
         if self.__ebo is not None:
             self.__ebo.release()
         if self.__vbo is not None:
             self.__vbo.release()
+        if self.__layer_vbo is not None:
+            self.__layer_vbo.release()
+        self.__uploaded = False
+
+
+class InstancedSpriteBatcher(BaseSpriteBatcher):
+    def __init__(self, game, capacity=0, texture_array: TextureArray = None):
+        self.__instance_data = None
+        self.__instance_colors = None
+
+        self.__shader_service = game.services[SHADER_SERVICE]
+        if texture_array is not None:
+            self.__program_name = SHADER_INSTANCED_ARRAY_SPRITES
+        else:
+            self.__program_name = SHADER_INSTANCED_SPRITES
+        self.__program = self.__shader_service.programs[self.__program_name]
+
+        self.__ctx = game.ctx
+        self.__quad_vbo = None
+        self.__instance_vbo = None
+        self.__layer_vbo = None
+        self.__ebo = None
+        self.__vao = None
+
+        self.__uploaded = False
+
+        # one instance record for each batch item
+        super().__init__((), INSTANCE_DTYPE, 65536, capacity, texture_array)
+
+    @property
+    def program(self):
+        # see SpriteBatcher.program
+        program = self.__shader_service.programs[self.__program_name]
+        if program is not self.__program:
+            self.__program = program
+            if self.__vao is not None:
+                self.__vao.release()
+                self.__vao = self.__create_vertex_array()
+        return self.__program
+
+    @property
+    def instance_data(self):
+        """ The instance array seen as rows of 14 floats """
+        return self.__instance_data
+
+    @property
+    def instance_colors(self):
+        """ The packed colors of the instance array """
+        return self.__instance_colors
+
+    def create_item(self, index) -> SpriteBatchItem:
+        return SpriteBatchInstanceItem(self, index)
+
+    def apply_scissor(self, scissor):
+        self.__ctx.scissor = scissor
+
+    def add_quads(self, texture, sort_key, x, y, x0, y0, x1, y1, sin, cos, rgba, u0, v0, u1, v1, depth):
+        count = np.broadcast(x, y, x0, y0, x1, y1, rgba, u0, v0, u1, v1, depth).size
+        first = self.create_batch_items(count, texture, sort_key)
+        rows = self.__instance_data[first:first + count]
+
+        for i, value in enumerate((x, y, x0, y0, x1, y1, sin, cos, u0, v0, u1, v1)):
+            rows[:, i] = value
+        rows[:, 13] = depth
+
+        self.__instance_colors[first:first + count] = rgba
+
+    def upload_vertex_buffer(self):
+        if self.__uploaded:
+            return
+
+        # unit quad, the corners select the instance rect and texture coordinates: TL, TR, BL, BR
+        self.__quad_vbo = self.__ctx.buffer(np.array([0, 1, 1, 1, 0, 0, 1, 0], dtype='f4'))
+        self.__ebo = self.__ctx.buffer(np.array([0, 1, 2, 1, 3, 2], dtype='u2'))
+
+        num_batch_items = min(len(self.__instance_data), self.max_batch_size)
+        self.__instance_vbo = self.__ctx.buffer(reserve=num_batch_items * INSTANCE_DTYPE.itemsize, dynamic=True)
+
+        if self.texture_array is not None:
+            self.__layer_vbo = self.__ctx.buffer(reserve=num_batch_items * 4, dynamic=True)
+
+        self.__vao = self.__create_vertex_array()
+        self.__uploaded = True
+
+    def __create_vertex_array(self):
+        content = [(self.__quad_vbo, '2f', 'in_corner'),
+                   (self.__instance_vbo, '2f 4f 2f 4f 4f1 1f/i',
+                    'in_pivot', 'in_rect', 'in_rotation', 'in_tex_rect', 'in_color', 'in_depth')]
+        if self.__layer_vbo is not None:
+            content.append((self.__layer_vbo, '1f/i', 'in_layer'))
+        return self.__ctx.vertex_array(self.__program, content,
+                                       index_buffer=self.__ebo, index_element_size=2, skip_errors=True)
+
+    def flush_rows(self, rows, texture, layers=None):
+        if len(rows) == 0:
+            return
+
+        if not self.__uploaded:
+            self.upload_vertex_buffer()
+
+        # GL 3.3 has no base instance, so instances are always written at the start of the buffer:
+        # orphan it first so that the write never waits for the previous draw
+        texture.mgl_texture.use(location=0)
+        self.__instance_vbo.orphan()
+        self.__instance_vbo.write(rows)
+        if layers is not None:
+            self.__program['layer_uv_scales'].write(texture.uv_scales)
+            self.__layer_vbo.orphan()
+            self.__layer_vbo.write(layers)
+        self.__vao.render(vertices=6, instances=len(rows))
+
+    def rows_changed(self, rows, old_capacity):
+        self.__instance_data = rows.view('f4').reshape(len(rows), 14)
+        self.__instance_colors = rows['color']
+
+        # grow the instance buffer in place, the vertex array stays the same
+        if self.__uploaded and old_capacity < self.max_batch_size:
+            self.__instance_vbo.orphan(min(len(rows), self.max_batch_size) * INSTANCE_DTYPE.itemsize)
+            if self.__layer_vbo is not None:
+                self.__layer_vbo.orphan(min(len(rows), self.max_batch_size) * 4)
+
+    def dispose(self):
+        if self.__vao is not None:
+            self.__vao.release()
+        if self.__ebo is not None:
+            self.__ebo.release()
+        if self.__quad_vbo is not None:
+            self.__quad_vbo.release()
+        if self.__instance_vbo is not None:
+            self.__instance_vbo.release()
+        if self.__layer_vbo is not None:
+            self.__layer_vbo.release()
         self.__uploaded = False
 
 
 class SpriteBatch(IDisposable):
-    def __init__(self, game, capacity=0):
+    def __init__(self, game, capacity=0, backend=SpriteBatchBackend.VERTICES, use_texture_array=False):
         self.__sort_mode = SpriteSortMode.DEFERRED
-        self.__batcher = SpriteBatcher(game, capacity)
+
+        # with the shared texture array all the textures are bound at once, so the batch is not split
+        # when the texture changes
+        texture_array = game.services[TEXTURE_SERVICE].get_texture_array() if use_texture_array else None
+        if backend == SpriteBatchBackend.INSTANCED:
+            self.__batcher = InstancedSpriteBatcher(game, capacity, texture_array)
+        else:
+            self.__batcher = SpriteBatcher(game, capacity, texture_array)
+        self.__backend = backend
+        self.__use_texture_array = use_texture_array
         self.__begin_called = False
         self.__tex_coord_tl = glm.vec2()
         self.__tex_coord_br = glm.vec2()
@@ -272,6 +830,14 @@ class SpriteBatch(IDisposable):
         self.depth_test_enabled = False
         self.__game = game
 
+    @property
+    def backend(self) -> SpriteBatchBackend:
+        return self.__backend
+
+    @property
+    def use_texture_array(self) -> bool:
+        return self.__use_texture_array
+
     def setup(self):
         # blend stuff here
         self.__game.ctx.enable(mgl.BLEND)
@@ -282,7 +848,7 @@ class SpriteBatch(IDisposable):
         else:
             self.__game.ctx.disable(mgl.DEPTH_TEST)
 
-        program = self.__game.services[SHADER_SERVICE].programs[SHADER_DEFAULT_SPRITES]
+        program = self.__batcher.program
         program['proj_matrix'].write(self.__game.camera.get_projection_matrix())
         program['view_matrix'].write(self.__game.camera.get_view_matrix())
         program['model_matrix'].write(self.__transform_matrix)
@@ -300,8 +866,11 @@ class SpriteBatch(IDisposable):
 
     def set_scissor(self, scissor: Bounds):
         self.__scissor = scissor
-        v1 = glm.vec3(self.__scissor.left, self.__scissor.top, 0)
-        v2 = glm.vec3(self.__scissor.left + self.__scissor.width, self.__scissor.top + self.__scissor.height, 0)
+        self.__game.ctx.scissor = self.get_scissor_box(scissor)
+
+    def get_scissor_box(self, scissor: Bounds):
+        v1 = glm.vec3(scissor.left, scissor.top, 0)
+        v2 = glm.vec3(scissor.left + scissor.width, scissor.top + scissor.height, 0)
 
         v1.y, v2.y = v2.y, v1.y
 
@@ -313,7 +882,7 @@ class SpriteBatch(IDisposable):
 
         # ModernGL scissor: the first 2 coordinates define the lower-left corner;
         # the other 2 coordinates define the width and height of box
-        self.__game.ctx.scissor = clip_v1.x, clip_v1.y, w, h
+        return clip_v1.x, clip_v1.y, w, h
 
     def check_valid(self, texture):
         if texture is None:
@@ -326,6 +895,15 @@ class SpriteBatch(IDisposable):
     def flush(self):
         self.__batcher.draw_batch(self.__sort_mode)
 
+    def get_sort_key(self, texture: Texture2D, layer_depth):
+        if self.__sort_mode == SpriteSortMode.TEXTURE:
+            return texture.sorting_key
+        elif self.__sort_mode == SpriteSortMode.FRONT_TO_BACK:
+            return layer_depth
+        elif self.__sort_mode == SpriteSortMode.BACK_TO_FRONT:
+            return -layer_depth
+        return 0.0
+
     def flush_if_needed(self):
         if self.__sort_mode == SpriteSortMode.IMMEDIATE:
             self.__batcher.draw_batch(self.__sort_mode)
@@ -369,12 +947,37 @@ class SpriteBatch(IDisposable):
         self.flush()
         self.cleanup()
 
+    def bake(self):
+        """
+        Ends the batch like end, but instead of drawing the sprites it keeps their vertices in a buffer of their own.
+        draw_baked draws them again (with the same sort order and transform) until the next bake.
+        Only the VERTICES backend supports it.
+        """
+        if not self.__begin_called:
+            raise Exception('Begin must be called before calling Bake.')
+        if self.__backend != SpriteBatchBackend.VERTICES:
+            raise Exception('Only the VERTICES sprite batch backend supports Bake.')
+        if self.__sort_mode == SpriteSortMode.IMMEDIATE:
+            raise Exception('Sprites drawn in IMMEDIATE sort mode cannot be baked.')
+
+        self.__begin_called = False
+        self.__batcher.bake(self.__sort_mode)
+        self.unset_scissor()
+
+    def draw_baked(self):
+        if self.__begin_called:
+            raise Exception('DrawBaked cannot be called between Begin and End.')
+
+        self.setup()
+        self.__batcher.draw_baked()
+        self.cleanup()
+
     def draw(self,
              texture: Texture2D,
              position: glm.vec2,
              source_rect: pg.Rect = None,
              rotation: float = 0.0,
-             color: pg.Color = pg.Color('white'),
+             color=0xffffffff,
              origin: glm.vec2 = glm.vec2(0.0, 0.0),
              scale: glm.vec2 = glm.vec2(1.0, 1.0),
              size: glm.vec2 = None,
@@ -382,21 +985,11 @@ class SpriteBatch(IDisposable):
              layer_depth: float = 0,
              scissor: Bounds = None):
 
+        """ color is a pg.Color or, cheaper, a color already packed with utils.pack_color """
         self.check_valid(texture)
 
-        if scissor:
-            self.setup()
-            self.flush()
-            self.set_scissor(scissor)
-
-        item = self.__batcher.create_batch_item()
-        item.texture = texture
-        if self.__sort_mode == SpriteSortMode.TEXTURE:
-            item.sortkey = texture.sorting_key
-        elif self.__sort_mode == SpriteSortMode.FRONT_TO_BACK:
-            item.sortkey = layer_depth
-        elif self.__sort_mode == SpriteSortMode.BACK_TO_FRONT:
-            item.sortkey = -layer_depth
+        if isinstance(color, pg.Color):
+            color = utils.pack_color(color)
 
         s = scale
 
@@ -434,8 +1027,38 @@ class SpriteBatch(IDisposable):
         if effects & SpriteEffects.FLIP_HORIZONTALLY:
             self.__tex_coord_tl.x, self.__tex_coord_br.x = self.__tex_coord_br.x, self.__tex_coord_tl.x
 
+        x = position.x - origin.x
+        y = position.y - origin.y
+
+        # the scissor box is in virtual coordinates: when sprites are drawn in virtual coordinates too,
+        # an unrotated sprite is clipped here and can stay in the batch as any other sprite.
+        # Otherwise the scissor box goes with the batch item and splits the batch.
+        scissor_box = None
+        if scissor:
+            if rotation == 0 and w > 0 and h > 0 and self.__transform_matrix == self.__game.get_virtual_matrix():
+                left = max(x, scissor.left)
+                right = min(x + w, scissor.left + scissor.width)
+                top = max(y, scissor.top)
+                bottom = min(y + h, scissor.top + scissor.height)
+                if left >= right or top >= bottom:
+                    return
+
+                # texture coordinates at the clipped edges, tl goes with y + h and br with y (see set)
+                u0, v0 = self.__tex_coord_tl.x, self.__tex_coord_br.y
+                du = (self.__tex_coord_br.x - u0) / w
+                dv = (self.__tex_coord_tl.y - v0) / h
+                self.__tex_coord_tl = glm.vec2(u0 + (left - x) * du, v0 + (bottom - y) * dv)
+                self.__tex_coord_br = glm.vec2(u0 + (right - x) * du, v0 + (top - y) * dv)
+                x, y, w, h = left, top, right - left, bottom - top
+            else:
+                scissor_box = self.get_scissor_box(scissor)
+
+        item = self.__batcher.create_batch_item(texture, self.get_sort_key(texture, layer_depth))
+        if scissor_box is not None:
+            self.__batcher.set_scissor(item.index, scissor_box)
+
         if rotation == 0:
-            item.set(position.x - origin.x, position.y - origin.y,
+            item.set(x, y,
                      w, h,
                      color,
                      self.__tex_coord_tl, self.__tex_coord_br,
@@ -450,40 +1073,115 @@ class SpriteBatch(IDisposable):
                               layer_depth)
 
         # We need to flush if we're using Immediate sort mode.
-        if scissor:
-            self.flush()
-            self.unset_scissor()
+        self.flush_if_needed()
+
+    def draw_many(self,
+                  texture,
+                  positions,
+                  frame_ids=None,
+                  source_rects=None,
+                  sizes=None,
+                  origins=None,
+                  rotations=None,
+                  colors=None,
+                  layer_depths=0.0,
+                  effects: SpriteEffects = SpriteEffects.NONE):
+        """
+        Draws many sprites sharing the same texture with a single vectorized pass.
+
+        texture is a Texture2D, or a SpriteSheet when the source rects are picked with frame_ids.
+        positions is an array of shape (n, 2), the other arguments are either arrays with one entry
+        for each sprite or a single value shared by all of them:
+        frame_ids (n) indices into SpriteSheet.frame_rects, source_rects (n, 4) as x, y, w, h,
+        sizes (n, 2) already scaled, origins (n, 2), rotations (n) in degrees,
+        colors (n) rgba packed as in utils.pack_color (or a pg.Color), layer_depths (n)
+        """
+        if isinstance(texture, SpriteSheet):
+            if frame_ids is not None:
+                source_rects = texture.frame_rects[frame_ids]
+            texture = texture.texture2d
+
+        self.check_valid(texture)
+
+        positions = np.asarray(positions, dtype='f8').reshape(-1, 2)
+        count = len(positions)
+        if count == 0:
+            return
+
+        # sprite size
+        if sizes is not None:
+            sizes = np.broadcast_to(np.asarray(sizes, dtype='f8'), (count, 2))
+        elif source_rects is not None:
+            sizes = np.broadcast_to(np.asarray(source_rects, dtype='f8'), (count, 4))[:, 2:4]
         else:
-            self.flush_if_needed()
+            sizes = np.array([[texture.width, texture.height]], dtype='f8')
 
-    def draw_string(self, sp_sheet: SpriteSheet, text: str, position: glm.vec2,
-                    w: float, h: float, rotation: float,
-                    chars_colors=None, kerning_width=0, layer_depth: float = 0.1):
-        if chars_colors is None:
-            chars_colors = list()
-            for i in range(len(text)):
-                chars_colors.append(pg.Color('white'))
-                
-        offset = glm.ivec2(0, 0)
-        first_char_of_line = True
+        # texture coordinates
+        if source_rects is not None:
+            rects = np.broadcast_to(np.asarray(source_rects, dtype='f8'), (count, 4))
+            texel_width = 1.0 / texture.width
+            texel_height = 1.0 / texture.height
+            u0 = rects[:, 0] * texel_width
+            v0 = 1.0 - (rects[:, 1] * texel_height)
+            u1 = (rects[:, 0] + rects[:, 2]) * texel_width
+            v1 = 1.0 - ((rects[:, 1] + rects[:, 3]) * texel_height)
+        else:
+            u0, v0, u1, v1 = 0.0, 1.0, 1.0, 0.0
 
-        texture = sp_sheet.texture2d
+        if self.__game.is_origin_topleft():
+            v0, v1 = v1, v0
 
-        sort_key = 0.0
-        if self.__sort_mode == SpriteSortMode.TEXTURE:
-            sort_key = texture.sorting_key
-        elif self.__sort_mode == SpriteSortMode.FRONT_TO_BACK:
-            sort_key = layer_depth
-        elif self.__sort_mode == SpriteSortMode.BACK_TO_FRONT:
-            sort_key = -layer_depth
+        if effects & SpriteEffects.FLIP_VERTICALLY:
+            v0, v1 = v1, v0
 
-        texel_width = 1.0 / texture.width
-        texel_height = 1.0 / texture.height
+        if effects & SpriteEffects.FLIP_HORIZONTALLY:
+            u0, u1 = u1, u0
 
-        for i, c in enumerate(list(text)):
-            c_ord = ord(c)
-            source_rect = sp_sheet.frames[str(c_ord)].rect
+        if origins is None:
+            x0 = y0 = 0.0
+        else:
+            origins = np.broadcast_to(np.asarray(origins, dtype='f8'), (count, 2))
+            x0 = -origins[:, 0]
+            y0 = -origins[:, 1]
+
+        if rotations is None:
+            sin, cos = 0.0, 1.0
+        else:
+            radians = np.radians(np.asarray(rotations, dtype='f8'))
+            sin, cos = np.sin(radians), np.cos(radians)
+
+        if colors is None:
+            colors = 0xffffffff
+        elif isinstance(colors, pg.Color):
+            colors = utils.pack_color(colors)
+
+        layer_depths = np.asarray(layer_depths, dtype='f8')
+        self.add_quads(texture, self.get_sort_key(texture, layer_depths),
+                       positions[:, 0], positions[:, 1],
+                       x0, y0, x0 + sizes[:, 0], y0 + sizes[:, 1],
+                       sin, cos, colors,
+                       u0, v0, u1, v1,
+                       layer_depths)
 
+        # We need to flush if we're using Immediate sort mode.
+        self.flush_if_needed()
+
+    def add_quads(self, texture: Texture2D, sort_key, x, y, x0, y0, x1, y1, sin, cos, rgba, u0, v0, u1, v1, depth):
+        """ See BaseSpriteBatcher.add_quads """
+        self.__batcher.add_quads(texture, sort_key, x, y, x0, y0, x1, y1, sin, cos, rgba, u0, v0, u1, v1, depth)
+
+    def build_glyph_run(self, sp_sheet: SpriteSheet, text: str, w: float, h: float,
+                        chars_colors=None, kerning_width=0) -> GlyphRun:
+        """ Lays out the glyphs of a string, the run can be drawn any number of times with draw_glyph_run """
+        offset = glm.ivec2(0, 0)
+        first_char_of_line = True
+
+        offsets_x = []
+        offsets_y = []
+        rects = []
+        colors = []
+
+        for i, c in enumerate(text):
             if c == '\r':
                 continue
             if c == '\n':
@@ -492,44 +1190,71 @@ class SpriteBatch(IDisposable):
                 first_char_of_line = True
                 continue
 
+            source_rect = sp_sheet.frames[str(ord(c))].rect
+
             if first_char_of_line:
                 offset.x = 0
                 first_char_of_line = False
             else:
                 offset.x += w
 
-            item = self.__batcher.create_batch_item()
+            offsets_x.append(offset.x)
+            offsets_y.append(offset.y)
+            rects.append((source_rect.left, source_rect.top, source_rect.w, source_rect.h))
+            if chars_colors is not None:
+                colors.append(chars_colors[i])
 
-            item.texture = texture
-            item.sortkey = sort_key
+            offset.x += kerning_width
 
-            self.__tex_coord_tl = glm.vec2(source_rect.left * texel_width, 1.0 - (source_rect.top * texel_height))
-            self.__tex_coord_br = glm.vec2((source_rect.left + source_rect.w) * texel_width,
-                                           1.0 - ((source_rect.top + source_rect.h) * texel_height))
+        texture = sp_sheet.texture2d
+        rects = np.array(rects, dtype='f8').reshape(-1, 4)
+        texel_width = 1.0 / texture.width
+        texel_height = 1.0 / texture.height
+        u0 = rects[:, 0] * texel_width
+        v0 = 1.0 - (rects[:, 1] * texel_height)
+        u1 = (rects[:, 0] + rects[:, 2]) * texel_width
+        v1 = 1.0 - ((rects[:, 1] + rects[:, 3]) * texel_height)
 
-            if self.__game.is_origin_topleft():
-                self.__tex_coord_tl.y, self.__tex_coord_br.y = self.__tex_coord_br.y, self.__tex_coord_tl.y
+        if self.__game.is_origin_topleft():
+            v0, v1 = v1, v0
 
+        if chars_colors is None:
+            colors = np.full(len(rects), 0xffffffff, dtype='u4')
+        else:
+            colors = utils.pack_colors(colors)
+
+        return GlyphRun(texture, w, h, kerning_width,
+                        np.array(offsets_x, dtype='f8'), np.array(offsets_y, dtype='f8'),
+                        u0, v0, u1, v1, colors)
+
+    def draw_glyph_run(self, glyph_run: GlyphRun, position: glm.vec2, rotation: float, layer_depth: float = 0.1):
+        run = glyph_run
+        if len(run.offsets_x) > 0:
+            texture = run.texture
             if rotation == 0:
-                item.set(offset.x + position.x, offset.y + position.y,
-                         w, h,
-                         chars_colors[i],
-                         self.__tex_coord_tl, self.__tex_coord_br, layer_depth)
+                self.add_quads(texture, self.get_sort_key(texture, layer_depth),
+                               run.offsets_x + position.x, run.offsets_y + position.y,
+                               0.0, 0.0, run.w, run.h,
+                               0.0, 1.0, run.colors,
+                               run.u0, run.v0, run.u1, run.v1, layer_depth)
             else:
-                item.set_extended(position.x, position.y,
-                                  offset.x, offset.y,
-                                  w, h,
-                                  utils.sin_deg(rotation), utils.cos_deg(rotation),
-                                  chars_colors[i],
-                                  self.__tex_coord_tl, self.__tex_coord_br,
-                                  layer_depth)
-
-            offset.x += kerning_width
+                self.add_quads(texture, self.get_sort_key(texture, layer_depth),
+                               position.x, position.y,
+                               run.offsets_x, run.offsets_y, run.offsets_x + run.w, run.offsets_y + run.h,
+                               utils.sin_deg(rotation), utils.cos_deg(rotation), run.colors,
+                               run.u0, run.v0, run.u1, run.v1, layer_depth)
 
         # We need to flush if we're using Immediate sort mode.
         self.flush_if_needed()
 
+    def draw_string(self, sp_sheet: SpriteSheet, text: str, position: glm.vec2,
+                    w: float, h: float, rotation: float,
+                    chars_colors=None, kerning_width=0, layer_depth: float = 0.1):
+        glyph_run = self.build_glyph_run(sp_sheet, text, w, h, chars_colors, kerning_width)
+        self.draw_glyph_run(glyph_run, position, rotation, layer_depth)
+
     def draw_string_sprite_font(self, sprite_font, text, position, color):
+        rgba = utils.pack_color(color)
         offset = glm.vec2(0, 0)
         first_char_of_line = True
 
@@ -554,9 +1279,7 @@ class SpriteBatch(IDisposable):
 
             texture = sprite_font.sprite_frame_list[current_glyph.page].texture
             sortkey = texture.sorting_key if self.__sort_mode == SpriteSortMode.TEXTURE else 0
-            item = self.__batcher.create_batch_item()
-            item.texture = texture
-            item.sortkey = sortkey
+            item = self.__batcher.create_batch_item(texture, sortkey)
 
             texel_width = 1.0 / texture.width
             texel_height = 1.0 / texture.height
@@ -574,7 +1297,7 @@ class SpriteBatch(IDisposable):
 
             item.set(p.x, p.y,
                      current_glyph.width, current_glyph.height,
-                     color,
+                     rgba,
                      self.__tex_coord_tl, self.__tex_coord_br, 0)
 
             offset.x += current_glyph.xadvance
@@ -611,6 +1334,7 @@ class SpriteBatch(IDisposable):
             scale_rot = glm.rotate(transformation, glm.radians(rotation), glm.vec3(0, 0, 1))
             transformation = trans_mat * scale_mat * scale_rot
 
+        rgba = utils.pack_color(color)
         offset = glm.vec2(0)
         first_char_of_line = True
         sort_key = 0.0
@@ -653,9 +1377,7 @@ class SpriteBatch(IDisposable):
 
             p = transformation * glm.vec4(p.x, p.y, 0, 1)
 
-            item = self.__batcher.create_batch_item()
-            item.texture = texture
-            item.sortkey = sort_key
+            item = self.__batcher.create_batch_item(texture, sort_key)
 
             texel_width = 1.0 / texture.width
             texel_height = 1.0 / texture.height
@@ -675,14 +1397,14 @@ class SpriteBatch(IDisposable):
             if rotation == 0:
                 item.set(p.x, p.y,
                          current_glyph.width * scale.x, current_glyph.height * scale.y,
-                         color,
+                         rgba,
                          self.__tex_coord_tl, self.__tex_coord_br, layer_depth)
             else:
                 item.set_extended(p.x, p.y,
                                   0, 0,
                                   current_glyph.width * scale.x, current_glyph.height * scale.y,
                                   utils.sin_deg(rotation), utils.cos_deg(rotation),
-                                  color,
+                                  rgba,
                                   self.__tex_coord_tl, self.__tex_coord_br, layer_depth)
 
             offset.x += current_glyph.xadvance
@@ -1,5 +1,6 @@
 import os
 
+import numpy as np
 import pygame as pg
 
 from pyjam.constants import *
@@ -19,18 +20,50 @@ class SpriteSheet:
         # used only for bitmapped fonts
         self.kerning_width = 0.0
         self.__game = game
+        # frame rects as a NumPy array (x, y, w, h), rebuilt when the frames change
+        self.__frame_rects = None
+        self.__frame_ids = {}
 
     @property
     def texture2d(self):
         return self.__texture2d
 
+    @property
+    def frame_rects(self):
+        """ The rects of all the frames, in insertion order, as an array of shape (n, 4) - see SpriteBatch.draw_many """
+        self.__update_frame_table()
+        return self.__frame_rects
+
+    def frame_id(self, frame_name) -> int:
+        """ Returns the index of the given frame in frame_rects """
+        self.__update_frame_table()
+        return self.__frame_ids[frame_name]
+
+    def __update_frame_table(self):
+        if self.__frame_rects is not None and len(self.__frame_rects) == len(self.frames):
+            return
+
+        self.__frame_rects = np.array([(f.rect.x, f.rect.y, f.rect.w, f.rect.h) for f in self.frames.values()],
+                                      dtype='f4').reshape(-1, 4)
+        self.__frame_ids = {name: i for i, name in enumerate(self.frames)}
+
+    def relocate(self, texture2d, x, y):
+        """ Moves the sheet into a region of another texture (e.g. a TextureAtlas page) whose top-left corner is x, y """
+        self.__texture2d = texture2d
+        for frame in self.frames.values():
+            frame.texture = texture2d
+            frame.rect = frame.rect.move(x, y)
+        self.__frame_rects = None
+
     def save_rect_file(self, filename):
         with open(filename, 'w') as f:
             for key, frame in self.frames.items():
                 f.write(f'{key}:{frame.rect.x}:{frame.rect.y}:{frame.rect.w}:{frame.rect.h}\n')
 
-    def load_grid(self, filename, frame_name, cw, ch, item_x, item_y, starting_id=0):
-        self.__texture2d = self.__texture_mgr.load_texture(filename)
+    # when an atlas is given, the image is packed by TextureAtlas.build and the frames get their texture there
+    def load_grid(self, filename, frame_name, cw, ch, item_x, item_y, starting_id=0, atlas=None):
+        if atlas is None:
+            self.__texture2d = self.__texture_mgr.load_texture(filename)
         self.__cell_width = cw
         self.__cell_height = ch
         y = 0
@@ -55,9 +88,12 @@ class SpriteSheet:
 
         self.__num_items = i - starting_id
         self.__game.services[ASSET_SERVICE].insert(filename, self)
+        if atlas is not None:
+            atlas.add_sheet(filename, self)
 
-    def load_rects(self, filename):
-        self.__texture2d = self.__texture_mgr.load_texture(filename)
+    def load_rects(self, filename, atlas=None):
+        if atlas is None:
+            self.__texture2d = self.__texture_mgr.load_texture(filename)
 
         i = 0
         asset_root = self.__game.get_assets_root()
@@ -76,3 +112,5 @@ class SpriteSheet:
 
         self.__num_items = i
         self.__game.services[ASSET_SERVICE].insert(filename, self)
+        if atlas is not None:
+            atlas.add_sheet(filename, self)
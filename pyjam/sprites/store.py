@@ -0,0 +1,551 @@
+import copy
+
+import glm
+import numpy as np
+import pygame as pg
+
+from pyjam import collision, utils
+from pyjam.core import Bounds
+from pyjam.sprites.animation import Animation2D
+from pyjam.sprites.batch import SpriteBatch, SpriteEffects
+from pyjam.sprites.frame import SpriteFrame
+
+
+class SpriteStore:
+    """
+    Keeps the state of many sprites in NumPy columns, one row for each sprite,
+    the sprites themselves (StoredSprite) are handles to their row.
+
+    The store sits in the game sprites list in place of its sprites: it updates the animated ones
+    and draws all the visible rows with SpriteBatch.draw_many, in row order,
+    so whole groups of sprites can be moved, hidden or culled with array operations on the columns.
+
+    The columns are allocated ahead and grow geometrically, their properties are views of the first count rows:
+    a view stays valid until a create call needs to grow the columns.
+    """
+
+    def __init__(self, game):
+        self.__game = game
+        self.__sprites = []
+
+        # rows in use, the columns hold more rows
+        self.__count = 0
+
+        # per sprite data, x and y are the position, hx and hy the hotspot, sx and sy the scale
+        self.__x = np.zeros(0, dtype='f4')
+        self.__y = np.zeros(0, dtype='f4')
+        self.__w = np.zeros(0, dtype='f4')
+        self.__h = np.zeros(0, dtype='f4')
+        self.__hx = np.zeros(0, dtype='f4')
+        self.__hy = np.zeros(0, dtype='f4')
+        self.__sx = np.zeros(0, dtype='f4')
+        self.__sy = np.zeros(0, dtype='f4')
+        self.__angles = np.zeros(0, dtype='f8')
+        self.__frame_ids = np.zeros(0, dtype='i4')
+        self.__colors = np.zeros(0, dtype='u4')
+        self.__layer_depths = np.zeros(0, dtype='f8')
+        self.__visible = np.zeros(0, dtype=bool)
+        self.__active = np.zeros(0, dtype=bool)
+        self.__scissored = np.zeros(0, dtype=bool)
+
+        # the frames used by the sprites, a frame id is an index in these lists
+        self.__frames = []
+        self.__frame_indices = {}
+        self.__frames_dirty = False
+        self.__frame_rects = np.zeros((0, 4), dtype='f8')
+        self.__frame_texture_ids = np.zeros(0, dtype='i4')
+        self.__textures = []
+
+        # sprites with an animation, updated every frame
+        self.__animated = []
+
+        # positions before the last fixed update step and the ones drawn in between, see Game.set_fixed_timestep
+        self.__previous_x = None
+        self.__previous_y = None
+        self.__previous_shown = None
+        self.__drawn_x = None
+        self.__drawn_y = None
+
+        # the store is never part of a StaticLayer
+        self.static_layer = None
+
+    def __len__(self):
+        return self.__count
+
+    def __getitem__(self, index):
+        return self.__sprites[index]
+
+    @property
+    def sprites(self):
+        return self.__sprites
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.__x[:self.__count]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.__y[:self.__count]
+
+    @property
+    def widths(self) -> np.ndarray:
+        return self.__w[:self.__count]
+
+    @property
+    def heights(self) -> np.ndarray:
+        return self.__h[:self.__count]
+
+    @property
+    def hotspots_x(self) -> np.ndarray:
+        return self.__hx[:self.__count]
+
+    @property
+    def hotspots_y(self) -> np.ndarray:
+        return self.__hy[:self.__count]
+
+    @property
+    def scales_x(self) -> np.ndarray:
+        return self.__sx[:self.__count]
+
+    @property
+    def scales_y(self) -> np.ndarray:
+        return self.__sy[:self.__count]
+
+    @property
+    def angles(self) -> np.ndarray:
+        return self.__angles[:self.__count]
+
+    @property
+    def frame_ids(self) -> np.ndarray:
+        return self.__frame_ids[:self.__count]
+
+    @property
+    def colors(self) -> np.ndarray:
+        """ Colors packed with utils.pack_color """
+        return self.__colors[:self.__count]
+
+    @property
+    def layer_depths(self) -> np.ndarray:
+        return self.__layer_depths[:self.__count]
+
+    @property
+    def visible_flags(self) -> np.ndarray:
+        return self.__visible[:self.__count]
+
+    @property
+    def active_flags(self) -> np.ndarray:
+        return self.__active[:self.__count]
+
+    @property
+    def scissored(self) -> np.ndarray:
+        return self.__scissored[:self.__count]
+
+    @property
+    def visible(self) -> bool:
+        return bool(self.__visible[:self.__count].any())
+
+    @visible.setter
+    def visible(self, visible_flag: bool):
+        self.__visible[:self.__count] = visible_flag
+
+    def set_visible(self, start: int, end: int, visible_flag: bool):
+        """ Shows or hides the sprites in [start, end) """
+        self.visible_flags[start:end] = visible_flag
+
+    def create(self, frame: SpriteFrame):
+        """ Adds a row and returns its StoredSprite, initialized like a Sprite """
+        index = self.__count
+        self.grow_capacity(index + 1)
+        self.__x[index] = 0.0
+        self.__y[index] = 0.0
+        self.__w[index] = 0.0
+        self.__h[index] = 0.0
+        self.__hx[index] = 0.0
+        self.__hy[index] = 0.0
+        self.__sx[index] = 1.0
+        self.__sy[index] = 1.0
+        self.__angles[index] = 0.0
+        self.__frame_ids[index] = self.get_frame_id(frame)
+        self.__colors[index] = 0xffffffff
+        self.__layer_depths[index] = 0.5
+        self.__visible[index] = True
+        self.__active[index] = True
+        self.__scissored[index] = False
+        self.__count += 1
+
+        sprite = StoredSprite(self, index)
+        self.__sprites.append(sprite)
+        if frame is not None:
+            sprite.size = glm.vec2(frame.rect.w, frame.rect.h)
+        return sprite
+
+    def grow_capacity(self, needed_rows: int):
+        """ Reallocates the columns if they hold less than needed_rows, the views of the columns are then stale """
+        size = len(self.__x)
+        if needed_rows <= size:
+            return
+
+        while size < needed_rows:
+            size = round(size + (size / 2))  # grow by x1.5
+            size = max((size + 63) & (~63), 64)  # grow in chunks of 64
+        self.__x = SpriteStore.__grow(self.__x, size)
+        self.__y = SpriteStore.__grow(self.__y, size)
+        self.__w = SpriteStore.__grow(self.__w, size)
+        self.__h = SpriteStore.__grow(self.__h, size)
+        self.__hx = SpriteStore.__grow(self.__hx, size)
+        self.__hy = SpriteStore.__grow(self.__hy, size)
+        self.__sx = SpriteStore.__grow(self.__sx, size)
+        self.__sy = SpriteStore.__grow(self.__sy, size)
+        self.__angles = SpriteStore.__grow(self.__angles, size)
+        self.__frame_ids = SpriteStore.__grow(self.__frame_ids, size)
+        self.__colors = SpriteStore.__grow(self.__colors, size)
+        self.__layer_depths = SpriteStore.__grow(self.__layer_depths, size)
+        self.__visible = SpriteStore.__grow(self.__visible, size)
+        self.__active = SpriteStore.__grow(self.__active, size)
+        self.__scissored = SpriteStore.__grow(self.__scissored, size)
+
+    @staticmethod
+    def __grow(column, size):
+        grown = np.zeros(size, dtype=column.dtype)
+        grown[0:len(column)] = column
+        return grown
+
+    def get_frame_id(self, frame: SpriteFrame) -> int:
+        if frame is None:
+            return -1
+        frame_id = self.__frame_indices.get(id(frame))
+        if frame_id is None:
+            frame_id = len(self.__frames)
+            self.__frames.append(frame)
+            self.__frame_indices[id(frame)] = frame_id
+            self.__frames_dirty = True
+        return frame_id
+
+    def get_frame(self, frame_id: int) -> SpriteFrame:
+        return self.__frames[frame_id] if frame_id >= 0 else None
+
+    def add_animated(self, sprite):
+        if sprite not in self.__animated:
+            self.__animated.append(sprite)
+
+    def update(self, delta_time: float):
+        for sprite in self.__animated:
+            sprite.update(delta_time)
+
+    def save_position(self):
+        """ Keeps the positions before a fixed update step, the rows hidden at that time are not interpolated """
+        count = self.__count
+        self.__previous_x = self.__x[:count].copy()
+        self.__previous_y = self.__y[:count].copy()
+        self.__previous_shown = self.__visible[:count] & self.__active[:count]
+
+    def interpolate(self, alpha: float):
+        """
+        Draws the rows at alpha between their previous and current positions, until end_interpolation.
+        The scissored sprites, drawn on their own, are not interpolated
+        """
+        # rows created since the last step have no previous position
+        if self.__previous_x is None or len(self.__previous_x) != self.__count:
+            return
+        alpha = np.float32(alpha)
+        x = self.__x[:self.__count]
+        y = self.__y[:self.__count]
+        self.__drawn_x = np.where(self.__previous_shown, self.__previous_x + (x - self.__previous_x) * alpha, x)
+        self.__drawn_y = np.where(self.__previous_shown, self.__previous_y + (y - self.__previous_y) * alpha, y)
+
+    def end_interpolation(self):
+        self.__drawn_x = None
+        self.__drawn_y = None
+
+    def render(self, sprite_batch: SpriteBatch):
+        count = self.__count
+        rows = np.flatnonzero(self.__visible[:count] & self.__active[:count] & (self.__frame_ids[:count] >= 0))
+        if len(rows) == 0:
+            return
+
+        if self.__frames_dirty:
+            self.__update_frames()
+
+        # runs of consecutive rows sharing the same texture, a scissored sprite is drawn on its own
+        texture_ids = self.__frame_texture_ids[self.__frame_ids[rows]]
+        scissored = self.__scissored[rows]
+        breaks = np.flatnonzero((texture_ids[1:] != texture_ids[:-1]) | scissored[1:] | scissored[:-1]) + 1
+        for run in np.split(rows, breaks):
+            if self.__scissored[run[0]]:
+                self.__sprites[run[0]].render(sprite_batch)
+            else:
+                self.__draw_rows(sprite_batch, run)
+
+    def __draw_rows(self, sprite_batch, rows):
+        frame_ids = self.__frame_ids[rows]
+        texture = self.__textures[self.__frame_texture_ids[frame_ids[0]]]
+        x, y = (self.__x, self.__y) if self.__drawn_x is None else (self.__drawn_x, self.__drawn_y)
+        # the hotspot is scaled with sprite, so only the size is scaled here
+        sprite_batch.draw_many(texture=texture,
+                               positions=np.stack((x[rows], y[rows]), axis=1),
+                               source_rects=self.__frame_rects[frame_ids],
+                               sizes=np.stack((np.multiply(self.__w[rows], self.__sx[rows], dtype='f8'),
+                                               np.multiply(self.__h[rows], self.__sy[rows], dtype='f8')), axis=1),
+                               origins=np.stack((self.__hx[rows], self.__hy[rows]), axis=1),
+                               rotations=self.__angles[rows],
+                               colors=self.__colors[rows],
+                               layer_depths=self.__layer_depths[rows])
+
+    def __update_frames(self):
+        # frames are read when first drawn, so sheets moved to an atlas before that are picked up
+        textures = []
+        texture_ids = []
+        for frame in self.__frames:
+            if frame.texture not in textures:
+                textures.append(frame.texture)
+            texture_ids.append(textures.index(frame.texture))
+        self.__textures = textures
+        self.__frame_texture_ids = np.array(texture_ids, dtype='i4')
+        self.__frame_rects = np.array([(f.rect.x, f.rect.y, f.rect.w, f.rect.h) for f in self.__frames], dtype='f8')
+        self.__frames_dirty = False
+
+
+class StoredSprite:
+    """
+    A sprite whose state is a row of a SpriteStore, it has the same interface as Sprite.
+
+    Unlike Sprite, position, hotspot, size and scale return copies of the row values: changing them in place
+    (sprite.position.x += dx) does nothing, without any error. Assign them to change the sprite,
+    e.g. sprite.position = glm.vec2(x, y), sprite.x = x or sprite.move(dx, dy).
+    """
+
+    __slots__ = ('__store', '__index', '__animation', '__shape', '__scissor')
+
+    def __init__(self, store: SpriteStore, index: int):
+        self.__store = store
+        self.__index = index
+
+        # current animation
+        self.__animation = None
+
+        # Box2d shape used for collisions
+        self.__shape = None
+
+        self.__scissor = None
+
+    @property
+    def store(self) -> SpriteStore:
+        return self.__store
+
+    @property
+    def index(self) -> int:
+        return self.__index
+
+    @property
+    def hotspot(self) -> glm.vec2:
+        return glm.vec2(self.__store.hotspots_x[self.__index], self.__store.hotspots_y[self.__index])
+
+    @hotspot.setter
+    def hotspot(self, hs: glm.vec2):
+        self.__store.hotspots_x[self.__index] = hs[0]
+        self.__store.hotspots_y[self.__index] = hs[1]
+
+    @property
+    def position(self) -> glm.vec2:
+        return glm.vec2(self.__store.x[self.__index], self.__store.y[self.__index])
+
+    @position.setter
+    def position(self, pos: glm.vec2):
+        self.__store.x[self.__index] = pos[0]
+        self.__store.y[self.__index] = pos[1]
+
+    @property
+    def x(self) -> float:
+        return float(self.__store.x[self.__index])
+
+    @x.setter
+    def x(self, value: float):
+        self.__store.x[self.__index] = value
+
+    @property
+    def y(self) -> float:
+        return float(self.__store.y[self.__index])
+
+    @y.setter
+    def y(self, value: float):
+        self.__store.y[self.__index] = value
+
+    def move(self, dx: float = 0.0, dy: float = 0.0):
+        self.x = self.x + dx
+        self.y = self.y + dy
+
+    @property
+    def width(self) -> float:
+        return float(self.__store.widths[self.__index])
+
+    @property
+    def height(self) -> float:
+        return float(self.__store.heights[self.__index])
+
+    @property
+    def size(self) -> glm.vec2:
+        return glm.vec2(self.__store.widths[self.__index], self.__store.heights[self.__index])
+
+    @size.setter
+    def size(self, new_size: glm.vec2):
+        size = glm.vec2(new_size)
+        self.__store.widths[self.__index] = size.x
+        self.__store.heights[self.__index] = size.y
+        self.hotspot = size / 2
+        self.build_shape()
+
+    @property
+    def angle(self) -> float:
+        return float(self.__store.angles[self.__index])
+
+    @angle.setter
+    def angle(self, value: float):
+        """ Sets the sprite's rotation angle in degrees """
+
+        self.__store.angles[self.__index] = utils.wrap_angle_deg_180(value)
+
+    @property
+    def scale(self) -> glm.vec2:
+        return glm.vec2(self.__store.scales_x[self.__index], self.__store.scales_y[self.__index])
+
+    @scale.setter
+    def scale(self, value: glm.vec2):
+        """
+        Scale the sprite.
+        When the sprite is scaled, the hotspot of the sprite is also scaled
+        """
+        scale = glm.vec2(value)
+        self.__store.scales_x[self.__index] = scale.x
+        self.__store.scales_y[self.__index] = scale.y
+        self.hotspot = self.hotspot * scale
+
+    @property
+    def color(self) -> pg.Color:
+        rgba = int(self.__store.colors[self.__index])
+        return pg.Color(rgba & 0xff, (rgba >> 8) & 0xff, (rgba >> 16) & 0xff, rgba >> 24)
+
+    @color.setter
+    def color(self, value: pg.Color):
+        self.__store.colors[self.__index] = utils.pack_color(value)
+
+    @property
+    def frame(self) -> SpriteFrame:
+        return self.__store.get_frame(self.__store.frame_ids[self.__index])
+
+    @frame.setter
+    def frame(self, value: SpriteFrame):
+        if self.is_playing():
+            self.stop()
+        self.__store.frame_ids[self.__index] = self.__store.get_frame_id(value)
+
+    @property
+    def active(self) -> bool:
+        return bool(self.__store.active_flags[self.__index])
+
+    @active.setter
+    def active(self, active_flag: bool):
+        self.__store.active_flags[self.__index] = active_flag
+
+    @property
+    def visible(self) -> bool:
+        return bool(self.__store.visible_flags[self.__index])
+
+    @visible.setter
+    def visible(self, visible_flag: bool):
+        self.__store.visible_flags[self.__index] = visible_flag
+
+    @property
+    def layer_depth(self):
+        return float(self.__store.layer_depths[self.__index])
+
+    @layer_depth.setter
+    def layer_depth(self, ldepth):
+        self.__store.layer_depths[self.__index] = ldepth
+
+    @property
+    def shape(self):
+        return self.__shape
+
+    @shape.setter
+    def shape(self, b2dshape):
+        """ Define the shape used for collision detection, see Sprite.shape """
+        self.__shape = b2dshape
+
+    @property
+    def scissor(self) -> Bounds:
+        return self.__scissor
+
+    @scissor.setter
+    def scissor(self, value: Bounds):
+        self.__scissor = copy.copy(value)
+        self.__store.scissored[self.__index] = value is not None
+
+    @property
+    def static_layer(self):
+        return None
+
+    @static_layer.setter
+    def static_layer(self, layer):
+        raise Exception('A stored sprite is drawn by its store, it cannot be part of a static layer')
+
+    # set a new animation for the sprite
+    def set_animation(self, anim: Animation2D):
+        if self.__animation != anim:
+            self.__animation = copy.copy(anim)
+            self.__store.add_animated(self)
+
+    def is_playing(self) -> bool:
+        return self.__animation is not None and self.__animation.is_playing()
+
+    def play(self, fps: int = Animation2D.DEFAULT_ANIM_FPS, loop: bool = True, start_frame_idx: int = 0, end_frame_idx: int = -1):
+        if self.__animation:
+            self.__animation.play(fps, loop, start_frame_idx, end_frame_idx)
+
+    def stop(self):
+        if self.__animation:
+            self.__animation.stop()
+
+    def get_animation(self) -> Animation2D:
+        return self.__animation
+
+    def collide(self, sprite, precise: bool = False) -> bool:
+        """ Overlap test of the shapes, with b2TestOverlap when precise (see collision.shapes_overlap) """
+        return collision.sprites_overlap(self, sprite, precise)
+
+    def update(self, delta_time: float):
+        if self.active:
+            if self.is_playing():
+                self.__animation.update(delta_time)
+                self.__store.frame_ids[self.__index] = self.__store.get_frame_id(self.__animation.current_frame)
+
+    def render(self, sprite_batch: SpriteBatch):
+        if self.active and self.visible:
+            frame = self.frame
+            sprite_batch.draw(texture=frame.texture,
+                              position=self.position,
+                              source_rect=frame.rect,
+                              rotation=self.angle,
+                              color=int(self.__store.colors[self.__index]),
+                              origin=self.hotspot,
+                              scale=self.scale,
+                              size=self.size,
+                              effects=SpriteEffects.NONE,
+                              layer_depth=self.layer_depth,
+                              scissor=self.__scissor)
+
+    def build_shape(self):
+        # Box2D is imported with the first shape
+        from Box2D import b2PolygonShape
+
+        self.__shape = b2PolygonShape(
+            box=(self.width / 2, self.height / 2, (0, 0), glm.radians(self.angle)))
+
+    @property
+    def bounds(self) -> Bounds:
+        # TODO handle sprite scale
+        return Bounds(self.x - self.hotspot.x, self.y - self.hotspot.y,
+                      self.width * self.scale.x, self.height * self.scale.y)
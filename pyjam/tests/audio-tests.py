@@ -0,0 +1,158 @@
+import os
+import tempfile
+import wave
+
+import numpy as np
+import pygame as pg
+
+from pyjam.services.audio import AudioService
+
+
+# AudioService channel groups, priorities, min_interval and LRU. It runs with the dummy SDL audio driver,
+# the sounds are generated and long enough to keep their channel busy during the tests.
+
+class Clock:
+    """ Stands for the game, AudioService only reads its time """
+
+    def __init__(self):
+        self.time = 0.0
+
+
+def make_samples(secs=5.0):
+    frequency, size, channels = pg.mixer.get_init()
+    count = int(frequency * secs)
+    tone = (np.sin(np.arange(count) * 0.05) * 8000).astype('<i2')
+    return np.repeat(tone[:, np.newaxis], channels, axis=1)
+
+
+def make_sound(secs=5.0) -> pg.mixer.Sound:
+    return pg.mixer.Sound(buffer=make_samples(secs).tobytes())
+
+
+def write_wav(path, secs):
+    frequency, _, channels = pg.mixer.get_init()
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(frequency)
+        wav.writeframes(make_samples(secs).tobytes())
+
+
+def check(condition, what):
+    if not condition:
+        print(f'failed: {what}')
+        return 1
+    return 0
+
+
+def test_channel_stealing():
+    print('--- test_channel_stealing')
+    clock = Clock()
+    audio = AudioService(clock)
+    audio.set_groups({'enemies': 2, 'jingles': 1})
+    for key, group, priority in (('low_1', 'enemies', 1), ('low_2', 'enemies', 1), ('high', 'enemies', 5),
+                                 ('lowest', 'enemies', 0), ('jingle', 'jingles', 10)):
+        audio.register(key, group=group, priority=priority)
+        audio.set_sound(key, make_sound())
+
+    failures = 0
+    channel_1 = audio.play('low_1')
+    clock.time = 0.1
+    channel_2 = audio.play('low_2')
+    failures += check(channel_1 is not None and channel_2 is not None and channel_1 != channel_2,
+                      'two free channels')
+
+    # the group is full: the oldest of the lowest priority sounds is cut
+    clock.time = 0.2
+    failures += check(audio.play('high') == channel_1, 'high takes the channel of low_1')
+
+    # a lower priority than everything playing is dropped
+    clock.time = 0.3
+    failures += check(audio.play('lowest') is None, 'lowest is dropped')
+
+    # an equal priority cuts the oldest one
+    clock.time = 0.4
+    failures += check(audio.play('low_1') == channel_2, 'low_1 takes the channel of low_2')
+
+    # the other groups keep their channels
+    jingle = audio.play('jingle')
+    failures += check(jingle is not None and jingle not in (channel_1, channel_2), 'jingle has its own channel')
+    failures += check(audio.play('high') is not None and jingle.get_busy(), 'enemies never take the jingle channel')
+
+    audio.dispose()
+    print(f'{failures} failures')
+    return failures
+
+
+def test_min_interval():
+    print('--- test_min_interval')
+    clock = Clock()
+    audio = AudioService(clock)
+    audio.set_groups({'hits': 4})
+    audio.register('hit', group='hits', min_interval=0.05)
+    audio.set_sound('hit', make_sound(0.5))
+
+    failures = 0
+    failures += check(audio.play('hit') is not None, 'first play')
+    clock.time = 0.02
+    failures += check(audio.play('hit') is None, 'played again too soon')
+    clock.time = 0.05
+    failures += check(audio.play('hit') is not None, 'played again after min_interval')
+    clock.time = 0.06
+    failures += check(audio.play('hit') is None, 'min_interval counts from the last play')
+
+    audio.dispose()
+    print(f'{failures} failures')
+    return failures
+
+
+def test_lru(folder):
+    print('--- test_lru')
+    # a 1 sec sound takes frequency * channels * 2 bytes
+    frequency, _, channels = pg.mixer.get_init()
+    sound_bytes = frequency * channels * 2
+    for i in range(4):
+        write_wav(os.path.join(folder, f'sound_{i}.wav'), 1.0)
+
+    clock = Clock()
+    audio = AudioService(clock, max_bytes=int(sound_bytes * 2.5))
+    audio.set_groups({'sfx': 8})
+    for i in range(4):
+        audio.register(i, os.path.join(folder, f'sound_{i}.wav'), 'sfx')
+    audio.register('resident', os.path.join(folder, 'sound_0.wav'), 'sfx', resident=True)
+    audio.register('missing', os.path.join(folder, 'missing.wav'), 'sfx')
+
+    failures = 0
+    failures += check(not audio.is_loaded(0), 'not decoded before the first play')
+
+    # only two sounds fit, the least recently played ones are released
+    audio.preload([0, 1, 2])
+    failures += check(not audio.is_loaded(0) and audio.is_loaded(1) and audio.is_loaded(2),
+                      'sound 0 released for sound 2')
+    failures += check(audio.lru_bytes <= sound_bytes * 2.5, 'LRU within max_bytes')
+
+    # a played sound moves to the end, and is not released while it plays
+    audio.play(1)
+    audio.preload([3])
+    failures += check(audio.is_loaded(1) and not audio.is_loaded(2) and audio.is_loaded(3), 'sound 2 released')
+
+    # resident sounds do not count
+    audio.preload(['resident'])
+    failures += check(audio.is_loaded('resident') and audio.is_loaded(1) and audio.is_loaded(3),
+                      'resident sound kept aside')
+
+    # a file that cannot be loaded stays silent
+    failures += check(audio.play('missing') is None, 'missing sound not played')
+
+    audio.dispose()
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    pg.mixer.init()
+    with tempfile.TemporaryDirectory() as temp_folder:
+        failures = test_channel_stealing() + test_min_interval() + test_lru(temp_folder)
+    pg.mixer.quit()
+    print('OK' if failures == 0 else f'FAILED: {failures} failures')
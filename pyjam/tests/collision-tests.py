@@ -0,0 +1,82 @@
+import math
+import random
+
+from Box2D import b2CircleShape, b2PolygonShape
+
+from pyjam import collision
+
+
+# shapes_overlap (the narrow phase in plain Python) must answer like b2TestOverlap (precise=True)
+
+def random_shape(kind):
+    if kind == 'box':
+        center = (random.uniform(-1, 1), random.uniform(-1, 1)) if random.random() < 0.5 else (0, 0)
+        return b2PolygonShape(box=(random.uniform(0.1, 2), random.uniform(0.1, 2), center, random.uniform(-3, 3)))
+    if kind == 'polygon':
+        # convex: points on a circle, in order
+        count = random.randint(3, 8)
+        angles = sorted(random.uniform(0, 2 * math.pi) for _ in range(count))
+        radius = random.uniform(0.2, 2)
+        return b2PolygonShape(vertices=[(radius * math.cos(a), radius * math.sin(a)) for a in angles])
+    return b2CircleShape(radius=random.uniform(0.1, 2), pos=(random.uniform(-1, 1), random.uniform(-1, 1)))
+
+
+def compare(shape_1, x1, y1, angle_1, shape_2, x2, y2, angle_2):
+    fast = collision.shapes_overlap(shape_1, x1, y1, angle_1, shape_2, x2, y2, angle_2)
+    precise = collision.shapes_overlap(shape_1, x1, y1, angle_1, shape_2, x2, y2, angle_2, precise=True)
+    return fast == precise, fast, precise
+
+
+def test_random_pairs(count=20000):
+    print('--- test_random_pairs')
+    random.seed(1)
+    kinds = ('box', 'polygon', 'circle')
+    mismatches = 0
+    overlaps = 0
+    for i in range(count):
+        shape_1 = random_shape(random.choice(kinds))
+        shape_2 = random_shape(random.choice(kinds))
+        # a quarter of the pairs are not rotated, they go through the axis aligned box test
+        angle_1 = random.uniform(-180, 180) if i % 4 else 0
+        angle_2 = random.uniform(-180, 180) if i % 4 else 0
+        same, fast, precise = compare(shape_1, random.uniform(-3, 3), random.uniform(-3, 3), angle_1,
+                                      shape_2, random.uniform(-3, 3), random.uniform(-3, 3), angle_2)
+        overlaps += precise
+        if not same:
+            mismatches += 1
+            print(f'mismatch: {shape_1} {shape_2} fast={fast} precise={precise}')
+    print(f'{count} pairs, {overlaps} overlapping, {mismatches} mismatches')
+    return mismatches
+
+
+def test_touching_and_margins():
+    print('--- test_touching_and_margins')
+    box = b2PolygonShape(box=(1, 1))
+    circle = b2CircleShape(radius=1)
+    # the polygons have a skin (shape.radius), the shapes touch when their gap is the sum of the skins
+    skin = box.radius
+    mismatches = 0
+    cases = []
+    for delta in (-1e-3, -1e-5, 0.0, 1e-5, 1e-3):
+        # edge to edge, axis aligned and rotated together
+        cases.append((box, 0, 0, 0, box, 2 + 2 * skin + delta, 0, 0))
+        cases.append((box, 0, 0, 30, box, (2 + 2 * skin + delta) * math.cos(math.radians(30)),
+                      (2 + 2 * skin + delta) * math.sin(math.radians(30)), 30))
+        # corner of a box rotated by 45 degrees against an edge
+        cases.append((box, 0, 0, 0, box, 1 + math.sqrt(2) + 2 * skin + delta, 0, 45))
+        # box and circle, circles
+        cases.append((box, 0, 0, 0, circle, 2 + skin + delta, 0, 0))
+        cases.append((circle, 0, 0, 0, circle, 2 + delta, 0, 0))
+        cases.append((circle, 0, 0, 0, box, 0, 2 + skin + delta, 90))
+    for case in cases:
+        same, fast, precise = compare(*case)
+        if not same:
+            mismatches += 1
+            print(f'mismatch: {case} fast={fast} precise={precise}')
+    print(f'{len(cases)} cases, {mismatches} mismatches')
+    return mismatches
+
+
+if __name__ == '__main__':
+    failures = test_random_pairs() + test_touching_and_margins()
+    print('OK' if failures == 0 else f'FAILED: {failures} mismatches')
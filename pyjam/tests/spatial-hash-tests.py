@@ -0,0 +1,66 @@
+import random
+
+from pyjam.collision import SpatialHash
+
+
+# SpatialHash.query must return every item whose bounds meet the queried ones (it may return more),
+# each one once and in insertion order
+
+def boxes_meet(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def random_box(extent=50.0):
+    left = random.uniform(-extent, extent)
+    top = random.uniform(-extent, extent)
+    return left, top, left + random.uniform(0, 20), top + random.uniform(0, 20)
+
+
+def test_queries(rounds=200, items=60, queries=40):
+    print('--- test_queries')
+    random.seed(1)
+    failures = 0
+    spatial_hash = SpatialHash(cell_size=8.0)
+    for _ in range(rounds):
+        # cleared and filled again, as every frame
+        spatial_hash.clear()
+        boxes = [random_box() for _ in range(items)]
+        for number, box in enumerate(boxes):
+            spatial_hash.insert(number, *box)
+
+        for _ in range(queries):
+            query = random_box()
+            candidates = spatial_hash.query(*query)
+            expected = [number for number, box in enumerate(boxes) if boxes_meet(box, query)]
+            if not set(expected) <= set(candidates):
+                failures += 1
+                print(f'missing items {sorted(set(expected) - set(candidates))} for {query}')
+            if candidates != sorted(set(candidates)):
+                failures += 1
+                print(f'duplicated or unordered candidates {candidates}')
+    print(f'{rounds * queries} queries, {failures} failures')
+    return failures
+
+
+def test_cell_borders():
+    print('--- test_cell_borders')
+    failures = 0
+    spatial_hash = SpatialHash(cell_size=10.0)
+    # on a cell border, with negative coordinates, and as big as several cells
+    spatial_hash.insert('border', 10.0, 10.0, 10.0, 10.0)
+    spatial_hash.insert('negative', -15.0, -5.0, -11.0, -1.0)
+    spatial_hash.insert('big', -30.0, -30.0, 30.0, 30.0)
+    for query, expected in (((9.0, 9.0, 10.0, 10.0), ['border', 'big']),
+                            ((-12.0, -3.0, -12.0, -3.0), ['negative', 'big']),
+                            ((100.0, 100.0, 110.0, 110.0), [])):
+        candidates = spatial_hash.query(*query)
+        if candidates != expected:
+            failures += 1
+            print(f'query {query}: {candidates}, expected {expected}')
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    failures = test_queries() + test_cell_borders()
+    print('OK' if failures == 0 else f'FAILED: {failures} failures')
@@ -0,0 +1,193 @@
+import random
+
+import glm
+import numpy as np
+import pygame as pg
+
+from pyjam.sprite import Sprite
+from pyjam.sprites.frame import SpriteFrame
+from pyjam.sprites.store import SpriteStore
+
+
+# A StoredSprite must behave like a Sprite: the same changes are applied to pairs of sprites
+# and what they would draw is compared. No GL is needed, the draws are recorded.
+
+class Texture:
+    def __init__(self, name):
+        self.name = name
+        self.width = 64
+        self.height = 64
+
+
+class RecordingBatch:
+    """ Records the sprites drawn as rows: x, y, width, height, origin x, origin y, rotation, color, depth """
+
+    def __init__(self):
+        self.rows = []
+
+    def draw(self, texture, position, source_rect, rotation, color, origin, scale, size, effects, layer_depth,
+             scissor):
+        self.rows.append((position.x, position.y, size.x * scale.x, size.y * scale.y, origin.x, origin.y,
+                          rotation, color, layer_depth))
+
+    def draw_many(self, texture, positions, source_rects, sizes, origins, rotations, colors, layer_depths):
+        for i in range(len(positions)):
+            self.rows.append((positions[i][0], positions[i][1], sizes[i][0], sizes[i][1], origins[i][0],
+                              origins[i][1], rotations[i], colors[i], layer_depths[i]))
+
+
+def random_change(sprite, frames):
+    change = random.randrange(9)
+    if change == 0:
+        sprite.position = glm.vec2(random.uniform(-100, 100), random.uniform(-100, 100))
+    elif change == 1:
+        sprite.move(random.uniform(-5, 5), random.uniform(-5, 5))
+    elif change == 2:
+        sprite.angle = random.uniform(-720, 720)
+    elif change == 3:
+        sprite.size = glm.vec2(random.randint(1, 32), random.randint(1, 32))
+    elif change == 4:
+        sprite.scale = glm.vec2(random.choice((0.5, 1.0, 2.0)), random.choice((0.5, 1.0, 2.0)))
+    elif change == 5:
+        sprite.color = pg.Color(random.randrange(256), random.randrange(256), random.randrange(256),
+                                random.randrange(256))
+    elif change == 6:
+        sprite.visible = random.random() < 0.7
+    elif change == 7:
+        sprite.frame = random.choice(frames)
+    else:
+        sprite.layer_depth = random.uniform(0, 1)
+
+
+def draw(sprites, store, alpha=None):
+    reference = RecordingBatch()
+    for sprite in sprites:
+        if alpha is not None:
+            sprite.interpolate(alpha)
+        sprite.render(reference)
+        sprite.end_interpolation()
+
+    stored = RecordingBatch()
+    if alpha is not None:
+        store.interpolate(alpha)
+    store.render(stored)
+    store.end_interpolation()
+    return np.array(reference.rows, dtype='f8').reshape(-1, 9), np.array(stored.rows, dtype='f8').reshape(-1, 9)
+
+
+def compare(reference, stored, what):
+    # the store keeps positions and sizes as 32 bit floats
+    if reference.shape != stored.shape or not np.allclose(reference, stored, rtol=1e-5, atol=1e-4):
+        print(f'{what}: {len(reference)} sprites drawn, {len(stored)} by the store')
+        return 1
+    return 0
+
+
+def test_random_changes(count=50, rounds=200):
+    print('--- test_random_changes')
+    random.seed(1)
+    texture = Texture('sheet')
+    frames = [SpriteFrame(texture, pg.Rect(i * 16, 0, 16, 16 + i)) for i in range(4)]
+
+    store = SpriteStore(None)
+    sprites = []
+    for i in range(count):
+        sprites.append(Sprite(frames[i % len(frames)]))
+        store.create(frames[i % len(frames)])
+
+    failures = 0
+    for round_number in range(rounds):
+        for _ in range(count):
+            i = random.randrange(count)
+            state = random.getstate()
+            random_change(sprites[i], frames)
+            # the same change on the stored sprite
+            random.setstate(state)
+            random_change(store[i], frames)
+
+        for i in range(count):
+            if not np.allclose(list(sprites[i].bounds.__dict__.values()), list(store[i].bounds.__dict__.values()),
+                               rtol=1e-5, atol=1e-4):
+                failures += 1
+                print(f'round {round_number}, sprite {i}: bounds differ')
+            if sprites[i].color != store[i].color:
+                failures += 1
+                print(f'round {round_number}, sprite {i}: color {sprites[i].color} != {store[i].color}')
+
+        reference, stored = draw(sprites, store)
+        failures += compare(reference, stored, f'round {round_number}')
+    print(f'{rounds} rounds, {failures} failures')
+    return failures
+
+
+def test_interpolation():
+    print('--- test_interpolation')
+    texture = Texture('sheet')
+    frame = SpriteFrame(texture, pg.Rect(0, 0, 16, 16))
+    store = SpriteStore(None)
+    sprites = []
+    for i in range(3):
+        sprites.append(Sprite(frame))
+        store.create(frame)
+        sprites[i].position = store[i].position = glm.vec2(i * 10, 0)
+
+    # like a fixed update step: the second sprite is hidden when saved, it is not interpolated
+    sprites[1].visible = store[1].visible = False
+    for sprite in sprites:
+        sprite.save_position()
+    store.save_position()
+    sprites[1].visible = store[1].visible = True
+    for i in range(3):
+        sprites[i].move(8, 4)
+        store[i].move(8, 4)
+
+    failures = 0
+    for alpha in (0.0, 0.25, 1.0):
+        reference, stored = draw(sprites, store, alpha)
+        failures += compare(reference, stored, f'alpha {alpha}')
+    print(f'{failures} failures')
+    return failures
+
+
+def test_in_place_changes():
+    print('--- test_in_place_changes')
+    # the getters of a StoredSprite return copies, see the StoredSprite docstring
+    store = SpriteStore(None)
+    sprite = store.create(SpriteFrame(Texture('sheet'), pg.Rect(0, 0, 16, 16)))
+    sprite.position.x += 5
+    failures = 0 if sprite.x == 0 else 1
+    sprite.x += 5
+    failures += 0 if sprite.x == 5 else 1
+    print(f'{failures} failures')
+    return failures
+
+
+def test_growth(count=5000):
+    print('--- test_growth')
+    # the columns grow ahead, a view of a column stays valid until they are reallocated
+    frame = SpriteFrame(Texture('sheet'), pg.Rect(0, 0, 16, 16))
+    store = SpriteStore(None)
+    failures = 0
+    reallocations = 0
+    x = store.x
+    for i in range(count):
+        sprite = store.create(frame)
+        sprite.x = i
+        if not np.shares_memory(x, store.x):
+            reallocations += 1
+        elif len(x) > 0 and x[-1] != len(x) - 1:
+            failures += 1
+            print(f'sprite {i}: stale view')
+        x = store.x
+    if len(store) != count or len(store.x) != count or not (store.x == np.arange(count)).all():
+        failures += 1
+        print(f'{len(store)} sprites, {len(store.x)} rows')
+    if reallocations > 20:
+        failures += 1
+    print(f'{count} sprites, {reallocations} reallocations, {failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    failures = test_random_changes() + test_interpolation() + test_in_place_changes() + test_growth()
+    print('OK' if failures == 0 else f'FAILED: {failures} failures')
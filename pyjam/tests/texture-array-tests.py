@@ -0,0 +1,101 @@
+import moderngl as mgl
+import numpy as np
+
+from pyjam.texture import Texture2D, TextureArray
+
+
+# TextureArray keeps its layers in step with the textures: new, changed and disposed textures,
+# and textures that come once the array is full. It needs an OpenGL context but no window.
+
+def create_context() -> mgl.Context:
+    try:
+        return mgl.create_standalone_context(require=330, backend='egl')
+    except Exception:
+        return mgl.create_standalone_context(require=330)
+
+
+def create_texture(ctx, width, height, value) -> Texture2D:
+    pixels = np.full((height, width, 4), value, dtype='u1')
+    return Texture2D(ctx.texture((width, height), 4, pixels.tobytes()))
+
+
+def read_layer(texture_array, layer) -> np.ndarray:
+    mgltex = texture_array.mgl_texture
+    data = np.frombuffer(mgltex.read(), dtype='u1').reshape(mgltex.layers, mgltex.height, mgltex.width, 4)
+    return data[layer]
+
+
+def check(condition, what):
+    if not condition:
+        print(f'failed: {what}')
+        return 1
+    return 0
+
+
+def test_layers(ctx):
+    print('--- test_layers')
+    texture_array = TextureArray(ctx)
+    small = create_texture(ctx, 4, 4, 10)
+    big = create_texture(ctx, 8, 16, 20)
+
+    failures = 0
+    failures += check(texture_array.get_layer(small) == 0 and texture_array.get_layer(big) == 1, 'layers in order')
+    failures += check(texture_array.get_layer(small) == 0, 'a texture is added once')
+    failures += check((read_layer(texture_array, 0) == 10).all(), 'small texture padded with its edge pixels')
+    failures += check((read_layer(texture_array, 1) == 20).all(), 'big texture')
+    failures += check(np.allclose(texture_array.uv_scales[0:2], [(0.5, 0.25), (1.0, 1.0)]), 'uv scales')
+
+    # the layers follow the changes of the textures
+    small.write(np.full((4, 4, 4), 30, dtype='u1').tobytes())
+    failures += check((read_layer(texture_array, 0) == 30).all(), 'written texture copied again')
+    big.mgl_texture.write(np.full((16, 8, 4), 40, dtype='u1').tobytes())
+    big.changed()
+    failures += check((read_layer(texture_array, 1) == 40).all(), 'changed texture copied again')
+
+    # a disposed texture frees its layer for the next one
+    small.dispose()
+    failures += check(texture_array.layers == 1, 'layer freed')
+    other = create_texture(ctx, 4, 4, 50)
+    failures += check(texture_array.get_layer(other) == 0, 'free layer used again')
+    failures += check((read_layer(texture_array, 0) == 50).all() and (read_layer(texture_array, 1) == 40).all(),
+                      'other layers kept')
+
+    big.dispose()
+    other.dispose()
+    texture_array.dispose()
+    print(f'{failures} failures')
+    return failures
+
+
+def test_full_array(ctx):
+    print('--- test_full_array')
+    texture_array = TextureArray(ctx)
+    textures = [create_texture(ctx, 2, 2, i) for i in range(TextureArray.MAX_LAYERS + 2)]
+
+    failures = 0
+    layers = [texture_array.get_layer(texture) for texture in textures]
+    failures += check(layers[:TextureArray.MAX_LAYERS] == list(range(TextureArray.MAX_LAYERS)), 'array filled')
+    failures += check(layers[TextureArray.MAX_LAYERS:] == [-1, -1], 'no layer once full')
+    failures += check(all((read_layer(texture_array, i) == i).all() for i in range(TextureArray.MAX_LAYERS)),
+                      'layers kept when the array grows')
+
+    # the textures left out are drawn with an array of their own
+    overflow_texture = textures[-1]
+    overflow_array = texture_array.get_overflow_array(overflow_texture)
+    failures += check((read_layer(overflow_array, 0) == len(textures) - 1).all(), 'overflow array')
+    overflow_texture.write(np.full((2, 2, 4), 99, dtype='u1').tobytes())
+    failures += check((read_layer(overflow_array, 0) == 99).all(), 'overflow array follows the texture')
+
+    for texture in textures:
+        texture.dispose()
+    failures += check(texture_array.layers == 0, 'all layers freed')
+    texture_array.dispose()
+    print(f'{failures} failures')
+    return failures
+
+
+if __name__ == '__main__':
+    context = create_context()
+    failures = test_layers(context) + test_full_array(context)
+    context.release()
+    print('OK' if failures == 0 else f'FAILED: {failures} failures')
@@ -1,19 +1,12 @@
-from enum import Enum
-
 import glm
 import pygame as pg
 
 import pyjam.utils
-from pyjam.sprites.batch import SpriteBatch, SpriteEffects
+from pyjam.core import TextAlignment
+from pyjam.sprites.batch import GlyphRun, SpriteBatch, SpriteEffects
 from pyjam.sprites.sheet import SpriteSheet
 
 
-class TextAlignment(Enum):
-    LEFT = 0,
-    CENTER = 1,
-    RIGHT = 2
-
-
 class Text:
     def __init__(self, text: str, sheet_or_font):
         self.__text = text
@@ -30,6 +23,10 @@ class Text:
         self.__color = pg.Color('White')
         self.__char_colors = []
         self.__use_char_colors = False
+        # the StaticLayer drawing this text, if any
+        self.__static_layer = None
+        # the glyphs laid out by the sprite batch, built again when the text, the size or the colors change
+        self.__glyph_run = None
 
     def total_width(self):
         return len(self.__text) * self.__size.x
@@ -48,6 +45,8 @@ class Text:
             elif len(self.__text) < len(self.__char_colors):
                 while len(self.__text) < len(self.__char_colors):
                     self.__char_colors.pop()
+        self.__glyph_run = None
+        self.__invalidate()
 
     @property
     def position(self) -> glm.vec2:
@@ -56,6 +55,7 @@ class Text:
     @position.setter
     def position(self, value: glm.vec2):
         self.__position = glm.vec2(value)
+        self.__invalidate()
 
     @property
     def size(self) -> glm.vec2:
@@ -64,6 +64,8 @@ class Text:
     @size.setter
     def size(self, value: glm.vec2):
         self.__size = glm.vec2(value)
+        self.__glyph_run = None
+        self.__invalidate()
 
     @property
     def color(self) -> pg.Color:
@@ -74,6 +76,8 @@ class Text:
         self.__color = value
         self.__char_colors.clear()
         self.__use_char_colors = False
+        self.__glyph_run = None
+        self.__invalidate()
 
     def get_char_color(self, idx):
         if not self.__use_char_colors:
@@ -89,6 +93,8 @@ class Text:
             self.__use_char_colors = True
 
         self.__char_colors[idx] = pg.Color(value)
+        self.__glyph_run = None
+        self.__invalidate()
 
     @property
     def visible(self) -> bool:
@@ -97,6 +103,7 @@ class Text:
     @visible.setter
     def visible(self, flag: bool):
         self.__visible = flag
+        self.__invalidate()
 
     @property
     def active(self) -> bool:
@@ -113,6 +120,7 @@ class Text:
     @angle.setter
     def angle(self, value):
         self.__angle = pyjam.utils.wrap_angle_deg_180(value)
+        self.__invalidate()
 
     @property
     def layer_depth(self) -> float:
@@ -121,6 +129,7 @@ class Text:
     @layer_depth.setter
     def layer_depth(self, value):
         self.__layer_depth = value
+        self.__invalidate()
 
     @property
     def hotspot(self) -> glm.vec2:
@@ -129,6 +138,7 @@ class Text:
     @hotspot.setter
     def hotspot(self, value: glm.vec2):
         self.__hotspot = glm.vec2(value)
+        self.__invalidate()
 
     @property
     def scale(self) -> glm.vec2:
@@ -137,6 +147,7 @@ class Text:
     @scale.setter
     def scale(self, value: glm.vec2):
         self.__scale = glm.vec2(value)
+        self.__invalidate()
 
     @property
     def alignment(self):
@@ -145,6 +156,33 @@ class Text:
     @alignment.setter
     def alignment(self, value):
         self.__alignment = value
+        self.__invalidate()
+
+    @property
+    def static_layer(self):
+        return self.__static_layer
+
+    @static_layer.setter
+    def static_layer(self, layer):
+        self.__static_layer = layer
+
+    def __invalidate(self):
+        if self.__static_layer is not None:
+            self.__static_layer.invalidate()
+
+    def __get_glyph_run(self, batch: SpriteBatch) -> GlyphRun:
+        sheet = self.__sheet_or_font
+        # the sheet may be moved to an atlas or change its kerning after the run was built
+        run = self.__glyph_run
+        if run is None or run.texture is not sheet.texture2d or run.kerning_width != sheet.kerning_width:
+            if self.__use_char_colors:
+                colors = self.__char_colors
+            else:
+                colors = [self.__color] * len(self.text)
+            run = batch.build_glyph_run(sheet, self.text, self.size.x, self.size.y,
+                                        chars_colors=colors, kerning_width=sheet.kerning_width)
+            self.__glyph_run = run
+        return run
 
     def update(self, delta_time: float):
         pass
@@ -160,19 +198,7 @@ class Text:
                     total_width = self.total_width()
                     pos.x -= total_width
 
-                if self.__use_char_colors:
-                    colors = self.__char_colors
-                else:
-                    colors = [self.__color] * len(self.text)
-
-                batch.draw_string(sp_sheet=self.__sheet_or_font,
-                                  text=self.text,
-                                  position=pos,
-                                  w=self.size.x, h=self.size.y,
-                                  rotation=self.angle,
-                                  chars_colors=colors,
-                                  kerning_width=self.__sheet_or_font.kerning_width,
-                                  layer_depth=self.layer_depth)
+                batch.draw_glyph_run(self.__get_glyph_run(batch), pos, self.angle, self.layer_depth)
             else:
                 if self.size != glm.vec2(0, 0):
                     scale = glm.vec2(self.size.x / self.__sheet_or_font.size, self.size.y / self.__sheet_or_font.size)
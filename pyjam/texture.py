@@ -1,6 +1,7 @@
 # a tiny wrapper around mlg texture
 
 import moderngl as mgl
+import numpy as np
 
 from pyjam.interfaces import IDisposable
 
@@ -13,7 +14,12 @@ class Texture2D(IDisposable):
         Texture2D.__last_sorting_key += 1
         self.__sorting_key = Texture2D.__last_sorting_key
 
+        # the texture arrays holding a copy of the texture, told when it changes or is disposed
+        self.__texture_arrays = []
+
     def dispose(self):
+        for texture_array in list(self.__texture_arrays):
+            texture_array.remove(self)
         self.__mgltex.release()
 
     @property
@@ -32,4 +38,192 @@ class Texture2D(IDisposable):
     def sorting_key(self):
         return self.__sorting_key
 
+    def write(self, data, viewport=None):
+        """ Writes pixels into the texture (see mgl.Texture.write), its mipmaps are built again """
+        self.__mgltex.write(data, viewport)
+        self.__mgltex.build_mipmaps(max_level=10)
+        self.changed()
+
+    def changed(self):
+        """ Must be called when mgl_texture has been changed directly, the texture arrays copy it again """
+        for texture_array in self.__texture_arrays:
+            texture_array.update_layer(self)
+
+    def add_texture_array(self, texture_array: 'TextureArray'):
+        if texture_array not in self.__texture_arrays:
+            self.__texture_arrays.append(texture_array)
+
+    def remove_texture_array(self, texture_array: 'TextureArray'):
+        if texture_array in self.__texture_arrays:
+            self.__texture_arrays.remove(texture_array)
+
+
+class TextureArray(IDisposable):
+    """
+    Copies of Texture2D objects stacked in the layers of a single mgl.TextureArray, so that sprites
+    using different textures can be drawn without switching texture.
+    Every layer is as big as the largest texture: smaller textures sit in the bottom-left corner of their layer,
+    their texture coordinates are scaled by uv_scales, and their border pixels are repeated over the rest
+    of the layer so that filtering does not bleed.
+
+    The textures tell the array when they change (Texture2D.changed) and when they are disposed, their layer
+    is then copied again or freed. Only the added or changed layers are written by update.
+    Once MAX_LAYERS textures are held, the next ones get an array of their own (see get_overflow_array)
+    and are drawn separately.
+    """
+    # size of the uv scales uniform array in the texture array shaders
+    MAX_LAYERS = 64
+
+    # layers allocated the first time, doubled when they are all used
+    INITIAL_CAPACITY = 8
+
+    def __init__(self, ctx: mgl.Context, max_layers: int = MAX_LAYERS):
+        self.__ctx = ctx
+        self.__mgltex = None
+        self.__max_layers = max_layers
+
+        # texture and rgba pixels of each layer (None for a free layer), texture sorting key -> layer
+        # the layer is -1 for the textures drawn with an overflow array
+        self.__textures = []
+        self.__images = []
+        self.__layers = {}
+        self.__free_layers = []
+        self.__dirty_layers = set()
+
+        # texture sorting key -> texture array of a single texture, once the array is full
+        self.__overflow_arrays = {}
+
+        self.__uv_scales = np.ones((TextureArray.MAX_LAYERS, 2), dtype='f4')
+
+    def dispose(self):
+        for texture in self.__textures:
+            if texture is not None:
+                texture.remove_texture_array(self)
+        for overflow_array in self.__overflow_arrays.values():
+            overflow_array.dispose()
+        self.__textures = []
+        self.__images = []
+        self.__layers = {}
+        self.__free_layers = []
+        self.__overflow_arrays = {}
+        self.__release()
+
+    def __release(self):
+        if self.__mgltex is not None:
+            self.__mgltex.release()
+            self.__mgltex = None
+
+    @property
+    def layers(self):
+        """ Number of textures held in the layers """
+        return len(self.__textures) - len(self.__free_layers)
+
+    @property
+    def uv_scales(self):
+        """ Scale of the texture coordinates of each layer, an array of shape (MAX_LAYERS, 2) """
+        return self.__uv_scales
+
+    @property
+    def mgl_texture(self):
+        self.update()
+        return self.__mgltex
+
+    def get_layer(self, texture: Texture2D) -> int:
+        """
+        Returns the layer holding the texture, the texture is added to the array the first time.
+        Returns -1 when the array is full, the texture is then in its own array (see get_overflow_array).
+        """
+        layer = self.__layers.get(texture.sorting_key)
+        if layer is None:
+            layer = self.add(texture)
+        return layer
+
+    def get_overflow_array(self, texture: Texture2D) -> 'TextureArray':
+        """ The array of a texture that did not find a free layer, in its layer 0 """
+        return self.__overflow_arrays[texture.sorting_key]
+
+    def add(self, texture: Texture2D) -> int:
+        mgltex = texture.mgl_texture
+        if mgltex.components != 4 or mgltex.dtype != 'f1':
+            raise Exception('Only RGBA textures can be added to a texture array')
+
+        texture.add_texture_array(self)
+        if self.__free_layers:
+            layer = self.__free_layers.pop()
+        elif len(self.__textures) < self.__max_layers:
+            layer = len(self.__textures)
+            self.__textures.append(None)
+            self.__images.append(None)
+        else:
+            overflow_array = TextureArray(self.__ctx, max_layers=1)
+            overflow_array.add(texture)
+            self.__overflow_arrays[texture.sorting_key] = overflow_array
+            self.__layers[texture.sorting_key] = -1
+            return -1
+
+        self.__textures[layer] = texture
+        self.__layers[texture.sorting_key] = layer
+        self.__dirty_layers.add(layer)
+        return layer
+
+    def remove(self, texture: Texture2D):
+        """ Frees the layer of the texture, called when the texture is disposed """
+        texture.remove_texture_array(self)
+        layer = self.__layers.pop(texture.sorting_key, None)
+        if layer is None:
+            return
+
+        if layer < 0:
+            self.__overflow_arrays.pop(texture.sorting_key).dispose()
+        else:
+            self.__textures[layer] = None
+            self.__images[layer] = None
+            self.__free_layers.append(layer)
+            self.__dirty_layers.discard(layer)
+
+    def update_layer(self, texture: Texture2D):
+        """ Copies the texture again at the next update, called when the texture changes """
+        layer = self.__layers.get(texture.sorting_key)
+        # an overflow array is told by the texture itself
+        if layer is not None and layer >= 0:
+            self.__dirty_layers.add(layer)
+
+    def update(self):
+        """ Writes the textures added or changed since the last time into the GPU texture array """
+        if not self.__dirty_layers:
+            return
+
+        for layer in self.__dirty_layers:
+            mgltex = self.__textures[layer].mgl_texture
+            self.__images[layer] = np.frombuffer(mgltex.read(), dtype='u1').reshape(mgltex.height, mgltex.width, 4)
+
+        # the array is allocated again when it is too small, every layer is then written
+        width = max(image.shape[1] for image in self.__images if image is not None)
+        height = max(image.shape[0] for image in self.__images if image is not None)
+        if self.__mgltex is None or width > self.__mgltex.width or height > self.__mgltex.height or\
+                len(self.__textures) > self.__mgltex.layers:
+            if self.__mgltex is not None:
+                width = max(width, self.__mgltex.width)
+                height = max(height, self.__mgltex.height)
+            capacity = min(TextureArray.INITIAL_CAPACITY, self.__max_layers)
+            while capacity < len(self.__textures):
+                capacity = min(capacity * 2, self.__max_layers)
+
+            self.__release()
+            self.__mgltex = self.__ctx.texture_array((width, height, capacity), 4)
+            # same filtering as the textures created by TextureService
+            self.__mgltex.filter = (mgl.LINEAR_MIPMAP_LINEAR, mgl.LINEAR)
+            self.__mgltex.anisotropy = 16.0
+            self.__dirty_layers = {layer for layer, image in enumerate(self.__images) if image is not None}
+
+        width, height = self.__mgltex.width, self.__mgltex.height
+        for layer in self.__dirty_layers:
+            image = self.__images[layer]
+            h, w = image.shape[0:2]
+            self.__mgltex.write(np.pad(image, ((0, height - h), (0, width - w), (0, 0)), mode='edge'),
+                                viewport=(0, 0, layer, width, height, 1))
+            self.__uv_scales[layer] = (w / width, h / height)
 
+        # moderngl cannot write the mip levels of a layer, the GPU builds them again for the whole array
+        self.__mgltex.build_mipmaps(max_level=10)
+        self.__dirty_layers = set()
@@ -1,5 +1,7 @@
 import math
 import glm
+import numpy as np
+import pygame as pg
 
 K_EPSILON = 0.000001
 
@@ -199,10 +201,10 @@ def is_equal_using_dot(dot: float):
 
 
 def swap_endians(value):
-    leftmost_byte = (value & eval('0x000000FF')) >> 0
-    left_middle_byle = (value & eval('0x0000FF00')) >> 8
-    right_middle_byte = (value & eval('0x00FF0000')) >> 16
-    rightmost_byte = (value & eval('0xFF000000')) >> 24
+    leftmost_byte = (value & 0x000000FF) >> 0
+    left_middle_byle = (value & 0x0000FF00) >> 8
+    right_middle_byte = (value & 0x00FF0000) >> 16
+    rightmost_byte = (value & 0xFF000000) >> 24
 
     leftmost_byte <<= 24
     left_middle_byle <<= 16
@@ -212,3 +214,21 @@ def swap_endians(value):
     return (leftmost_byte | left_middle_byle
             | right_middle_byte | rightmost_byte)
 
+
+def pack_color(color) -> int:
+    """
+    Returns the color as the packed rgba read by the sprite shaders (r in the lowest byte),
+    the same as swap_endians(int(color)). color is a pg.Color or anything pg.Color accepts.
+    """
+    if not isinstance(color, pg.Color):
+        color = pg.Color(color)
+    return color.r | (color.g << 8) | (color.b << 16) | (color.a << 24)
+
+
+def pack_colors(colors) -> np.ndarray:
+    """
+    Vectorized pack_color, colors is an array of shape (n, 4) with the r, g, b, a components
+    (or a sequence of pg.Color). Returns an array of n unsigned ints.
+    """
+    rgba = np.asarray(colors, dtype='u4').reshape(-1, 4)
+    return rgba[:, 0] | (rgba[:, 1] << 8) | (rgba[:, 2] << 16) | (rgba[:, 3] << 24)